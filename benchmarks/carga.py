@@ -0,0 +1,354 @@
+"""
+Prueba de carga de la API de pedidos contra un servidor real.
+
+Levanta el AdamsPay falso (``fake_adamspay.py``) y la app con gunicorn
+(WSGI con threads, o ASGI con workers uvicorn), ejecuta los escenarios
+create_order, order_status y adams_callback con la concurrencia indicada
+y escribe un JSON con throughput, latencias p50/p95/p99 y consultas a la
+base por solicitud (tomadas de ``/metrics``) de cada escenario.
+
+Uso:
+    python benchmarks/carga.py --modo asgi --concurrencia 50 --solicitudes 1000 \\
+        --latencia-ms 150 --salida resultados.json
+    python benchmarks/carga.py --comparar base.json --umbral 0.2
+    python benchmarks/carga.py --perfil io    # con gunicorn.conf.py
+
+Con ``--url`` no levanta nada y prueba un servidor ya iniciado (que debe
+apuntar a un AdamsPay, real o falso, mediante ADAMSPAY_BASE_URL); el
+token de ``/metrics`` se toma de METRICS_TOKEN.
+La base es la de DATABASE_URL; sin ella se usa el SQLite local, que
+serializa las escrituras y no sirve para comparar con producción.
+"""
+
+import argparse
+import json
+import math
+import os
+import secrets
+import socket
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timezone
+
+import requests
+from prometheus_client.parser import text_string_to_metric_families
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+from fake_adamspay import iniciar_en_thread  # noqa: E402
+
+RAIZ = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+ESCENARIOS = ('create_order', 'order_status', 'adams_callback')
+
+
+def _puerto_libre():
+    with socket.socket() as s:
+        s.bind(('127.0.0.1', 0))
+        return s.getsockname()[1]
+
+
+def levantar_servidor(modo, workers, threads, adamspay_url, directorio, token_metricas, perfil=None):
+    """
+    Migra la base e inicia la app con gunicorn en un puerto libre.
+
+    ``token_metricas`` se pasa como METRICS_TOKEN: sin él y sin DEBUG el
+    servidor responde 404 en /metrics. Con ``perfil`` usa ``gunicorn.conf.py``
+    (``SERVER_PROFILE``) en lugar de ``modo``, ``workers`` y ``threads``.
+
+    Returns:
+        tuple: (subprocess.Popen, URL base, ruta del log del servidor).
+    """
+    entorno = dict(
+        os.environ,
+        ADAMSPAY_BASE_URL=adamspay_url,
+        ADAMSPAY_API_KEY='benchmark',
+        PROMETHEUS_MULTIPROC_DIR=os.path.join(directorio, 'metricas'),
+        ORDERS_ASYNC_VIEWS='True' if (perfil or modo) in ('asgi', 'async') else 'False',
+        LOG_LEVEL=os.environ.get('LOG_LEVEL', 'WARNING'),
+        METRICS_TOKEN=token_metricas,
+    )
+    os.makedirs(entorno['PROMETHEUS_MULTIPROC_DIR'])
+    subprocess.run(
+        [sys.executable, 'manage.py', 'migrate', '--noinput'],
+        cwd=RAIZ, env=entorno, check=True, stdout=subprocess.DEVNULL,
+    )
+
+    puerto = _puerto_libre()
+    comando = [sys.executable, '-m', 'gunicorn', '--bind', f'127.0.0.1:{puerto}']
+    if perfil:
+        entorno['SERVER_PROFILE'] = perfil
+        comando += ['-c', os.path.join(RAIZ, 'gunicorn.conf.py')]
+    else:
+        comando += ['--workers', str(workers), '--timeout', '120']
+        if modo == 'asgi':
+            comando += ['--worker-class', 'uvicorn_worker.UvicornWorker', 'dononofre.asgi:application']
+        else:
+            comando += ['--threads', str(threads), 'dononofre.wsgi:application']
+
+    log = os.path.join(directorio, 'servidor.log')
+    with open(log, 'w') as salida:
+        proceso = subprocess.Popen(comando, cwd=RAIZ, env=entorno, stdout=salida, stderr=subprocess.STDOUT)
+
+    url = f'http://127.0.0.1:{puerto}'
+    limite = time.monotonic() + 60
+    while time.monotonic() < limite:
+        if proceso.poll() is not None:
+            break
+        try:
+            requests.get(f'{url}/metrics', timeout=1)
+            return proceso, url, log
+        except requests.RequestException:
+            time.sleep(0.2)
+    proceso.kill()
+    with open(log) as f:
+        raise RuntimeError(f'El servidor no arrancó:\n{f.read()[-3000:]}')
+
+
+def leer_metricas_db(url, token):
+    """
+    Lee de /metrics las consultas y el tiempo en la base acumulados por vista.
+
+    Returns:
+        dict: {vista: {'solicitudes', 'consultas', 'segundos'}}.
+    """
+    encabezados = {'Authorization': f'Bearer {token}'} if token else {}
+    respuesta = requests.get(f'{url}/metrics', headers=encabezados, timeout=10)
+    respuesta.raise_for_status()
+    datos = {}
+    for familia in text_string_to_metric_families(respuesta.text):
+        if familia.name not in ('orders_db_queries_per_request', 'orders_db_time_per_request_seconds'):
+            continue
+        for muestra in familia.samples:
+            vista = muestra.labels.get('view')
+            actual = datos.setdefault(vista, {'solicitudes': 0.0, 'consultas': 0.0, 'segundos': 0.0})
+            if familia.name == 'orders_db_queries_per_request':
+                if muestra.name.endswith('_count'):
+                    actual['solicitudes'] = muestra.value
+                elif muestra.name.endswith('_sum'):
+                    actual['consultas'] = muestra.value
+            elif muestra.name.endswith('_sum'):
+                actual['segundos'] = muestra.value
+    return datos
+
+
+def _percentil(ordenadas, p):
+    if not ordenadas:
+        return None
+    # Rango más cercano
+    indice = min(len(ordenadas) - 1, max(0, math.ceil(p / 100 * len(ordenadas)) - 1))
+    return ordenadas[indice]
+
+
+def ejecutar_escenario(url, nombre, solicitud, total, concurrencia):
+    """
+    Ejecuta ``total`` solicitudes con ``concurrencia`` threads.
+
+    Args:
+        solicitud (callable): ``solicitud(session, i)`` que devuelve la respuesta.
+
+    Returns:
+        dict: Resultados del escenario (sin las métricas de la base).
+    """
+    sesiones = threading.local()
+    latencias = []
+    codigos = {}
+    errores = 0
+    lock = threading.Lock()
+
+    def una(i):
+        nonlocal errores
+        session = getattr(sesiones, 'session', None)
+        if session is None:
+            session = sesiones.session = requests.Session()
+        inicio = time.perf_counter()
+        try:
+            codigo = solicitud(session, i).status_code
+        except requests.RequestException:
+            codigo = 'error_conexion'
+        duracion = time.perf_counter() - inicio
+        with lock:
+            latencias.append(duracion)
+            codigos[str(codigo)] = codigos.get(str(codigo), 0) + 1
+            if codigo == 'error_conexion' or codigo >= 500:
+                errores += 1
+
+    inicio = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrencia, thread_name_prefix=nombre) as pool:
+        list(pool.map(una, range(total)))
+    duracion = time.perf_counter() - inicio
+
+    latencias.sort()
+    return {
+        'solicitudes': total,
+        'concurrencia': concurrencia,
+        'errores': errores,
+        'codigos': codigos,
+        'duracion_s': round(duracion, 3),
+        'rps': round(total / duracion, 1) if duracion else None,
+        'latencia_ms': {
+            'p50': round(_percentil(latencias, 50) * 1000, 2),
+            'p95': round(_percentil(latencias, 95) * 1000, 2),
+            'p99': round(_percentil(latencias, 99) * 1000, 2),
+            'max': round(latencias[-1] * 1000, 2),
+            'promedio': round(sum(latencias) / len(latencias) * 1000, 2),
+        },
+    }
+
+
+def ejecutar(url, escenarios, total, concurrencia, token_metricas):
+    """Ejecuta los escenarios en orden y agrega las consultas a la base de cada uno."""
+    ids = []
+    ids_lock = threading.Lock()
+
+    def crear(session, i):
+        respuesta = session.post(
+            f'{url}/api/orders/',
+            json={'product_name': f'Benchmark {i}', 'amount': 1000 + i},
+            timeout=60,
+        )
+        if respuesta.ok:
+            with ids_lock:
+                ids.append(respuesta.json()['id'])
+        return respuesta
+
+    def consultar(session, i):
+        return session.get(f'{url}/api/orders/{ids[i % len(ids)]}/', timeout=60)
+
+    def notificar(session, i):
+        # Una hora de evento distinta por solicitud: no cuenta como duplicado
+        return session.post(f'{url}/api/adams/callback/', json={'debt': {
+            'docId': ids[i % len(ids)],
+            'payStatus': {'status': 'paid', 'time': f'{datetime.now(timezone.utc).isoformat()}-{uuid.uuid4().hex}'},
+        }}, timeout=60)
+
+    solicitudes = {'create_order': crear, 'order_status': consultar, 'adams_callback': notificar}
+
+    resultados = {}
+    for nombre in escenarios:
+        if nombre != 'create_order' and not ids:
+            # Los demás escenarios necesitan pedidos existentes
+            with requests.Session() as session:
+                for i in range(min(total, 100)):
+                    crear(session, i)
+        antes = leer_metricas_db(url, token_metricas).get(nombre, {})
+        resultado = ejecutar_escenario(url, nombre, solicitudes[nombre], total, concurrencia)
+        despues = leer_metricas_db(url, token_metricas).get(nombre, {})
+        medidas = despues.get('solicitudes', 0) - antes.get('solicitudes', 0)
+        if medidas:
+            resultado['consultas_db_por_solicitud'] = round(
+                (despues['consultas'] - antes.get('consultas', 0)) / medidas, 2)
+            resultado['tiempo_db_ms_por_solicitud'] = round(
+                (despues['segundos'] - antes.get('segundos', 0)) / medidas * 1000, 3)
+        resultados[nombre] = resultado
+        print(f"{nombre}: {resultado['rps']} req/s, p95 {resultado['latencia_ms']['p95']} ms, "
+              f"{resultado['errores']} errores", file=sys.stderr)
+    return resultados
+
+
+def comparar(actual, base, umbral):
+    """
+    Compara dos resultados y devuelve las regresiones encontradas.
+
+    Una regresión es un p95 más de ``umbral`` (fracción) por encima del de
+    la base, o un throughput más de ``umbral`` por debajo.
+    """
+    regresiones = []
+    for nombre, resultado in actual['escenarios'].items():
+        previo = base.get('escenarios', {}).get(nombre)
+        if not previo:
+            continue
+        p95, p95_previo = resultado['latencia_ms']['p95'], previo['latencia_ms']['p95']
+        if p95_previo and p95 > p95_previo * (1 + umbral):
+            regresiones.append(f'{nombre}: p95 {p95_previo} -> {p95} ms')
+        rps, rps_previo = resultado['rps'], previo['rps']
+        if rps_previo and rps < rps_previo * (1 - umbral):
+            regresiones.append(f'{nombre}: throughput {rps_previo} -> {rps} req/s')
+    return regresiones
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Prueba de carga de la API de pedidos')
+    parser.add_argument('--modo', choices=('wsgi', 'asgi'), default='wsgi')
+    parser.add_argument('--workers', type=int, default=1)
+    parser.add_argument('--threads', type=int, default=2, help='Threads por worker (solo WSGI sin --perfil)')
+    parser.add_argument('--perfil', choices=('io', 'async', 'cpu'),
+                        help='Perfil de gunicorn.conf.py (ignora --modo, --workers y --threads)')
+    parser.add_argument('--url', help='Servidor ya iniciado (no levanta nada)')
+    parser.add_argument('--escenarios', default=','.join(ESCENARIOS))
+    parser.add_argument('--solicitudes', type=int, default=500, help='Solicitudes por escenario')
+    parser.add_argument('--concurrencia', type=int, default=20)
+    parser.add_argument('--latencia-ms', type=float, default=150.0, help='Latencia del AdamsPay falso')
+    parser.add_argument('--jitter-ms', type=float, default=30.0)
+    parser.add_argument('--tasa-error', type=float, default=0.0, help='Fracción de 503 del AdamsPay falso')
+    parser.add_argument('--salida', help='Archivo JSON de resultados (por defecto stdout)')
+    parser.add_argument('--comparar', help='JSON de una corrida anterior para detectar regresiones')
+    parser.add_argument('--umbral', type=float, default=0.2)
+    args = parser.parse_args()
+
+    escenarios = [e for e in args.escenarios.split(',') if e]
+    desconocidos = set(escenarios) - set(ESCENARIOS)
+    if desconocidos:
+        parser.error(f'Escenarios desconocidos: {", ".join(sorted(desconocidos))}')
+
+    proceso = None
+    token_metricas = os.environ.get('METRICS_TOKEN') or secrets.token_urlsafe(16)
+    with tempfile.TemporaryDirectory(prefix='dononofre-bench-') as directorio:
+        try:
+            if args.url:
+                url = args.url.rstrip('/')
+            else:
+                adamspay = iniciar_en_thread(
+                    puerto=0, latencia_ms=args.latencia_ms,
+                    jitter_ms=args.jitter_ms, tasa_error=args.tasa_error,
+                )
+                adamspay_url = f'http://127.0.0.1:{adamspay.server_address[1]}'
+                proceso, url, _ = levantar_servidor(
+                    args.modo, args.workers, args.threads, adamspay_url, directorio, token_metricas,
+                    args.perfil,
+                )
+            escenarios_resultado = ejecutar(url, escenarios, args.solicitudes, args.concurrencia, token_metricas)
+        finally:
+            if proceso is not None:
+                proceso.terminate()
+                proceso.wait(30)
+
+    resultado = {
+        'fecha': datetime.now(timezone.utc).isoformat(timespec='seconds'),
+        'configuracion': {
+            'modo': None if args.url or args.perfil else args.modo,
+            'perfil': args.perfil,
+            'url': args.url,
+            'workers': None if args.perfil else args.workers,
+            'threads': args.threads if args.modo == 'wsgi' and not args.perfil else None,
+            'solicitudes': args.solicitudes,
+            'concurrencia': args.concurrencia,
+            'adamspay_latencia_ms': None if args.url else args.latencia_ms,
+            'adamspay_jitter_ms': None if args.url else args.jitter_ms,
+            'adamspay_tasa_error': None if args.url else args.tasa_error,
+            'base': 'postgresql' if os.getenv('DATABASE_URL') else 'sqlite',
+        },
+        'escenarios': escenarios_resultado,
+    }
+
+    texto = json.dumps(resultado, indent=2, ensure_ascii=False)
+    if args.salida:
+        with open(args.salida, 'w', encoding='utf-8') as f:
+            f.write(texto + '\n')
+    else:
+        print(texto)
+
+    if args.comparar:
+        with open(args.comparar, encoding='utf-8') as f:
+            regresiones = comparar(resultado, json.load(f), args.umbral)
+        for regresion in regresiones:
+            print(f'Regresión: {regresion}', file=sys.stderr)
+        if regresiones:
+            sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,132 @@
+"""
+Servidor local que imita la API de deudas de AdamsPay para los benchmarks.
+
+Implementa ``POST /api/v1/debts`` (crear deuda) y
+``GET /api/v1/debts/<docId>`` (consultar deuda) con latencia y tasa de
+errores configurables, sin guardar nada: cada deuda consultada aparece
+pendiente.
+
+Uso:
+    python benchmarks/fake_adamspay.py --puerto 8765 --latencia-ms 150 --tasa-error 0.02
+"""
+
+import argparse
+import json
+import random
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+
+class ManejadorAdamsPay(BaseHTTPRequestHandler):
+    """Responde como AdamsPay; la configuración vive en ``self.server``."""
+
+    protocol_version = 'HTTP/1.1'
+
+    def _demorar(self):
+        servidor = self.server
+        demora = servidor.latencia + random.uniform(0, servidor.jitter)
+        if demora > 0:
+            time.sleep(demora)
+        with servidor.lock:
+            servidor.solicitudes += 1
+        return random.random() < servidor.tasa_error
+
+    def _responder(self, codigo, datos):
+        cuerpo = json.dumps(datos).encode('utf-8')
+        self.send_response(codigo)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(cuerpo)))
+        self.end_headers()
+        self.wfile.write(cuerpo)
+
+    def do_POST(self):
+        largo = int(self.headers.get('Content-Length') or 0)
+        cuerpo = self.rfile.read(largo)
+        if self.path.rstrip('/') != '/api/v1/debts':
+            return self._responder(404, {'meta': {'status': 'error', 'description': 'No encontrado'}})
+        if self._demorar():
+            return self._responder(503, {'meta': {'status': 'error', 'description': 'Error simulado'}})
+        try:
+            deuda = json.loads(cuerpo)['debt']
+            doc_id = deuda['docId']
+        except (ValueError, KeyError, TypeError):
+            return self._responder(400, {'meta': {'status': 'error', 'description': 'Deuda inválida'}})
+        self._responder(201, {'debt': {
+            'docId': doc_id,
+            'id': f'fake-{doc_id}',
+            'payUrl': f'http://{self.headers.get("Host", "localhost")}/pay/fake/debt/{doc_id}',
+            'label': deuda.get('label', ''),
+            'amount': deuda.get('amount', {}),
+            'payStatus': {'status': 'pending'},
+            'objStatus': {'status': 'active'},
+        }})
+
+    def do_GET(self):
+        prefijo = '/api/v1/debts/'
+        if not self.path.startswith(prefijo):
+            return self._responder(404, {'meta': {'status': 'error', 'description': 'No encontrado'}})
+        if self._demorar():
+            return self._responder(503, {'meta': {'status': 'error', 'description': 'Error simulado'}})
+        doc_id = self.path[len(prefijo):].strip('/')
+        self._responder(200, {'debt': {
+            'docId': doc_id,
+            'payStatus': {'status': 'pending'},
+            'objStatus': {'status': 'active'},
+        }})
+
+    def log_message(self, formato, *args):
+        # Sin una línea por solicitud: no debe ser el cuello de botella
+        pass
+
+
+def crear_servidor(host='127.0.0.1', puerto=8765, latencia_ms=100.0, jitter_ms=20.0, tasa_error=0.0):
+    """
+    Crea el servidor falso de AdamsPay (sin iniciarlo).
+
+    Args:
+        host (str): Dirección donde escuchar.
+        puerto (int): Puerto (0 = uno libre, ver ``server_address``).
+        latencia_ms (float): Latencia fija de cada respuesta.
+        jitter_ms (float): Latencia extra aleatoria, entre 0 y este valor.
+        tasa_error (float): Fracción de solicitudes que responden 503.
+
+    Returns:
+        ThreadingHTTPServer: Servidor con un thread por conexión.
+    """
+    servidor = ThreadingHTTPServer((host, puerto), ManejadorAdamsPay)
+    servidor.daemon_threads = True
+    servidor.latencia = latencia_ms / 1000
+    servidor.jitter = jitter_ms / 1000
+    servidor.tasa_error = tasa_error
+    servidor.solicitudes = 0
+    servidor.lock = threading.Lock()
+    return servidor
+
+
+def iniciar_en_thread(**kwargs):
+    """Inicia el servidor en un thread daemon y lo devuelve (ver ``crear_servidor``)."""
+    servidor = crear_servidor(**kwargs)
+    threading.Thread(target=servidor.serve_forever, name='fake-adamspay', daemon=True).start()
+    return servidor
+
+
+def main():
+    parser = argparse.ArgumentParser(description='AdamsPay falso para benchmarks')
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--puerto', type=int, default=8765)
+    parser.add_argument('--latencia-ms', type=float, default=100.0)
+    parser.add_argument('--jitter-ms', type=float, default=20.0)
+    parser.add_argument('--tasa-error', type=float, default=0.0)
+    args = parser.parse_args()
+
+    servidor = crear_servidor(args.host, args.puerto, args.latencia_ms, args.jitter_ms, args.tasa_error)
+    print(f"AdamsPay falso en http://{args.host}:{servidor.server_address[1]}")
+    try:
+        servidor.serve_forever()
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == '__main__':
+    main()
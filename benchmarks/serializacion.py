@@ -0,0 +1,163 @@
+"""
+Microbenchmark del camino de serialización de la API de pedidos.
+
+Mide el CPU (``time.process_time``) por operación de cada paso de una
+respuesta de pedido, con el camino anterior y con el actual:
+
+- lectura de una página del listado: instancias de Order + dict armado a
+  mano, contra la proyección ``.values(*CAMPOS_PEDIDO)`` + ``fila_a_dict``
+  (la consulta del listado y de la caché para varios pedidos).
+- lectura de un pedido: la proyección, contra la instancia +
+  ``pedido_a_dict`` que usa la caché cuando falta un solo pedido.
+- render de un pedido y de una página del listado: JSONRenderer de DRF
+  contra ORJSONRenderer.
+- parse del cuerpo de create_order: JSONParser de DRF contra ORJSONParser.
+
+Usa una base SQLite en memoria (como los tests de Django), así que la
+lectura no incluye la red hasta PostgreSQL.
+
+Uso:
+    python benchmarks/serializacion.py --iteraciones 5000 --salida serializacion.json
+"""
+
+import argparse
+import io
+import json
+import os
+import sys
+import time
+from decimal import Decimal
+
+RAIZ = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, RAIZ)
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'dononofre.settings')
+os.environ.setdefault('LOG_LEVEL', 'WARNING')
+
+import django  # noqa: E402
+
+django.setup()
+
+from django.db import connection  # noqa: E402
+from rest_framework.parsers import JSONParser  # noqa: E402
+from rest_framework.renderers import JSONRenderer  # noqa: E402
+
+from orders.cache import _leer_de_la_base  # noqa: E402
+from orders.models import Order  # noqa: E402
+from orders.renderers import USAR_ORJSON, ORJSONParser, ORJSONRenderer  # noqa: E402
+from orders.serializers import CAMPOS_PEDIDO, fila_a_dict  # noqa: E402
+
+
+def medir(funcion, iteraciones):
+    """Microsegundos de CPU por llamada (mejor de 3 corridas)."""
+    funcion()
+    mejor = None
+    for _ in range(3):
+        inicio = time.process_time()
+        for _ in range(iteraciones):
+            funcion()
+        transcurrido = (time.process_time() - inicio) / iteraciones * 1e6
+        mejor = transcurrido if mejor is None else min(mejor, transcurrido)
+    return round(mejor, 2)
+
+
+def _dict_de_instancia(order):
+    # Como se armaban las respuestas a partir del modelo
+    return {
+        'id': str(order.id),
+        'product_name': order.product_name,
+        'amount': str(order.amount),
+        'status': order.status,
+        'payment_link': order.payment_link,
+        'created_at': order.created_at,
+        'updated_at': order.updated_at,
+        'version': order.version,
+    }
+
+
+def _leer_instancias(pedidos):
+    # .all(): una consulta nueva en cada llamada, sin la caché del queryset
+    return [_dict_de_instancia(order) for order in pedidos.all()]
+
+
+def _leer_proyeccion(pedidos):
+    return [fila_a_dict(fila) for fila in pedidos.values(*CAMPOS_PEDIDO)]
+
+
+def ejecutar(iteraciones, tamanio_pagina):
+    """
+    Ejecuta todas las mediciones.
+
+    Returns:
+        dict: Por paso, µs de CPU con el camino anterior, el actual y el ahorro.
+    """
+    connection.creation.create_test_db(verbosity=0)
+    Order.objects.bulk_create(
+        Order(product_name=f'Producto {i}', amount=Decimal(1000 + i), status='PENDING',
+              payment_link=f'https://adamspay.test/pay/{i}')
+        for i in range(tamanio_pagina)
+    )
+    order_id = str(Order.objects.values_list('id', flat=True).first())
+    todos = Order.objects.order_by('-created_at', '-id')[:tamanio_pagina]
+
+    pedido = _leer_de_la_base([order_id])[0]
+    pagina = {
+        'orders': [fila_a_dict(fila) for fila in Order.objects.values(*CAMPOS_PEDIDO)[:tamanio_pagina]],
+        'next_cursor': None,
+    }
+    cuerpo = json.dumps({'product_name': 'Jamón Ibérico de Bellota', 'amount': 153000}).encode('utf-8')
+
+    drf, rapido = JSONRenderer(), ORJSONRenderer()
+    parser_drf, parser_rapido = JSONParser(), ORJSONParser()
+    pasos = {
+        # Como en la caché: la consulta se arma en cada lectura, con el ID en texto
+        'lectura_pedido': (
+            lambda: _leer_proyeccion(Order.objects.filter(id__in=[order_id])),
+            lambda: _leer_de_la_base([order_id]),
+        ),
+        'lectura_pagina': (lambda: _leer_instancias(todos), lambda: _leer_proyeccion(todos)),
+        'render_pedido': (lambda: drf.render(pedido), lambda: rapido.render(pedido)),
+        'render_pagina': (lambda: drf.render(pagina), lambda: rapido.render(pagina)),
+        'parse_creacion': (
+            lambda: parser_drf.parse(io.BytesIO(cuerpo)),
+            lambda: parser_rapido.parse(io.BytesIO(cuerpo)),
+        ),
+    }
+
+    resultados = {}
+    for nombre, (anterior, actual) in pasos.items():
+        # El listado es una sola solicitud: menos iteraciones para el mismo tiempo
+        n = iteraciones // 10 if nombre.endswith('_pagina') else iteraciones
+        us_anterior, us_actual = medir(anterior, n), medir(actual, n)
+        resultados[nombre] = {
+            'anterior_us': us_anterior,
+            'actual_us': us_actual,
+            'ahorro_us': round(us_anterior - us_actual, 2),
+            'ahorro_pct': round((1 - us_actual / us_anterior) * 100, 1),
+        }
+        print(f'{nombre}: {us_anterior} -> {us_actual} µs de CPU', file=sys.stderr)
+    return resultados
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Microbenchmark de serialización de pedidos')
+    parser.add_argument('--iteraciones', type=int, default=5000)
+    parser.add_argument('--pagina', type=int, default=100, help='Pedidos en la página del listado')
+    parser.add_argument('--salida', help='Archivo JSON de resultados (por defecto stdout)')
+    args = parser.parse_args()
+
+    resultado = {
+        'orjson': USAR_ORJSON,
+        'iteraciones': args.iteraciones,
+        'pagina': args.pagina,
+        'pasos': ejecutar(args.iteraciones, args.pagina),
+    }
+    texto = json.dumps(resultado, indent=2, ensure_ascii=False)
+    if args.salida:
+        with open(args.salida, 'w', encoding='utf-8') as f:
+            f.write(texto + '\n')
+    else:
+        print(texto)
+
+
+if __name__ == '__main__':
+    main()
@@ -9,6 +9,8 @@ pip install -r requirements.txt
 
 # Comprobar instalaciones
 echo "Django: $(python -c "import django; print(django.get_version())")"
-echo "Psycopg2: $(python -c "import psycopg2; print(psycopg2.__version__)")"
+# psycopg2 por defecto; psycopg 3 solo si se instaló requirements-pool.txt (DB_POOL=True)
+python -c "import psycopg; print('Psycopg 3:', psycopg.__version__)" 2>/dev/null \
+    || python -c "import psycopg2; print('Psycopg2:', psycopg2.__version__)"
 
 echo "Build Completo"
\ No newline at end of file
@@ -0,0 +1,32 @@
+# estaticos.py - Storage de archivos estáticos con minificación
+
+import rcssmin
+import rjsmin
+from django.core.files.base import ContentFile
+from whitenoise.storage import CompressedManifestStaticFilesStorage
+
+# Solo los bundles propios (static/css y static/js); admin y DRF quedan como vienen
+_MINIFICADORES = {
+    '.css': rcssmin.cssmin,
+    '.js': rjsmin.jsmin,
+}
+_PREFIJOS_PROPIOS = ('css/', 'js/')
+
+
+class EstaticosMinificados(CompressedManifestStaticFilesStorage):
+    """
+    Minifica el CSS y JS propios al copiarlos en ``collectstatic``.
+
+    Sobre la minificación, WhiteNoise agrega el hash del contenido al nombre
+    (``tienda.3f2a9c.js``, servido con ``Cache-Control: immutable`` por un
+    año) y genera las versiones ``.gz`` y ``.br``.
+    """
+
+    def _save(self, name, content):
+        extension = name[name.rfind('.'):]
+        minificar = _MINIFICADORES.get(extension)
+        if minificar and name.startswith(_PREFIJOS_PROPIOS) and '.min.' not in name:
+            content.seek(0)
+            texto = content.read().decode('utf-8')
+            content = ContentFile(minificar(texto).encode('utf-8'))
+        return super()._save(name, content)
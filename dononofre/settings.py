@@ -10,7 +10,9 @@ Para la lista completa de configuraciones y sus valores, consulta:
 https://docs.djangoproject.com/en/6.0/ref/settings/
 """
 import os
+import importlib.util
 import dj_database_url
+from django.core.exceptions import ImproperlyConfigured
 from pathlib import Path
 
 # Construye rutas dentro del proyecto así: BASE_DIR / 'subdir'.
@@ -50,8 +52,10 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    'orders.middleware.CorrelacionMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'whitenoise.middleware.WhiteNoiseMiddleware',
+    'orders.middleware.MetricasMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
@@ -60,7 +64,17 @@ MIDDLEWARE = [
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
 ]
 
-STATICFILES_STORAGE = 'whitenoise.storage.CompressedManifestStaticFilesStorage'
+# Con DEBUG se sirven los fuentes tal cual; en producción collectstatic genera
+# bundles minificados con hash en el nombre y versiones .gz/.br (WhiteNoise)
+STORAGES = {
+    'default': {'BACKEND': 'django.core.files.storage.FileSystemStorage'},
+    'staticfiles': {
+        'BACKEND': (
+            'django.contrib.staticfiles.storage.StaticFilesStorage' if DEBUG
+            else 'dononofre.estaticos.EstaticosMinificados'
+        ),
+    },
+}
 
 ROOT_URLCONF = 'dononofre.urls'
 
@@ -82,27 +96,58 @@ TEMPLATES = [
 WSGI_APPLICATION = 'dononofre.wsgi.application'
 
 # Configuración de la base de datos
-print("=== CONFIGURACIÓN DE LA BASE DE DATOS ===")
-print(f"Variable de entorno RENDER: {os.getenv('RENDER')}")
-print(f"Variable de entorno DATABASE_URL: {os.getenv('DATABASE_URL')}")
+# Pool de conexiones de Django (psycopg 3, requirements-pool.txt): cada worker
+# comparte entre sus threads de DB_POOL_MIN_SIZE a DB_POOL_MAX_SIZE conexiones,
+# en lugar de una conexión persistente por thread. Sin pool alcanza con psycopg2
+DB_POOL = os.getenv('DB_POOL', 'False') == 'True'
+DB_POOL_MIN_SIZE = int(os.getenv('DB_POOL_MIN_SIZE', '2'))
+DB_POOL_MAX_SIZE = int(os.getenv('DB_POOL_MAX_SIZE', '10'))
+DB_POOL_TIMEOUT = float(os.getenv('DB_POOL_TIMEOUT', '10'))  # espera por una conexión libre
+DB_POOL_MAX_IDLE = float(os.getenv('DB_POOL_MAX_IDLE', '300'))
+DB_POOL_MAX_LIFETIME = float(os.getenv('DB_POOL_MAX_LIFETIME', '3600'))
+DB_CONN_MAX_AGE = int(os.getenv('DB_CONN_MAX_AGE', '600'))  # sin pool
+
+# DATABASE_URL apunta a PgBouncer en modo transaction: sin cursores del lado
+# del servidor ni estado de sesión. LISTEN y el advisory lock del preflight
+# necesitan una sesión propia y usan DATABASE_DIRECT_URL (PostgreSQL directo)
+DB_PGBOUNCER = os.getenv('DB_PGBOUNCER', 'False') == 'True'
 
 # Usar PostgreSQL cuando DATABASE_URL esté definida
 if os.getenv('DATABASE_URL'):
-    print("=== USANDO POSTGRESQL (DATABASE_URL detectada) ===")
     DATABASES = {
         'default': dj_database_url.config(
             default=os.getenv('DATABASE_URL'),
-            conn_max_age=600,
-            conn_health_checks=True,
+            conn_max_age=0 if DB_POOL else DB_CONN_MAX_AGE,
+            conn_health_checks=not DB_POOL,
         )
     }
     # Forzar motor PostgreSQL
     DATABASES['default']['ENGINE'] = 'django.db.backends.postgresql'
-    print(f"Motor de base de datos: {DATABASES['default']['ENGINE']}")
-    print(f"Host de base de datos: {DATABASES['default'].get('HOST', 'N/A')}")
+    if DB_POOL:
+        if importlib.util.find_spec('psycopg_pool') is None:
+            raise ImproperlyConfigured(
+                "DB_POOL=True necesita psycopg 3: pip install -r requirements-pool.txt"
+            )
+        DATABASES['default'].setdefault('OPTIONS', {})['pool'] = {
+            'min_size': DB_POOL_MIN_SIZE,
+            'max_size': DB_POOL_MAX_SIZE,
+            'timeout': DB_POOL_TIMEOUT,
+            'max_idle': DB_POOL_MAX_IDLE,
+            'max_lifetime': DB_POOL_MAX_LIFETIME,
+        }
+    if DB_PGBOUNCER:
+        # psycopg2 no usa prepared statements y Django los desactiva en psycopg 3
+        DATABASES['default']['DISABLE_SERVER_SIDE_CURSORS'] = True
+        if os.getenv('DATABASE_DIRECT_URL'):
+            DATABASES['direct'] = dj_database_url.config(
+                env='DATABASE_DIRECT_URL',
+                conn_max_age=0,
+            )
+            DATABASES['direct']['ENGINE'] = 'django.db.backends.postgresql'
+            # Misma base que default: los tests no crean otra ni usan la real
+            DATABASES['direct']['TEST'] = {'MIRROR': 'default'}
 else:
     # Localmente - usar SQLite
-    print("=== USANDO SQLITE (entorno local) ===")
     DATABASES = {
         'default': {
             'ENGINE': 'django.db.backends.sqlite3',
@@ -110,6 +155,9 @@ else:
         }
     }
 
+# Conexión para LISTEN/NOTIFY y el advisory lock del preflight (estado de sesión)
+DB_SESSION_ALIAS = 'direct' if 'direct' in DATABASES else 'default'
+
 # Validación de contraseñas
 AUTH_PASSWORD_VALIDATORS = [
     {
@@ -132,26 +180,167 @@ TIME_ZONE = 'UTC'
 USE_I18N = True
 USE_TZ = True
 
+DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
+
 STATIC_URL = '/static/'
 STATIC_ROOT = os.path.join(BASE_DIR, 'staticfiles')
 STATICFILES_DIRS = [os.path.join(BASE_DIR, 'static')]
 
 # Logs en Render
+# El logger "orders" escribe una línea JSON por registro (LOG_JSON=False para
+# texto legible) desde un thread aparte, con el ID de correlación de la
+# solicitud. Los payloads completos (logger "orders.payloads") se muestrean.
+LOG_LEVEL = os.getenv('LOG_LEVEL', 'INFO')
+LOG_JSON = os.getenv('LOG_JSON', 'True') == 'True'
+LOG_PAYLOAD_SAMPLE_RATE = float(os.getenv('LOG_PAYLOAD_SAMPLE_RATE', '0.01'))
+
 LOGGING = {
     'version': 1,
     'disable_existing_loggers': False,
+    'filters': {
+        'correlacion': {
+            '()': 'orders.registro.FiltroCorrelacion',
+        },
+        'muestreo': {
+            '()': 'orders.registro.FiltroMuestreo',
+            'tasa': LOG_PAYLOAD_SAMPLE_RATE,
+        },
+    },
     'handlers': {
         'console': {
             'class': 'logging.StreamHandler',
         },
+        'orders': {
+            '()': 'orders.registro.ManejadorCola',
+            'formato_json': LOG_JSON,
+            'filters': ['correlacion'],
+        },
     },
     'root': {
         'handlers': ['console'],
         'level': 'INFO',
     },
+    'loggers': {
+        'orders': {
+            'handlers': ['orders'],
+            'level': LOG_LEVEL,
+            'propagate': False,
+        },
+        'orders.payloads': {
+            'filters': ['muestreo'],
+        },
+        # Una línea por llamada a AdamsPay sobra: ya están las métricas del cliente
+        'httpx': {
+            'level': 'WARNING',
+        },
+    },
 }
 
 # Configuración de AdamsPay
 ADAMSPAY_BASE_URL = os.getenv('ADAMSPAY_BASE_URL', 'https://app.adamspay.com')
 ADAMSPAY_API_KEY = os.getenv('ADAMSPAY_API_KEY', '')
-ADAMSPAY_CALLBACK_URL = os.getenv('ADAMSPAY_CALLBACK_URL', '')
\ No newline at end of file
+ADAMSPAY_CALLBACK_URL = os.getenv('ADAMSPAY_CALLBACK_URL', '')
+
+# Modo outbox: el registro de la deuda se hace en segundo plano
+# con `python manage.py registrar_deudas` en lugar de en create_order
+ADAMSPAY_OUTBOX = os.getenv('ADAMSPAY_OUTBOX', 'False') == 'True'
+ADAMSPAY_OUTBOX_MAX_ATTEMPTS = int(os.getenv('ADAMSPAY_OUTBOX_MAX_ATTEMPTS', '5'))
+# Segundos que un worker reserva un registro mientras llama a AdamsPay; si muere,
+# otro lo retoma al vencer (debe superar timeouts + reintentos del cliente)
+ADAMSPAY_OUTBOX_LEASE = int(os.getenv('ADAMSPAY_OUTBOX_LEASE', '120'))
+
+# Cola de webhooks: el callback solo guarda el evento y
+# `python manage.py procesar_webhooks` lo aplica por lotes
+ADAMSPAY_WEBHOOK_QUEUE = os.getenv('ADAMSPAY_WEBHOOK_QUEUE', 'False') == 'True'
+
+# Días que se guardan las huellas de notificaciones aplicadas y los eventos de
+# webhook ya procesados (`python manage.py purgar_notificaciones` borra los más viejos)
+ADAMSPAY_DEDUP_RETENTION_DAYS = int(os.getenv('ADAMSPAY_DEDUP_RETENTION_DAYS', '30'))
+ADAMSPAY_WEBHOOK_RETENTION_DAYS = int(os.getenv('ADAMSPAY_WEBHOOK_RETENTION_DAYS', '7'))
+
+# Configuración de la API de pedidos
+# Máximo de pedidos por consulta en POST /api/orders/status/
+ORDERS_STATUS_BATCH_MAX = int(os.getenv('ORDERS_STATUS_BATCH_MAX', '50'))
+
+# Espera de cambios de pedidos: long-poll y Server-Sent Events (ver ORDERS_LIVE_UPDATES)
+ORDERS_WAIT_TIMEOUT = float(os.getenv('ORDERS_WAIT_TIMEOUT', '25'))
+ORDERS_SSE_MAX_DURATION = float(os.getenv('ORDERS_SSE_MAX_DURATION', '300'))
+
+# Caché (por defecto en memoria del proceso; en producción conviene una
+# compartida, p. ej. CACHE_BACKEND=django.core.cache.backends.redis.RedisCache)
+CACHES = {
+    'default': {
+        'BACKEND': os.getenv('CACHE_BACKEND', 'django.core.cache.backends.locmem.LocMemCache'),
+        'LOCATION': os.getenv('CACHE_LOCATION', 'dononofre'),
+    }
+}
+
+# Caché de lectura de pedidos (orders/cache.py), en segundos
+ORDERS_CACHE_TTL_FINAL = int(os.getenv('ORDERS_CACHE_TTL_FINAL', '86400'))
+ORDERS_CACHE_TTL_PENDING = int(os.getenv('ORDERS_CACHE_TTL_PENDING', '60'))
+ORDERS_CACHE_LOCAL_TTL_PENDING = float(os.getenv('ORDERS_CACHE_LOCAL_TTL_PENDING', '5'))
+ORDERS_CACHE_LOCAL_SIZE = int(os.getenv('ORDERS_CACHE_LOCAL_SIZE', '10000'))
+
+# Tras un cambio, segundos durante los que una lectura anterior no puede volver a cachear el pedido
+ORDERS_CACHE_TOMBSTONE_TTL = int(os.getenv('ORDERS_CACHE_TOMBSTONE_TTL', '10'))
+
+# Páginas cacheadas (orders/paginas.py): max-age de la home para navegadores
+# y CDN, y TTL de las páginas armadas en la caché compartida (en segundos)
+ORDERS_PAGE_MAX_AGE = int(os.getenv('ORDERS_PAGE_MAX_AGE', '300'))
+ORDERS_PAGE_CACHE_TTL = int(os.getenv('ORDERS_PAGE_CACHE_TTL', '86400'))
+
+# Listado de pedidos (GET /api/orders/list/): tamaño de página por defecto y máximo
+ORDERS_LIST_LIMIT = int(os.getenv('ORDERS_LIST_LIMIT', '20'))
+ORDERS_LIST_MAX_LIMIT = int(os.getenv('ORDERS_LIST_MAX_LIMIT', '100'))
+
+# Máximo de líneas por pedido en POST /api/orders/cart/
+ORDERS_CART_MAX_ITEMS = int(os.getenv('ORDERS_CART_MAX_ITEMS', '50'))
+
+# Vencimiento de pedidos: validez de la deuda en AdamsPay (horas) y margen
+# antes de que `python manage.py expirar_pedidos` los pase a FAILED (minutos)
+ORDERS_VALID_HOURS = int(os.getenv('ORDERS_VALID_HOURS', '48'))
+ORDERS_EXPIRY_GRACE_MINUTES = int(os.getenv('ORDERS_EXPIRY_GRACE_MINUTES', '10'))
+
+# Vistas asíncronas de create_order, order_status y adams_callback
+# (solo tienen sentido bajo ASGI: SERVER_PROFILE=async, ver gunicorn.conf.py)
+ORDERS_ASYNC_VIEWS = os.getenv('ORDERS_ASYNC_VIEWS', 'False') == 'True'
+
+# Esperas en vivo (/wait/ y /events/): solo bajo ASGI, donde una espera no
+# ocupa un thread del worker. Con WSGI esas rutas no existen y la tienda
+# consulta order_status con backoff e If-None-Match
+ORDERS_LIVE_UPDATES = os.getenv('ORDERS_LIVE_UPDATES', str(
+    ORDERS_ASYNC_VIEWS
+    or os.getenv('SERVER_PROFILE') == 'async'
+    or os.getenv('SERVER_MODE') == 'asgi'
+)) == 'True'
+
+# GET /metrics (Prometheus): exige "Authorization: Bearer <token>"; sin token
+# solo responde con DEBUG=True (en producción devuelve 404)
+METRICS_TOKEN = os.getenv('METRICS_TOKEN', '')
+
+# Marcador que escribe `python manage.py preflight` cuando la base está lista
+PREFLIGHT_MARKER = os.getenv('PREFLIGHT_MARKER', '/tmp/dononofre-ready')
+
+# JSON de la API con orjson (orders/renderers.py); sin orjson instalado o con
+# ORDERS_ORJSON=False se usa el json de la biblioteca estándar, con la misma salida
+ORDERS_ORJSON = os.getenv('ORDERS_ORJSON', 'True') == 'True'
+
+REST_FRAMEWORK = {
+    'DEFAULT_RENDERER_CLASSES': [
+        'orders.renderers.ORJSONRenderer',
+        'rest_framework.renderers.BrowsableAPIRenderer',
+    ],
+    'DEFAULT_PARSER_CLASSES': [
+        'orders.renderers.ORJSONParser',
+        'rest_framework.parsers.FormParser',
+        'rest_framework.parsers.MultiPartParser',
+    ],
+}
+
+# Header Idempotency-Key en create_order y cart_checkout (orders/idempotencia.py):
+# las respuestas se guardan ORDERS_IDEMPOTENCY_TTL segundos; un duplicado espera
+# a la solicitud original hasta ORDERS_IDEMPOTENCY_WAIT segundos (después 409), y
+# una clave en curso desde hace más de ORDERS_IDEMPOTENCY_LOCK se da por abandonada
+ORDERS_IDEMPOTENCY_TTL = int(os.getenv('ORDERS_IDEMPOTENCY_TTL', '86400'))
+ORDERS_IDEMPOTENCY_WAIT = float(os.getenv('ORDERS_IDEMPOTENCY_WAIT', '30'))
+ORDERS_IDEMPOTENCY_LOCK = int(os.getenv('ORDERS_IDEMPOTENCY_LOCK', '120'))
\ No newline at end of file
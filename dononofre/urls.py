@@ -16,9 +16,11 @@ Including another URLconf
 """
 from django.contrib import admin
 from django.urls import path, include
+from orders.views import metrics
 
 urlpatterns = [
     path('admin/', admin.site.urls),
+    path('metrics', metrics, name='metrics'),
     path('', include('orders.urls')),
     path('api/', include('orders.urls')),
 ]
\ No newline at end of file
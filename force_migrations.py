@@ -1,7 +1,8 @@
 #!/usr/bin/env python
 """
 Script para forzar migraciones en Render.
-Ejecutar manualmente si es necesario.
+Ejecutar manualmente si es necesario (equivale a ``manage.py preflight``
+más el listado de tablas).
 """
 import os
 import sys
@@ -14,14 +15,13 @@ sys.path.append(os.path.dirname(os.path.abspath(__file__)))
 django.setup()
 
 from django.db import connection
-from django.core.management import execute_from_command_line
+from django.core.management import call_command
 
 print("Ejecutando migraciones")
 
 try:
-    # Ejecutar migraciones
-    execute_from_command_line(['manage.py', 'makemigrations', '--noinput'])
-    execute_from_command_line(['manage.py', 'migrate', '--noinput'])
+    # Mismo preflight que startup.sh: advisory lock y migraciones una sola vez
+    call_command('preflight')
     print("Migraciones ejecutadas exitosamente!")
     
     # Verificar
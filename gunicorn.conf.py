@@ -0,0 +1,180 @@
+"""
+Configuración de gunicorn con perfiles de servidor.
+
+``startup.sh`` inicia ``gunicorn -c gunicorn.conf.py``; el perfil se elige
+con ``SERVER_PROFILE`` y los workers y threads se calculan con los CPUs
+disponibles y el tamaño del pool de conexiones:
+
+- ``io`` (por defecto): workers ``gthread``, ``CPUs + 1`` workers y tantos
+  threads como conexiones del pool (``DB_POOL_MAX_SIZE``; 8 sin pool). Para
+  ``create_order``, que pasa casi todo el tiempo esperando a AdamsPay.
+- ``async``: workers uvicorn con las vistas asíncronas (``ORDERS_ASYNC_VIEWS``),
+  un worker por CPU. Las esperas a AdamsPay no ocupan threads.
+- ``cpu``: workers ``sync``, ``2 × CPUs + 1`` workers de un solo thread.
+
+Los CPUs salen de la cuota del cgroup (no de los núcleos del host).
+``WEB_CONCURRENCY`` y ``GUNICORN_THREADS`` fijan los valores a mano, y
+``DB_MAX_CONNECTIONS`` acota los workers para no pasar el límite de
+conexiones de PostgreSQL (contando la conexión LISTEN de cada worker). ``SERVER_MODE=asgi`` (anterior a los perfiles)
+equivale a ``SERVER_PROFILE=async``.
+
+Mediciones con ``benchmarks/carga.py --perfil`` en una máquina de 1 CPU con
+el SQLite local (no PostgreSQL), AdamsPay falso de 150 + 0-30 ms, 500
+solicitudes con concurrencia 20 (req/s y p95 de create_order / order_status):
+
+- ``io`` (2 × 8 threads): 55 req/s, 543 ms / 179 req/s, 230 ms
+- ``async`` (1 worker):   44 req/s, 587 ms /  93 req/s, 281 ms
+- ``cpu`` (3 × 1 thread): 13 req/s, 1617 ms / 158 req/s, 166 ms
+- 1 × 8 threads sin perfil: 34 req/s, 679 ms / 169 req/s, 165 ms
+
+Con SQLite las escrituras se serializan; con PostgreSQL conviene repetirlas.
+"""
+
+import math
+import os
+
+
+def _entero(nombre, defecto):
+    valor = os.getenv(nombre)
+    return int(valor) if valor else defecto
+
+
+def _leer(ruta):
+    with open(ruta) as f:
+        return f.read().split()
+
+
+def cuota_cgroup():
+    """
+    CPUs que permite la cuota del cgroup (v2: ``cpu.max``; v1:
+    ``cpu.cfs_quota_us`` / ``cpu.cfs_period_us``), o None si no hay límite.
+
+    En Render y otros contenedores la afinidad muestra todos los núcleos del
+    host; el límite real es la cuota.
+    """
+    try:
+        cuota, periodo = _leer('/sys/fs/cgroup/cpu.max')[:2]
+        return None if cuota == 'max' else int(cuota) / int(periodo)
+    except (OSError, ValueError):
+        pass
+    try:
+        cuota = int(_leer('/sys/fs/cgroup/cpu/cpu.cfs_quota_us')[0])
+        periodo = int(_leer('/sys/fs/cgroup/cpu/cpu.cfs_period_us')[0])
+    except (OSError, ValueError, IndexError):
+        return None
+    return cuota / periodo if cuota > 0 and periodo > 0 else None
+
+
+def cpus_disponibles():
+    """CPUs que puede usar este proceso: la cuota del cgroup acotada por la afinidad."""
+    try:
+        cpus = len(os.sched_getaffinity(0))
+    except AttributeError:
+        cpus = os.cpu_count() or 1
+    cuota = cuota_cgroup()
+    if cuota is not None:
+        # Una cuota de 0.5 CPU sigue siendo un worker
+        cpus = min(cpus, max(1, math.ceil(cuota)))
+    return cpus
+
+
+def calcular_perfil(nombre, cpus=None):
+    """
+    Calcula la configuración de un perfil.
+
+    Args:
+        nombre (str): ``io``, ``async`` o ``cpu``.
+        cpus (int, opcional): CPUs a considerar (por defecto los disponibles).
+
+    Returns:
+        dict: ``worker_class``, ``workers``, ``threads``, ``wsgi_app`` y
+        ``conexiones_por_worker`` (conexiones a la base que puede abrir cada worker).
+
+    Raises:
+        ValueError: Si el perfil no existe.
+    """
+    cpus = cpus or cpus_disponibles()
+    pool = os.getenv('DB_POOL', 'False').lower() == 'true'
+    tamanio_pool = _entero('DB_POOL_MAX_SIZE', 10)
+
+    if nombre == 'io':
+        # Con pool, un thread más que conexiones solo espera DB_POOL_TIMEOUT
+        threads = _entero('GUNICORN_THREADS', tamanio_pool if pool else 8)
+        perfil = {
+            'worker_class': 'gthread',
+            'workers': cpus + 1,
+            'threads': threads,
+            'wsgi_app': 'dononofre.wsgi:application',
+            'conexiones_por_worker': min(threads, tamanio_pool) if pool else threads,
+        }
+    elif nombre == 'async':
+        # El ORM corre en el thread de sync_to_async: una conexión por worker sin pool
+        perfil = {
+            'worker_class': 'uvicorn_worker.UvicornWorker',
+            'workers': cpus,
+            'threads': 1,
+            'wsgi_app': 'dononofre.asgi:application',
+            'conexiones_por_worker': tamanio_pool if pool else 1,
+        }
+    elif nombre == 'cpu':
+        perfil = {
+            'worker_class': 'sync',
+            'workers': 2 * cpus + 1,
+            'threads': 1,
+            'wsgi_app': 'dononofre.wsgi:application',
+            'conexiones_por_worker': 1,
+        }
+    else:
+        raise ValueError(f'Perfil de servidor desconocido: {nombre}')
+
+    if os.getenv('DATABASE_URL', '').startswith(('postgres://', 'postgresql://')):
+        # Conexión LISTEN propia de cada worker (orders/eventos.py), fuera del pool
+        perfil['conexiones_por_worker'] += 1
+
+    perfil['workers'] = _entero('WEB_CONCURRENCY', perfil['workers'])
+    limite = _entero('DB_MAX_CONNECTIONS', 0)
+    if limite:
+        perfil['workers'] = max(1, min(perfil['workers'], limite // perfil['conexiones_por_worker']))
+    return perfil
+
+
+PERFIL = os.getenv('SERVER_PROFILE') or ('async' if os.getenv('SERVER_MODE') == 'asgi' else 'io')
+_perfil = calcular_perfil(PERFIL)
+
+if PERFIL == 'async':
+    # Se lee al importar los settings, que con preload_app ocurre después
+    os.environ.setdefault('ORDERS_ASYNC_VIEWS', 'True')
+
+wsgi_app = _perfil['wsgi_app']
+bind = f"0.0.0.0:{os.getenv('PORT', '8000')}"
+worker_class = _perfil['worker_class']
+workers = _perfil['workers']
+threads = _perfil['threads']
+
+# Django se importa una vez en el master y los workers heredan la memoria;
+# reciclarlos cada ~1000 solicitudes (con jitter, no todos a la vez) es barato
+preload_app = True
+max_requests = _entero('GUNICORN_MAX_REQUESTS', 1000)
+max_requests_jitter = _entero('GUNICORN_MAX_REQUESTS_JITTER', 100)
+
+# AdamsPay con reintentos puede tardar; /wait/ corta antes (long-poll)
+timeout = 120
+graceful_timeout = 30
+keepalive = 5
+
+accesslog = '-'
+errorlog = '-'
+
+
+def when_ready(server):
+    server.log.info(
+        "Perfil %s: %d workers %s × %d threads",
+        PERFIL, workers, worker_class, threads,
+    )
+
+
+def post_fork(server, worker):
+    # Ninguna conexión abierta en el master durante el preload se comparte
+    from django.db import connections
+    connections.close_all()
+
@@ -0,0 +1,350 @@
+# adamspay.py - Cliente HTTP compartido para la API de AdamsPay
+
+import asyncio
+import os
+import random
+import threading
+import time
+import weakref
+
+import httpx
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+from .metricas import registrar_adamspay
+
+# Configuraciones de AdamsPay
+ADAMSPAY_BASE_URL = os.getenv('ADAMSPAY_BASE_URL', 'https://staging.adamspay.com')
+ADAMSPAY_API_URL = f"{ADAMSPAY_BASE_URL}/api/v1/debts"
+ADAMSPAY_API_KEY = os.getenv('ADAMSPAY_API_KEY', '')
+ADAMSPAY_APP_SECRET = os.getenv('ADAMSPAY_APP_SECRET', '')
+ADAMSPAY_APP_SLUG = os.getenv('ADAMSPAY_APP_SLUG', 'website')
+ADAMSPAY_CALLBACK_URL = os.getenv('ADAMSPAY_CALLBACK_URL', 'https://don-onofre-adamspay.onrender.com/api/adams/callback/')
+
+# Timeouts separados: conectar debe ser rápido, leer puede tardar más
+ADAMSPAY_CONNECT_TIMEOUT = float(os.getenv('ADAMSPAY_CONNECT_TIMEOUT', '3.05'))
+ADAMSPAY_READ_TIMEOUT = float(os.getenv('ADAMSPAY_READ_TIMEOUT', '15'))
+
+# Reintentos con backoff exponencial y jitter
+ADAMSPAY_MAX_RETRIES = int(os.getenv('ADAMSPAY_MAX_RETRIES', '2'))
+ADAMSPAY_BACKOFF = float(os.getenv('ADAMSPAY_BACKOFF', '0.3'))
+
+# Circuit breaker: fallos consecutivos para abrir y segundos abierto
+ADAMSPAY_CB_FAILURES = int(os.getenv('ADAMSPAY_CB_FAILURES', '5'))
+ADAMSPAY_CB_RESET = float(os.getenv('ADAMSPAY_CB_RESET', '30'))
+
+# Conexiones keep-alive por proceso
+ADAMSPAY_POOL_SIZE = int(os.getenv('ADAMSPAY_POOL_SIZE', '10'))
+
+
+class AdamsPayNoDisponible(requests.RequestException):
+    """El circuit breaker está abierto y no se intenta llamar a AdamsPay."""
+
+
+class CircuitBreaker:
+    """
+    Circuit breaker simple y thread-safe.
+
+    Tras ``umbral`` fallos consecutivos el circuito se abre y rechaza las
+    llamadas durante ``tiempo_apertura`` segundos. Luego deja pasar una
+    llamada de prueba (semi-abierto): si tiene éxito se cierra, si falla
+    vuelve a abrirse.
+    """
+
+    def __init__(self, umbral, tiempo_apertura):
+        self.umbral = umbral
+        self.tiempo_apertura = tiempo_apertura
+        self._fallos = 0
+        self._abierto_hasta = 0.0
+        self._prueba_en_curso = False
+        self._lock = threading.Lock()
+
+    @property
+    def estado(self):
+        """Devuelve 'cerrado', 'abierto' o 'semi-abierto'."""
+        with self._lock:
+            if self._fallos < self.umbral:
+                return 'cerrado'
+            if time.monotonic() < self._abierto_hasta:
+                return 'abierto'
+            return 'semi-abierto'
+
+    def permitir(self):
+        """Indica si se puede intentar una llamada ahora."""
+        with self._lock:
+            if self._fallos < self.umbral:
+                return True
+            if time.monotonic() < self._abierto_hasta or self._prueba_en_curso:
+                return False
+            self._prueba_en_curso = True
+            return True
+
+    def registrar_exito(self):
+        with self._lock:
+            self._fallos = 0
+            self._prueba_en_curso = False
+
+    def registrar_fallo(self):
+        with self._lock:
+            self._fallos += 1
+            self._prueba_en_curso = False
+            if self._fallos >= self.umbral:
+                self._abierto_hasta = time.monotonic() + self.tiempo_apertura
+
+
+class _ClienteBase:
+    """Circuit breaker y contadores comunes a los clientes síncrono y asíncrono."""
+
+    def __init__(self, base_url=ADAMSPAY_BASE_URL, api_key=ADAMSPAY_API_KEY, circuito=None):
+        self.base_url = base_url
+        self.api_key = api_key
+        self.circuito = circuito or CircuitBreaker(ADAMSPAY_CB_FAILURES, ADAMSPAY_CB_RESET)
+        self._lock = threading.Lock()
+        self._contadores = {
+            'llamadas': 0,
+            'errores': 0,
+            'rechazadas': 0,
+            'latencia_total': 0.0,
+            'latencia_max': 0.0,
+        }
+
+    def _contar(self, metodo, latencia=0.0, error=False, rechazada=False):
+        registrar_adamspay(metodo, latencia, error, rechazada)
+        with self._lock:
+            if rechazada:
+                self._contadores['rechazadas'] += 1
+                return
+            self._contadores['llamadas'] += 1
+            self._contadores['latencia_total'] += latencia
+            self._contadores['latencia_max'] = max(self._contadores['latencia_max'], latencia)
+            if error:
+                self._contadores['errores'] += 1
+
+    def estadisticas(self):
+        """
+        Devuelve los contadores acumulados del cliente en este proceso.
+
+        Returns:
+            dict: llamadas, errores, rechazadas (circuito abierto),
+                latencia_promedio y latencia_max en segundos, y el estado
+                del circuito.
+        """
+        with self._lock:
+            datos = dict(self._contadores)
+        llamadas = datos.pop('llamadas')
+        latencia_total = datos.pop('latencia_total')
+        datos['llamadas'] = llamadas
+        datos['latencia_promedio'] = latencia_total / llamadas if llamadas else 0.0
+        datos['circuito'] = self.circuito.estado
+        return datos
+
+
+class ClienteAdamsPay(_ClienteBase):
+    """
+    Cliente de la API de AdamsPay con conexiones reutilizables.
+
+    Mantiene una ``requests.Session`` con pool keep-alive, timeouts de
+    conexión y lectura separados, reintentos con backoff y jitter, y un
+    circuit breaker. Acumula contadores de llamadas, errores y latencia.
+
+    Todos los métodos que expone son idempotentes: la creación de deudas
+    usa ``x-if-exists: update`` con el ID del pedido como docId, por lo que
+    reintentarla no duplica la deuda.
+    """
+
+    def __init__(self, base_url=ADAMSPAY_BASE_URL, api_key=ADAMSPAY_API_KEY, circuito=None):
+        super().__init__(base_url, api_key, circuito)
+        self.timeout = (ADAMSPAY_CONNECT_TIMEOUT, ADAMSPAY_READ_TIMEOUT)
+        self.session = self._crear_session()
+
+    def _crear_session(self):
+        reintentos = Retry(
+            total=ADAMSPAY_MAX_RETRIES,
+            backoff_factor=ADAMSPAY_BACKOFF,
+            backoff_jitter=ADAMSPAY_BACKOFF,
+            status_forcelist=(429, 500, 502, 503, 504),
+            allowed_methods=frozenset({'GET', 'POST', 'PUT', 'DELETE'}),
+            raise_on_status=False,
+        )
+        adaptador = HTTPAdapter(
+            pool_connections=1,
+            pool_maxsize=ADAMSPAY_POOL_SIZE,
+            max_retries=reintentos,
+        )
+        session = requests.Session()
+        session.mount('https://', adaptador)
+        session.mount('http://', adaptador)
+        session.headers.update({
+            'apikey': self.api_key,
+            'Content-Type': 'application/json',
+        })
+        return session
+
+    def crear_deuda(self, payload):
+        """
+        Crea (o actualiza) una deuda en AdamsPay.
+
+        Args:
+            payload (dict): Cuerpo con la deuda (ver ``deudas.construir_payload``).
+
+        Returns:
+            requests.Response: Respuesta de AdamsPay.
+
+        Raises:
+            AdamsPayNoDisponible: Si el circuit breaker está abierto.
+            requests.RequestException: Si falla la conexión.
+        """
+        return self._solicitar(
+            'POST', '/api/v1/debts',
+            json=payload,
+            headers={'x-if-exists': 'update'},
+        )
+
+    def consultar_deuda(self, doc_id):
+        """
+        Consulta una deuda en AdamsPay por su docId (el ID del pedido).
+
+        Args:
+            doc_id (str): docId de la deuda.
+
+        Returns:
+            requests.Response: Respuesta de AdamsPay; con 200 el cuerpo trae
+                ``debt.payStatus`` y ``debt.objStatus``.
+
+        Raises:
+            AdamsPayNoDisponible: Si el circuit breaker está abierto.
+            requests.RequestException: Si falla la conexión.
+        """
+        return self._solicitar('GET', f'/api/v1/debts/{doc_id}')
+
+    def _solicitar(self, metodo, ruta, **kwargs):
+        if not self.circuito.permitir():
+            self._contar(metodo, rechazada=True)
+            raise AdamsPayNoDisponible('Circuit breaker abierto para AdamsPay')
+
+        inicio = time.perf_counter()
+        try:
+            response = self.session.request(
+                metodo, f"{self.base_url}{ruta}", timeout=self.timeout, **kwargs
+            )
+        except requests.RequestException:
+            self.circuito.registrar_fallo()
+            self._contar(metodo, latencia=time.perf_counter() - inicio, error=True)
+            raise
+
+        error = response.status_code >= 500 or response.status_code == 429
+        if error:
+            self.circuito.registrar_fallo()
+        else:
+            self.circuito.registrar_exito()
+        self._contar(metodo, latencia=time.perf_counter() - inicio, error=error)
+        return response
+
+
+class ClienteAdamsPayAsync(_ClienteBase):
+    """
+    Versión asíncrona del cliente para las vistas ASGI, sobre ``httpx.AsyncClient``.
+
+    Mismos timeouts, reintentos (429/5xx y errores de conexión, con backoff
+    y jitter) y circuit breaker que ``ClienteAdamsPay``; mientras espera a
+    AdamsPay no ocupa ningún thread. Los errores de httpx se propagan como
+    ``httpx.HTTPError``.
+    """
+
+    def __init__(self, base_url=ADAMSPAY_BASE_URL, api_key=ADAMSPAY_API_KEY, circuito=None):
+        super().__init__(base_url, api_key, circuito)
+        self.client = httpx.AsyncClient(
+            base_url=base_url,
+            headers={'apikey': api_key, 'Content-Type': 'application/json'},
+            timeout=httpx.Timeout(ADAMSPAY_READ_TIMEOUT, connect=ADAMSPAY_CONNECT_TIMEOUT),
+            limits=httpx.Limits(
+                max_connections=ADAMSPAY_POOL_SIZE,
+                max_keepalive_connections=ADAMSPAY_POOL_SIZE,
+            ),
+        )
+
+    async def crear_deuda(self, payload):
+        """Versión asíncrona de ``ClienteAdamsPay.crear_deuda``."""
+        return await self._solicitar(
+            'POST', '/api/v1/debts',
+            json=payload,
+            headers={'x-if-exists': 'update'},
+        )
+
+    async def consultar_deuda(self, doc_id):
+        """Versión asíncrona de ``ClienteAdamsPay.consultar_deuda``."""
+        return await self._solicitar('GET', f'/api/v1/debts/{doc_id}')
+
+    async def _solicitar(self, metodo, ruta, **kwargs):
+        if not self.circuito.permitir():
+            self._contar(metodo, rechazada=True)
+            raise AdamsPayNoDisponible('Circuit breaker abierto para AdamsPay')
+
+        inicio = time.perf_counter()
+        for intento in range(ADAMSPAY_MAX_RETRIES + 1):
+            ultimo = intento == ADAMSPAY_MAX_RETRIES
+            try:
+                response = await self.client.request(metodo, ruta, **kwargs)
+            except httpx.TransportError:
+                if ultimo:
+                    self.circuito.registrar_fallo()
+                    self._contar(metodo, latencia=time.perf_counter() - inicio, error=True)
+                    raise
+            else:
+                error = response.status_code >= 500 or response.status_code == 429
+                if not error or ultimo:
+                    break
+            # Mismo backoff exponencial con jitter que urllib3 Retry
+            espera = ADAMSPAY_BACKOFF * (2 ** intento) + random.uniform(0, ADAMSPAY_BACKOFF)
+            await asyncio.sleep(espera)
+
+        if error:
+            self.circuito.registrar_fallo()
+        else:
+            self.circuito.registrar_exito()
+        self._contar(metodo, latencia=time.perf_counter() - inicio, error=error)
+        return response
+
+
+_cliente = None
+_cliente_pid = None
+_cliente_lock = threading.Lock()
+
+
+def obtener_cliente():
+    """
+    Devuelve el cliente compartido de este proceso.
+
+    El cliente se recrea si el proceso cambió (por ejemplo tras el fork de
+    un worker de gunicorn) para no compartir sockets entre procesos.
+    """
+    global _cliente, _cliente_pid
+
+    pid = os.getpid()
+    if _cliente is None or _cliente_pid != pid:
+        with _cliente_lock:
+            if _cliente is None or _cliente_pid != pid:
+                _cliente = ClienteAdamsPay()
+                _cliente_pid = pid
+    return _cliente
+
+
+# Un AsyncClient pertenece a un event loop: uno por loop (bajo uvicorn hay
+# un solo loop por worker; runserver crea uno por solicitud asíncrona)
+_clientes_async = weakref.WeakKeyDictionary()
+
+
+def obtener_cliente_async():
+    """
+    Devuelve el cliente asíncrono del event loop actual.
+
+    Comparte el circuit breaker con el cliente síncrono del proceso, así
+    una caída de AdamsPay detectada por un camino también protege al otro.
+    """
+    loop = asyncio.get_running_loop()
+    cliente = _clientes_async.get(loop)
+    if cliente is None:
+        cliente = ClienteAdamsPayAsync(circuito=obtener_cliente().circuito)
+        _clientes_async[loop] = cliente
+    return cliente
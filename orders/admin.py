@@ -1,6 +1,76 @@
-from django.contrib import admin
-from .models import Order
+from django import forms
+from django.contrib import admin, messages
+from django.db import transaction
+
+from .models import DebtRegistration, Order, OrderItem, WebhookEvent
+from .signals import notificar_cambio
+
+
+class OrderItemInline(admin.TabularInline):
+    model = OrderItem
+    extra = 0
+
+
+class OrderAdminForm(forms.ModelForm):
+    class Meta:
+        model = Order
+        fields = '__all__'
+
+    def clean_status(self):
+        """Solo permite las transiciones de Order.TRANSICIONES (PAID y FAILED son finales)."""
+        nuevo = self.cleaned_data['status']
+        actual = self.instance.status if self.instance.pk else None
+        if actual and nuevo != actual and nuevo not in Order.TRANSICIONES[actual]:
+            raise forms.ValidationError(f"Un pedido {actual} no puede pasar a {nuevo}")
+        return nuevo
+
 
 @admin.register(Order)
 class OrderAdmin(admin.ModelAdmin):
-    list_display = ('product_name', 'amount', 'status', 'created_at')
+    form = OrderAdminForm
+    inlines = (OrderItemInline,)
+    # La incrementa ``actualizar`` en cada cambio
+    readonly_fields = ('version',)
+    list_display = ('product_name', 'amount', 'status', 'created_at', 'updated_at')
+    list_filter = ('status',)
+    ordering = ('-created_at',)
+    # Evita un COUNT(*) de toda la tabla en cada página filtrada
+    show_full_result_count = False
+
+    def save_model(self, request, obj, form, change):
+        """
+        Aplica los cambios con ``transicionar``/``actualizar`` y avisa con
+        ``notificar_cambio``, como el resto del código.
+
+        Un ``save()`` no incrementaría ``version``: los clientes seguirían
+        recibiendo 304 y la caché serviría el pedido anterior.
+        """
+        if not change:
+            super().save_model(request, obj, form, change)
+            return
+
+        campos = {campo: getattr(obj, campo) for campo in form.changed_data}
+        if not campos:
+            return
+        pedidos = Order.objects.filter(pk=obj.pk)
+        nuevo_estado = campos.pop('status', None)
+        with transaction.atomic():
+            # Condicional: si un webhook cambió el estado mientras tanto, no se pisa
+            if nuevo_estado is not None and not pedidos.transicionar(nuevo_estado):
+                messages.warning(request, f"El estado no se cambió a {nuevo_estado}: el pedido ya no está PENDING")
+                nuevo_estado = None
+            if campos:
+                pedidos.actualizar(**campos)
+            notificar_cambio([obj.pk], status=nuevo_estado)
+        obj.refresh_from_db()
+
+
+@admin.register(DebtRegistration)
+class DebtRegistrationAdmin(admin.ModelAdmin):
+    list_display = ('order', 'status', 'attempts', 'next_attempt_at', 'processed_at')
+    list_filter = ('status',)
+
+
+@admin.register(WebhookEvent)
+class WebhookEventAdmin(admin.ModelAdmin):
+    list_display = ('id', 'received_at', 'processed_at', 'error')
@@ -3,3 +3,13 @@ from django.apps import AppConfig
 
 class OrdersConfig(AppConfig):
     name = 'orders'
+
+    def ready(self):
+        # Conecta el broker de eventos y la caché de pedidos a la señal order_changed
+        from . import eventos  # noqa: F401
+        from . import cache  # noqa: F401
+
+        # Cuenta las consultas de cada solicitud para /metrics
+        from django.db.backends.signals import connection_created
+        from .metricas import instalar_en_conexion
+        connection_created.connect(instalar_en_conexion, dispatch_uid='orders.metricas.consultas')
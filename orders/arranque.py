@@ -0,0 +1,122 @@
+# arranque.py - Preparación de la base antes de iniciar los workers
+
+import os
+import json
+import time
+import zlib
+import logging
+from contextlib import contextmanager
+
+from django.conf import settings
+from django.core.management import call_command
+from django.db import connections
+from django.db.migrations.executor import MigrationExecutor
+from django.utils import timezone
+
+logger = logging.getLogger(__name__)
+
+# Clave del advisory lock de PostgreSQL que serializa el preflight
+CLAVE_LOCK = zlib.crc32(b'dononofre.preflight')
+
+
+class LockNoDisponible(Exception):
+    """Otro proceso tiene el lock de preflight y no se liberó a tiempo."""
+
+
+@contextmanager
+def lock_preflight(espera=300.0, alias=None):
+    """
+    Toma el advisory lock de sesión de PostgreSQL durante el bloque.
+
+    Con otros motores (SQLite local) no bloquea nada. Detrás de PgBouncer
+    (modo transaction) el lock se toma en DATABASE_DIRECT_URL; sin ella
+    no se puede tomar y se sigue sin lock.
+
+    Args:
+        espera (float): Segundos máximos para conseguir el lock.
+        alias (str, opcional): Conexión a usar (DB_SESSION_ALIAS por defecto).
+
+    Raises:
+        LockNoDisponible: Si el lock no se consiguió en ``espera`` segundos.
+    """
+    alias = alias or settings.DB_SESSION_ALIAS
+    conexion = connections[alias]
+    if conexion.vendor != 'postgresql':
+        yield
+        return
+    if settings.DB_PGBOUNCER and alias == 'default':
+        logger.warning("PgBouncer sin DATABASE_DIRECT_URL: preflight sin advisory lock")
+        yield
+        return
+
+    limite = time.monotonic() + espera
+    with conexion.cursor() as cursor:
+        while True:
+            cursor.execute('SELECT pg_try_advisory_lock(%s)', [CLAVE_LOCK])
+            if cursor.fetchone()[0]:
+                break
+            if time.monotonic() >= limite:
+                raise LockNoDisponible(f'Lock de preflight ocupado por más de {espera:.0f} s')
+            time.sleep(1)
+    try:
+        yield
+    finally:
+        with conexion.cursor() as cursor:
+            cursor.execute('SELECT pg_advisory_unlock(%s)', [CLAVE_LOCK])
+
+
+def migraciones_pendientes(alias=None):
+    """Devuelve las migraciones sin aplicar, como 'app.nombre'."""
+    alias = alias or settings.DB_SESSION_ALIAS
+    executor = MigrationExecutor(connections[alias])
+    plan = executor.migration_plan(executor.loader.graph.leaf_nodes())
+    return [f'{migracion.app_label}.{migracion.name}' for migracion, _ in plan]
+
+
+def preparar(marcador=None, espera=300.0):
+    """
+    Aplica las migraciones una sola vez y escribe el marcador de listo.
+
+    Entre varios procesos que arrancan a la vez, solo el que tiene el lock
+    migra; los demás esperan y encuentran el plan vacío. El marcador
+    anterior se borra primero, así nunca anuncia una base sin migrar.
+
+    Args:
+        marcador (str, opcional): Ruta del marcador (PREFLIGHT_MARKER por defecto).
+        espera (float): Segundos máximos de espera por el lock.
+
+    Returns:
+        dict: Contenido del marcador (fecha, pid y migraciones aplicadas).
+
+    Raises:
+        LockNoDisponible: Si otro proceso retiene el lock demasiado tiempo.
+    """
+    marcador = marcador or settings.PREFLIGHT_MARKER
+    if os.path.exists(marcador):
+        os.remove(marcador)
+
+    # Las migraciones van por la misma sesión que tiene el lock (y no por
+    # PgBouncer: algunas no son atómicas)
+    alias = settings.DB_SESSION_ALIAS
+    with lock_preflight(espera, alias):
+        pendientes = migraciones_pendientes(alias)
+        if pendientes:
+            logger.info("Aplicando %d migraciones", len(pendientes))
+            call_command('migrate', interactive=False, verbosity=0, database=alias)
+
+    datos = {
+        'fecha': timezone.now().isoformat(),
+        'pid': os.getpid(),
+        'migraciones_aplicadas': pendientes,
+    }
+    # Escritura atómica: quien lo lea nunca ve un archivo a medias
+    temporal = f'{marcador}.{os.getpid()}.tmp'
+    with open(temporal, 'w', encoding='utf-8') as f:
+        json.dump(datos, f)
+    os.replace(temporal, marcador)
+    return datos
+
+
+def esta_listo(marcador=None):
+    """Indica si el preflight de este arranque terminó (existe el marcador)."""
+    return os.path.exists(marcador or settings.PREFLIGHT_MARKER)
@@ -0,0 +1,249 @@
+# cache.py - Caché de lectura de pedidos para las consultas de estado
+
+import logging
+
+from django.conf import settings
+from django.core.cache import cache
+
+from .eventos import broker
+from .lru import LRUCache
+from .models import Order
+from .serializers import CAMPOS_PEDIDO, fila_a_dict, pedido_a_dict
+from .signals import order_changed
+
+logger = logging.getLogger(__name__)
+
+# Copia en memoria del proceso, delante de la caché compartida
+_pedidos_locales = LRUCache(settings.ORDERS_CACHE_LOCAL_SIZE)
+
+# Con LocMemCache cada worker tiene su propia "caché compartida"
+_CACHE_POR_PROCESO = settings.CACHES['default']['BACKEND'].endswith('LocMemCache')
+
+# Marca que deja ``invalidar`` en lugar de borrar la clave: mientras dura,
+# ``cache.add`` no puede volver a escribir un pedido leído antes del cambio
+_INVALIDADO = 'invalidado'
+
+
+def _vigente(fila):
+    """Indica si un valor de la caché compartida es un pedido (y no la marca)."""
+    return isinstance(fila, dict)
+
+
+def _clave(order_id):
+    return f"orders:pedido:{order_id}"
+
+
+def _ttls(fila):
+    """
+    Devuelve los TTL (compartido, local) de un pedido.
+
+    Un pedido PAID o FAILED ya no cambia de estado, por eso se guarda por
+    mucho tiempo; uno pendiente vence pronto por si se perdiera un aviso.
+    """
+    if Order.es_final(fila['status']):
+        return settings.ORDERS_CACHE_TTL_FINAL, settings.ORDERS_CACHE_TTL_FINAL
+    return settings.ORDERS_CACHE_TTL_PENDING, settings.ORDERS_CACHE_LOCAL_TTL_PENDING
+
+
+def _guardar(filas):
+    """
+    Guarda filas leídas de la base en la caché compartida y en la local.
+
+    Usa ``cache.add``: si entre la lectura y la escritura un cambio
+    invalidó el pedido, la marca ``_INVALIDADO`` ocupa la clave y la fila
+    (ya vieja) no se guarda. Solo las filas guardadas en la compartida
+    pasan a la local.
+    """
+    try:
+        for fila in filas:
+            ttl_compartido, ttl_local = _ttls(fila)
+            if cache.add(_clave(fila['id']), fila, timeout=ttl_compartido):
+                _pedidos_locales.set(fila['id'], fila, ttl=ttl_local)
+    except Exception as e:
+        # La caché es una optimización: si no responde se sigue con la base
+        logger.warning("Error guardando pedidos en caché: %s", e)
+
+
+async def _aguardar(filas):
+    """Versión asíncrona de ``_guardar``."""
+    try:
+        for fila in filas:
+            ttl_compartido, ttl_local = _ttls(fila)
+            if await cache.aadd(_clave(fila['id']), fila, timeout=ttl_compartido):
+                _pedidos_locales.set(fila['id'], fila, ttl=ttl_local)
+    except Exception as e:
+        logger.warning("Error guardando pedidos en caché: %s", e)
+
+
+def _leer_de_la_base(order_ids):
+    """
+    Lee pedidos de la base en el formato de la API.
+
+    Para varios pedidos proyecta con ``.values(*CAMPOS_PEDIDO)``; para uno
+    solo crear la instancia cuesta menos que la proyección (ver
+    ``benchmarks/serializacion.py``).
+    """
+    if len(order_ids) == 1:
+        return [pedido_a_dict(order) for order in Order.objects.filter(id=order_ids[0])]
+    return [
+        fila_a_dict(fila)
+        for fila in Order.objects.filter(id__in=order_ids).values(*CAMPOS_PEDIDO)
+    ]
+
+
+def obtener_pedido(order_id):
+    """
+    Devuelve los datos de un pedido leyendo primero de la caché.
+
+    Busca en la caché del proceso, luego en la caché compartida
+    (``CACHES['default']``) y por último en la base, guardando el
+    resultado en ambas cachés.
+
+    Args:
+        order_id (UUID|str): ID del pedido.
+
+    Returns:
+        dict|None: Campos CAMPOS_PEDIDO en formato de la API, o None si
+            el pedido no existe.
+    """
+    return obtener_pedidos([order_id]).get(str(order_id))
+
+
+async def aobtener_pedido(order_id):
+    """
+    Versión asíncrona de ``obtener_pedido`` (API async de la caché y del ORM).
+    """
+    broker.iniciar_listener()
+
+    order_id = str(order_id)
+    fila = _pedidos_locales.get(order_id)
+    if fila is not None:
+        return dict(fila)
+
+    try:
+        fila = await cache.aget(_clave(order_id))
+    except Exception as e:
+        logger.warning("Error leyendo pedidos de caché: %s", e)
+        fila = None
+    if _vigente(fila):
+        _pedidos_locales.set(order_id, fila, ttl=_ttls(fila)[1])
+        return dict(fila)
+
+    filas = [pedido_a_dict(order) async for order in Order.objects.filter(id=order_id)]
+    if not filas:
+        return None
+    fila = filas[0]
+    await _aguardar([fila])
+    return dict(fila)
+
+
+def obtener_pedidos(order_ids):
+    """
+    Devuelve los datos de varios pedidos leyendo primero de la caché.
+
+    Los pedidos que faltan en la caché compartida se leen con una única
+    consulta ``id__in``.
+
+    Args:
+        order_ids (iterable[UUID|str]): IDs de los pedidos.
+
+    Returns:
+        dict: Datos de cada pedido encontrado, por ID en texto. Los
+            pedidos inexistentes no aparecen.
+    """
+    # Sin LISTEN activo este proceso no se enteraría de cambios hechos
+    # por otros workers y su caché local quedaría desactualizada
+    broker.iniciar_listener()
+
+    pedidos = {}
+    faltantes = []
+    for order_id in order_ids:
+        order_id = str(order_id)
+        fila = _pedidos_locales.get(order_id)
+        if fila is not None:
+            pedidos[order_id] = dict(fila)
+        else:
+            faltantes.append(order_id)
+
+    if not faltantes:
+        return pedidos
+
+    try:
+        compartidos = cache.get_many([_clave(order_id) for order_id in faltantes])
+    except Exception as e:
+        logger.warning("Error leyendo pedidos de caché: %s", e)
+        compartidos = {}
+
+    sin_cache = []
+    for order_id in faltantes:
+        fila = compartidos.get(_clave(order_id))
+        if _vigente(fila):
+            _pedidos_locales.set(order_id, fila, ttl=_ttls(fila)[1])
+            pedidos[order_id] = dict(fila)
+        else:
+            sin_cache.append(order_id)
+
+    if sin_cache:
+        filas = _leer_de_la_base(sin_cache)
+        _guardar(filas)
+        for fila in filas:
+            pedidos[fila['id']] = dict(fila)
+
+    return pedidos
+
+
+def guardar_pedido(order):
+    """
+    Guarda en la caché un pedido recién creado o modificado.
+
+    Evita que la primera consulta de estado después de crear el pedido
+    tenga que ir a la base. Si el pedido cambió mientras tanto (por ejemplo
+    al registrar la deuda) no se guarda: la próxima consulta lo lee de la base.
+
+    Args:
+        order (Order): Pedido con los datos actuales.
+    """
+    _guardar([pedido_a_dict(order)])
+
+
+async def aguardar_pedido(order):
+    """Versión asíncrona de ``guardar_pedido``."""
+    await _aguardar([pedido_a_dict(order)])
+
+
+def invalidar(order_ids):
+    """
+    Quita pedidos de la caché local y los marca como invalidados en la
+    compartida por ORDERS_CACHE_TOMBSTONE_TTL segundos (ver ``_guardar``).
+    """
+    _invalidar_locales(order_ids)
+    try:
+        cache.set_many(
+            {_clave(order_id): _INVALIDADO for order_id in order_ids},
+            timeout=settings.ORDERS_CACHE_TOMBSTONE_TTL,
+        )
+    except Exception as e:
+        logger.exception("Error invalidando pedidos en caché: %s", e)
+
+
+def _invalidar_locales(order_ids):
+    for order_id in order_ids:
+        _pedidos_locales.discard(str(order_id))
+
+
+def _al_cambiar_pedido(sender, order_ids, **kwargs):
+    """Receptor de ``order_changed``: invalida los pedidos modificados."""
+    invalidar(order_ids)
+
+
+def _al_publicar(order_ids):
+    """Oyente del broker: también recibe los cambios de otros procesos (LISTEN/NOTIFY)."""
+    if _CACHE_POR_PROCESO:
+        invalidar(order_ids)
+    else:
+        # El proceso que aplicó el cambio ya limpió la caché compartida
+        _invalidar_locales(order_ids)
+
+
+order_changed.connect(_al_cambiar_pedido, dispatch_uid='orders.cache.invalidar')
+broker.al_publicar(_al_publicar)
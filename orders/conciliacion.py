@@ -0,0 +1,185 @@
+# conciliacion.py - Conciliación de pedidos pendientes contra AdamsPay
+
+import logging
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import timedelta
+
+import requests
+from django.db import transaction
+from django.utils import timezone
+
+from .adamspay import obtener_cliente
+from .models import Order
+from .notificaciones import determinar_estado
+from .signals import notificar_cambio
+
+logger = logging.getLogger(__name__)
+
+# Estados de la deuda (objStatus) que ya no admiten pago
+ESTADOS_DEUDA_CERRADA = ('expired', 'canceled', 'cancelled', 'deleted')
+
+
+class LimitadorTasa:
+    """
+    Limita la cantidad de llamadas por segundo entre todos los threads.
+
+    Reparte las llamadas a intervalos regulares de ``1 / por_segundo``;
+    cada thread reserva su turno con el lock y duerme fuera de él.
+    """
+
+    def __init__(self, por_segundo):
+        self.intervalo = 1.0 / por_segundo if por_segundo > 0 else 0.0
+        self._siguiente = time.monotonic()
+        self._lock = threading.Lock()
+
+    def esperar(self):
+        if not self.intervalo:
+            return
+        with self._lock:
+            ahora = time.monotonic()
+            turno = max(self._siguiente, ahora)
+            self._siguiente = turno + self.intervalo
+        if turno > ahora:
+            time.sleep(turno - ahora)
+
+
+def estado_de_deuda(datos):
+    """
+    Mapea la respuesta de ``GET /api/v1/debts/{docId}`` al estado del pedido.
+
+    Args:
+        datos (dict): Cuerpo de la respuesta de AdamsPay.
+
+    Returns:
+        str: 'PAID', 'FAILED' o 'PENDING'. Una deuda vencida o cancelada
+            sin pago cuenta como 'FAILED'.
+    """
+    estado = determinar_estado(datos)
+    if estado == 'PENDING':
+        obj_status = datos.get('debt', {}).get('objStatus', {})
+        if isinstance(obj_status, dict) and str(obj_status.get('status', '')).lower() in ESTADOS_DEUDA_CERRADA:
+            estado = 'FAILED'
+    return estado
+
+
+def _consultar(order_id, limitador):
+    """
+    Consulta una deuda respetando el límite de tasa.
+
+    Returns:
+        tuple: (order_id, estado o None, error o None).
+    """
+    limitador.esperar()
+    try:
+        response = obtener_cliente().consultar_deuda(str(order_id))
+    except requests.RequestException as e:
+        return order_id, None, type(e).__name__
+    if response.status_code == 404:
+        return order_id, None, 'Deuda no encontrada'
+    if response.status_code != 200:
+        return order_id, None, f'HTTP {response.status_code}'
+    try:
+        return order_id, estado_de_deuda(response.json()), None
+    except ValueError:
+        return order_id, None, 'Respuesta inválida'
+
+
+def conciliar_pendientes(antiguedad=timedelta(minutes=30), chunk_size=500, hilos=8,
+                         por_segundo=20.0, dry_run=False, limite=None):
+    """
+    Consulta en AdamsPay los pedidos PENDING antiguos y aplica su estado real.
+
+    Los pedidos se leen en streaming con ``.iterator(chunk_size=...)``
+    (solo los IDs; detrás de PgBouncer, sin cursores del lado del
+    servidor, el driver trae todos los IDs de una vez), las deudas se consultan con un pool acotado de threads
+    y un límite de tasa compartido, y los resultados de cada chunk se
+    aplican con un ``UPDATE`` condicional por estado destino
+    (``transicionar``), igual que la cola de webhooks.
+
+    Args:
+        antiguedad (timedelta): Solo pedidos creados hace más de esto.
+        chunk_size (int): Pedidos por chunk (lectura y actualización).
+        hilos (int): Consultas simultáneas a AdamsPay.
+        por_segundo (float): Máximo de consultas por segundo (0 = sin límite).
+        dry_run (bool): Si es True no modifica ningún pedido.
+        limite (int, opcional): Máximo de pedidos a revisar.
+
+    Returns:
+        dict: Resumen con revisados, pagados, fallidos, pendientes,
+            errores (por tipo), actualizados, segundos e interrumpido
+            (True si se cortó porque el circuit breaker quedó abierto).
+    """
+    inicio = time.monotonic()
+    resumen = {
+        'revisados': 0,
+        'pagados': 0,
+        'fallidos': 0,
+        'pendientes': 0,
+        'errores': {},
+        'actualizados': 0,
+        'segundos': 0.0,
+        'interrumpido': False,
+    }
+
+    ids = (
+        Order.objects
+        .filter(status='PENDING', created_at__lt=timezone.now() - antiguedad)
+        .order_by('created_at')
+        .values_list('id', flat=True)
+    )
+    if limite:
+        ids = ids[:limite]
+
+    limitador = LimitadorTasa(por_segundo)
+    chunk = []
+    with ThreadPoolExecutor(max_workers=hilos, thread_name_prefix='conciliacion') as pool:
+        for order_id in ids.iterator(chunk_size=chunk_size):
+            chunk.append(order_id)
+            if len(chunk) >= chunk_size:
+                _conciliar_chunk(chunk, pool, limitador, dry_run, resumen)
+                chunk = []
+                # Con AdamsPay caído no tiene sentido seguir recorriendo pedidos
+                if obtener_cliente().circuito.estado == 'abierto':
+                    resumen['interrumpido'] = True
+                    break
+        else:
+            if chunk:
+                _conciliar_chunk(chunk, pool, limitador, dry_run, resumen)
+
+    resumen['segundos'] = round(time.monotonic() - inicio, 2)
+    return resumen
+
+
+def _conciliar_chunk(chunk, pool, limitador, dry_run, resumen):
+    """Consulta un chunk de pedidos en paralelo y aplica los cambios por lotes."""
+    por_estado = {'PAID': [], 'FAILED': []}
+    for order_id, estado, error in pool.map(lambda order_id: _consultar(order_id, limitador), chunk):
+        resumen['revisados'] += 1
+        if error:
+            resumen['errores'][error] = resumen['errores'].get(error, 0) + 1
+        elif estado in por_estado:
+            por_estado[estado].append(order_id)
+        else:
+            resumen['pendientes'] += 1
+
+    resumen['pagados'] += len(por_estado['PAID'])
+    resumen['fallidos'] += len(por_estado['FAILED'])
+
+    for nuevo_estado, ids in por_estado.items():
+        if not ids or dry_run:
+            continue
+        with transaction.atomic():
+            # Solo se avisa de los pedidos que la transición realmente cambia
+            cambiados = list(
+                Order.objects.select_for_update()
+                .filter(id__in=ids, status__in=Order.estados_origen(nuevo_estado))
+                .values_list('id', flat=True)
+            )
+            if not cambiados:
+                continue
+            actualizados = Order.objects.filter(id__in=cambiados).transicionar(nuevo_estado)
+            resumen['actualizados'] += actualizados
+            logger.info("Conciliación: %d pedidos actualizados a %s", actualizados, nuevo_estado)
+            notificar_cambio(cambiados, nuevo_estado)
@@ -0,0 +1,308 @@
+# deudas.py - Registro de deudas en AdamsPay
+
+import logging
+from datetime import timedelta
+
+import httpx
+import requests
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.db import transaction
+from django.utils import timezone
+
+from .adamspay import (
+    ADAMSPAY_API_KEY, ADAMSPAY_APP_SLUG, ADAMSPAY_BASE_URL,
+    AdamsPayNoDisponible, obtener_cliente, obtener_cliente_async,
+)
+from .models import DebtRegistration, Order
+from .signals import notificar_cambio
+
+logger = logging.getLogger(__name__)
+logger_payloads = logging.getLogger('orders.payloads')
+
+
+def modo_simulacion():
+    """Indica si no hay una API Key real configurada."""
+    return not ADAMSPAY_API_KEY or ADAMSPAY_API_KEY == 'su_api_key_aqui'
+
+
+def url_simulada(order):
+    """Devuelve la URL de pago simulada para un pedido."""
+    return f"{ADAMSPAY_BASE_URL}/pay/{ADAMSPAY_APP_SLUG}/debt/{order.id}"
+
+
+def construir_payload(order):
+    """
+    Construye el cuerpo de la deuda para la API de AdamsPay.
+
+    Args:
+        order (Order): Pedido a registrar.
+
+    Returns:
+        dict: Payload con la deuda, válida hasta ``order.expires_at``
+            (ORDERS_VALID_HOURS desde ahora si el pedido no lo tiene).
+    """
+    valor_pyg = int(float(order.amount))
+    inicio = timezone.now()
+    fin = order.expires_at or inicio + timedelta(hours=settings.ORDERS_VALID_HOURS)
+
+    return {
+        "debt": {
+            "docId": str(order.id),
+            "label": f"Don Onofre - {order.product_name}",
+            "amount": {
+                "currency": "PYG",
+                "value": str(valor_pyg)
+            },
+            "validPeriod": {
+                "start": inicio.strftime("%Y-%m-%dT%H:%M:%S"),
+                "end": fin.strftime("%Y-%m-%dT%H:%M:%S")
+            },
+            "target": {
+                "type": "WEB",
+                "label": "Don Onofre Restaurante"
+            }
+        }
+    }
+
+
+def registrar_deuda(order, propagar_errores=False):
+    """
+    Registra la deuda de un pedido en AdamsPay y guarda su payment_link.
+
+    Si no hay API Key, AdamsPay responde con error o el circuit breaker
+    está abierto se usa la URL simulada, igual que antes de existir el
+    modo outbox.
+
+    Args:
+        order (Order): Pedido a registrar.
+        propagar_errores (bool): Si es True, los errores de conexión y el
+            circuito abierto se propagan en lugar de usar la URL simulada
+            (el worker del outbox los reintenta más tarde).
+
+    Returns:
+        dict: Resultado del registro.
+            - payment_link (str): URL de pago asignada.
+            - registrado (bool): True si AdamsPay aceptó la deuda.
+            - adamspay_id (str, opcional): ID de la deuda en AdamsPay.
+            - warning (str, opcional): Advertencia si se usó la URL simulada.
+
+    Raises:
+        requests.RequestException: Si falla la conexión con AdamsPay y
+            propagar_errores es True.
+    """
+    if modo_simulacion():
+        logger.info("Modo simulación - Configure una API Key real")
+        return _guardar_link(order, url_simulada(order), {
+            'registrado': False,
+            'warning': 'Configure ADAMSPAY_API_KEY en Render para integración real'
+        })
+
+    payload = construir_payload(order)
+    logger_payloads.info("Deuda para AdamsPay: %s", payload)
+
+    try:
+        response = obtener_cliente().crear_deuda(payload)
+    except AdamsPayNoDisponible:
+        if propagar_errores:
+            raise
+        logger.warning("AdamsPay no disponible (circuito abierto) - Usando URL simulada")
+        return _guardar_link(order, url_simulada(order), {
+            'registrado': False,
+            'warning': 'AdamsPay no disponible - Usando URL simulada'
+        })
+    except requests.RequestException as e:
+        if propagar_errores:
+            raise
+        logger.warning("Error de conexión con AdamsPay: %s", e)
+        return _guardar_link(order, url_simulada(order), {
+            'registrado': False,
+            'warning': 'Error de conexión con AdamsPay - Usando URL simulada'
+        })
+
+    return _procesar_respuesta(order, response)
+
+
+async def aregistrar_deuda(order):
+    """
+    Versión asíncrona de ``registrar_deuda`` para las vistas ASGI.
+
+    La llamada a AdamsPay usa el cliente httpx y no ocupa un thread
+    mientras espera; solo el guardado del payment_link pasa por el ORM
+    síncrono. Ante errores usa siempre la URL simulada.
+
+    Args:
+        order (Order): Pedido a registrar.
+
+    Returns:
+        dict: Igual que ``registrar_deuda``.
+    """
+    if modo_simulacion():
+        logger.info("Modo simulación - Configure una API Key real")
+        return await sync_to_async(_guardar_link)(order, url_simulada(order), {
+            'registrado': False,
+            'warning': 'Configure ADAMSPAY_API_KEY en Render para integración real'
+        })
+
+    payload = construir_payload(order)
+    logger_payloads.info("Deuda para AdamsPay: %s", payload)
+
+    try:
+        response = await obtener_cliente_async().crear_deuda(payload)
+    except AdamsPayNoDisponible:
+        logger.warning("AdamsPay no disponible (circuito abierto) - Usando URL simulada")
+        return await sync_to_async(_guardar_link)(order, url_simulada(order), {
+            'registrado': False,
+            'warning': 'AdamsPay no disponible - Usando URL simulada'
+        })
+    except httpx.HTTPError as e:
+        logger.warning("Error de conexión con AdamsPay: %s", e)
+        return await sync_to_async(_guardar_link)(order, url_simulada(order), {
+            'registrado': False,
+            'warning': 'Error de conexión con AdamsPay - Usando URL simulada'
+        })
+
+    return await sync_to_async(_procesar_respuesta)(order, response)
+
+
+def _procesar_respuesta(order, response):
+    """Guarda el payment_link según la respuesta de AdamsPay (requests o httpx)."""
+    if response.status_code in [200, 201]:
+        data = response.json()
+        logger_payloads.info("Respuesta AdamsPay: %s", data)
+
+        if 'debt' in data and 'payUrl' in data['debt']:
+            return _guardar_link(order, data['debt']['payUrl'], {
+                'registrado': True,
+                'adamspay_id': data['debt'].get('id'),
+            })
+
+    # Fallback si hay error
+    logger.warning("Error AdamsPay %s: %s", response.status_code, response.text[:500],
+                   extra={'order_id': str(order.id)})
+    return _guardar_link(order, url_simulada(order), {
+        'registrado': False,
+        'warning': f'Error AdamsPay {response.status_code} - Usando URL simulada'
+    })
+
+
+def _guardar_link(order, payment_url, resultado):
+    """Persiste el payment_link del pedido y lo agrega al resultado."""
+    ahora = timezone.now()
+    Order.objects.filter(id=order.id).actualizar(payment_link=payment_url, updated_at=ahora)
+    order.payment_link = payment_url
+    order.updated_at = ahora
+    order.version += 1
+    notificar_cambio([order.id])
+    resultado['payment_link'] = payment_url
+    return resultado
+
+
+def encolar_registro(order):
+    """
+    Crea el registro pendiente (outbox) de la deuda de un pedido.
+
+    Debe llamarse dentro de la misma transacción que crea el pedido.
+    """
+    return DebtRegistration.objects.create(order=order)
+
+
+def procesar_registros_pendientes(lote=10):
+    """
+    Registra en AdamsPay un lote de deudas pendientes del outbox.
+
+    Cada registro se reclama con ``SELECT ... FOR UPDATE SKIP LOCKED`` en
+    una transacción corta que lo deja PROCESSING con una reserva hasta
+    ``next_attempt_at`` y confirma enseguida. La llamada a AdamsPay se hace
+    después, sin transacción ni bloqueo abierto, y el resultado se guarda
+    en otra transacción corta. Varios procesos ``registrar_deudas`` pueden
+    trabajar en paralelo sin registrar dos veces la misma deuda; si uno
+    muere, otro retoma sus registros al vencer la reserva.
+
+    Args:
+        lote (int): Cantidad máxima de registros a procesar.
+
+    Returns:
+        int: Cantidad de registros procesados en este lote.
+    """
+    procesados = 0
+
+    for _ in range(lote):
+        registro = _reclamar_registro()
+        if registro is None:
+            break
+
+        _procesar_registro(registro)
+        procesados += 1
+
+    return procesados
+
+
+def _reclamar_registro():
+    """
+    Reclama un registro pendiente o con la reserva vencida.
+
+    Returns:
+        DebtRegistration|None: El registro, ya PROCESSING y con el intento
+            contado, o None si no hay pendientes.
+    """
+    ahora = timezone.now()
+    with transaction.atomic():
+        registro = (
+            DebtRegistration.objects
+            .select_for_update(skip_locked=True, of=('self',))
+            .select_related('order')
+            .filter(status__in=('PENDING', 'PROCESSING'), next_attempt_at__lte=ahora)
+            .order_by('next_attempt_at')
+            .first()
+        )
+        if registro is None:
+            return None
+
+        registro.status = 'PROCESSING'
+        registro.attempts += 1
+        registro.next_attempt_at = ahora + timedelta(seconds=settings.ADAMSPAY_OUTBOX_LEASE)
+        registro.save(update_fields=['status', 'attempts', 'next_attempt_at'])
+    return registro
+
+
+def _procesar_registro(registro):
+    """Registra la deuda de un registro reclamado (fuera de toda transacción) y guarda el resultado."""
+    cambios = {}
+    pedido_fallido = False
+    try:
+        resultado = registrar_deuda(registro.order, propagar_errores=True)
+    except requests.RequestException as e:
+        logger.warning("Error registrando deuda %s: %s", registro.order_id, e)
+        cambios['last_error'] = str(e)
+        if registro.attempts >= settings.ADAMSPAY_OUTBOX_MAX_ATTEMPTS:
+            # Mismo fallback que el modo síncrono
+            _guardar_link(registro.order, url_simulada(registro.order), {})
+            cambios.update(status='FAILED', processed_at=timezone.now())
+        else:
+            # Backoff exponencial: 2, 4, 8... segundos
+            cambios.update(
+                status='PENDING',
+                next_attempt_at=timezone.now() + timedelta(seconds=2 ** registro.attempts),
+            )
+    except Exception as e:
+        logger.exception("Error inesperado registrando deuda %s: %s", registro.order_id, e)
+        cambios.update(last_error=str(e), status='FAILED', processed_at=timezone.now())
+        # Sin deuda el pedido no se puede pagar: pasa a FAILED y el cliente deja de esperar el link
+        pedido_fallido = True
+    else:
+        cambios.update(
+            status='DONE',
+            last_error=resultado.get('warning', ''),
+            processed_at=timezone.now(),
+        )
+
+    with transaction.atomic():
+        # Solo si la reserva sigue siendo de este worker (no venció y otro la retomó)
+        vigente = DebtRegistration.objects.filter(
+            pk=registro.pk, status='PROCESSING', attempts=registro.attempts,
+        ).update(**cambios)
+        if vigente and pedido_fallido and Order.objects.filter(id=registro.order_id).transicionar('FAILED'):
+            notificar_cambio([registro.order_id], status='FAILED')
+    if not vigente:
+        logger.warning("Reserva del registro de deuda %s vencida: otro worker lo retomó", registro.order_id)
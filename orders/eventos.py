@@ -0,0 +1,205 @@
+# eventos.py - Difusión de cambios de pedidos a clientes en espera
+
+import os
+import time
+import uuid
+import select
+import asyncio
+import logging
+import threading
+
+from django.conf import settings
+from django.db import connections
+
+from .signals import order_changed
+
+logger = logging.getLogger(__name__)
+
+# Canal de PostgreSQL para avisar a los demás procesos (LISTEN/NOTIFY)
+CANAL_PG = 'orders_changed'
+
+# pg_notify admite payloads de hasta 8000 bytes: ~100 UUIDs por aviso
+IDS_POR_AVISO = 100
+
+
+class Suscripcion:
+    """
+    Espera de un cliente por cambios en un pedido.
+
+    Se registra antes de leer el estado actual para no perder un cambio
+    que ocurra entre la lectura y la espera.
+    """
+
+    def __init__(self, broker, order_id, asincrona=False):
+        self.broker = broker
+        self.order_id = order_id
+        self.loop = asyncio.get_running_loop() if asincrona else None
+        self.evento = asyncio.Event() if asincrona else threading.Event()
+
+    def _avisar(self):
+        if self.loop is not None:
+            self.loop.call_soon_threadsafe(self.evento.set)
+        else:
+            self.evento.set()
+
+    def limpiar(self):
+        self.evento.clear()
+
+    def esperar(self, timeout):
+        """Bloquea hasta un cambio o ``timeout`` segundos. Devuelve True si hubo cambio."""
+        return self.evento.wait(timeout)
+
+    async def aesperar(self, timeout):
+        """Versión asíncrona de ``esperar``."""
+        try:
+            await asyncio.wait_for(self.evento.wait(), timeout)
+            return True
+        except asyncio.TimeoutError:
+            return False
+
+    def cancelar(self):
+        self.broker.cancelar(self)
+
+
+class Broker:
+    """
+    Reparte los avisos de ``order_changed`` entre las suscripciones del proceso.
+
+    Con PostgreSQL cada proceso escucha además el canal ``orders_changed``,
+    así un cambio aplicado en otro worker de gunicorn o en el consumidor de
+    webhooks también despierta a los clientes que esperan aquí.
+    """
+
+    def __init__(self):
+        self._suscripciones = {}
+        self._oyentes = []
+        self._lock = threading.Lock()
+        self._listener_pid = None
+
+    def al_publicar(self, oyente):
+        """
+        Registra una función que recibe los order_ids de cada aviso,
+        tanto locales como de otros procesos (por ejemplo para invalidar
+        cachés en memoria).
+        """
+        self._oyentes.append(oyente)
+
+    def suscribir(self, order_id, asincrona=False):
+        self.iniciar_listener()
+        suscripcion = Suscripcion(self, order_id, asincrona=asincrona)
+        with self._lock:
+            self._suscripciones.setdefault(order_id, set()).add(suscripcion)
+        return suscripcion
+
+    def cancelar(self, suscripcion):
+        with self._lock:
+            suscripciones = self._suscripciones.get(suscripcion.order_id)
+            if suscripciones is not None:
+                suscripciones.discard(suscripcion)
+                if not suscripciones:
+                    del self._suscripciones[suscripcion.order_id]
+
+    def publicar(self, order_ids):
+        """Avisa a los oyentes y despierta a las suscripciones de los pedidos indicados."""
+        for oyente in self._oyentes:
+            try:
+                oyente(order_ids)
+            except Exception as e:
+                logger.exception("Error en oyente de pedidos: %s", e)
+        with self._lock:
+            avisar = [
+                suscripcion
+                for order_id in order_ids
+                for suscripcion in self._suscripciones.get(order_id, ())
+            ]
+        for suscripcion in avisar:
+            suscripcion._avisar()
+
+    def iniciar_listener(self):
+        """
+        Arranca (una vez por proceso) el thread LISTEN de PostgreSQL.
+
+        Detrás de PgBouncer en modo transaction LISTEN necesita
+        DATABASE_DIRECT_URL; sin ella este proceso solo recibe sus propios
+        avisos.
+        """
+        if connections[settings.DB_SESSION_ALIAS].vendor != 'postgresql':
+            return
+        pid = os.getpid()
+        if self._listener_pid == pid:
+            return
+        with self._lock:
+            if self._listener_pid == pid:
+                return
+            self._listener_pid = pid
+        if settings.DB_PGBOUNCER and settings.DB_SESSION_ALIAS == 'default':
+            logger.warning("PgBouncer sin DATABASE_DIRECT_URL: avisos de otros procesos desactivados")
+            return
+        threading.Thread(target=self._escuchar, name='orders-listener', daemon=True).start()
+
+    def _escuchar(self):
+        while True:
+            try:
+                self._escuchar_conexion()
+            except Exception as e:
+                logger.warning("Listener de pedidos desconectado: %s", e)
+                time.sleep(5)
+
+    def _escuchar_conexion(self):
+        db = connections[settings.DB_SESSION_ALIAS]
+        # Conexión propia, fuera del pool: LISTEN la retiene mientras viva el proceso
+        conexion = db.Database.connect(**db.get_connection_params())
+        conexion.autocommit = True
+        try:
+            with conexion.cursor() as cursor:
+                cursor.execute(f'LISTEN {CANAL_PG}')
+
+            while True:
+                if hasattr(conexion, 'poll'):
+                    # psycopg2
+                    if select.select([conexion], [], [], 30) == ([], [], []):
+                        continue
+                    conexion.poll()
+                    avisos = []
+                    while conexion.notifies:
+                        avisos.append(conexion.notifies.pop(0).payload)
+                else:
+                    # psycopg 3
+                    avisos = [aviso.payload for aviso in conexion.notifies(timeout=30)]
+
+                for payload in avisos:
+                    self.publicar(_decodificar(payload))
+        finally:
+            conexion.close()
+
+
+def _decodificar(payload):
+    order_ids = []
+    for valor in payload.split(','):
+        try:
+            order_ids.append(uuid.UUID(valor))
+        except ValueError:
+            pass
+    return order_ids
+
+
+broker = Broker()
+
+
+def _al_cambiar_pedido(sender, order_ids, **kwargs):
+    """Receptor de ``order_changed``: avisa a este proceso y a los demás."""
+    broker.publicar(order_ids)
+
+    db = connections['default']
+    if db.vendor != 'postgresql':
+        return
+    try:
+        with db.cursor() as cursor:
+            for i in range(0, len(order_ids), IDS_POR_AVISO):
+                payload = ','.join(str(order_id) for order_id in order_ids[i:i + IDS_POR_AVISO])
+                cursor.execute('SELECT pg_notify(%s, %s)', [CANAL_PG, payload])
+    except Exception as e:
+        logger.exception("Error enviando NOTIFY de pedidos: %s", e)
+
+
+order_changed.connect(_al_cambiar_pedido, dispatch_uid='orders.eventos.broker')
@@ -0,0 +1,233 @@
+# idempotencia.py - Header Idempotency-Key en la creación de pedidos
+
+import asyncio
+import hashlib
+import json
+import logging
+import time
+from datetime import timedelta
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.db import IntegrityError, transaction
+from django.utils import timezone
+
+from .models import IdempotencyKey
+from .renderers import dumps, loads
+
+logger = logging.getLogger(__name__)
+
+LARGO_MAXIMO = 255
+
+# Pausas entre lecturas mientras se espera a la solicitud original
+_PAUSA_INICIAL = 0.05
+_PAUSA_MAXIMA = 0.5
+
+
+class ErrorIdempotencia(Exception):
+    """Error de la clave; ``codigo`` es el estado HTTP a responder."""
+
+    codigo = 400
+
+
+class ClaveInvalida(ErrorIdempotencia):
+    """El header está vacío, supera LARGO_MAXIMO o no es ASCII imprimible."""
+
+
+class ClaveReutilizada(ErrorIdempotencia):
+    """La clave ya se usó con otra solicitud (otro endpoint u otro cuerpo)."""
+
+    codigo = 422
+
+
+class SolicitudEnCurso(ErrorIdempotencia):
+    """La solicitud original sigue en curso después de ORDERS_IDEMPOTENCY_WAIT."""
+
+    codigo = 409
+
+
+def validar_clave(clave):
+    """
+    Raises:
+        ClaveInvalida: Si la clave no es válida.
+    """
+    if not clave or len(clave) > LARGO_MAXIMO or not clave.isascii() or not clave.isprintable():
+        raise ClaveInvalida(f'Idempotency-Key debe tener entre 1 y {LARGO_MAXIMO} caracteres ASCII')
+
+
+def huella_solicitud(endpoint, datos):
+    """SHA-256 del endpoint y los datos (con las claves ordenadas)."""
+    contenido = json.dumps([endpoint, datos], sort_keys=True, default=str, ensure_ascii=False)
+    return hashlib.sha256(contenido.encode('utf-8')).hexdigest()
+
+
+def _reservar(clave, huella):
+    """
+    Intenta quedarse con la clave.
+
+    La inserción contra el índice único decide quién ejecuta. Una clave
+    vencida, o en curso desde hace más de ORDERS_IDEMPOTENCY_LOCK segundos
+    (el proceso que la tenía murió), se toma con un UPDATE condicional:
+    solo un proceso lo gana.
+
+    Returns:
+        tuple: (registro propio, registro de otra solicitud); uno de los
+        dos es None. Ambos son None si la clave se liberó entre medio.
+
+    Raises:
+        ClaveReutilizada: Si la clave vigente es de otra solicitud.
+    """
+    ahora = timezone.now()
+    vence = ahora + timedelta(seconds=settings.ORDERS_IDEMPOTENCY_TTL)
+    try:
+        with transaction.atomic():
+            propio = IdempotencyKey.objects.create(
+                key=clave, request_hash=huella, locked_at=ahora, expires_at=vence,
+            )
+        return propio, None
+    except IntegrityError:
+        pass
+
+    existente = IdempotencyKey.objects.filter(key=clave).first()
+    if existente is None:
+        return None, None
+
+    if existente.expires_at <= ahora:
+        tomada = IdempotencyKey.objects.filter(
+            pk=existente.pk, expires_at=existente.expires_at,
+        ).update(request_hash=huella, status_code=None, response=None, locked_at=ahora, expires_at=vence)
+        return (IdempotencyKey.objects.get(pk=existente.pk), None) if tomada else (None, None)
+
+    if existente.request_hash != huella:
+        raise ClaveReutilizada('Idempotency-Key ya usada con otra solicitud')
+
+    if _abandonada(existente, ahora):
+        tomada = IdempotencyKey.objects.filter(
+            pk=existente.pk, status_code__isnull=True, locked_at=existente.locked_at,
+        ).update(locked_at=ahora)
+        if tomada:
+            logger.warning("Idempotency-Key %s abandonada: se vuelve a ejecutar", clave)
+            existente.locked_at = ahora
+            return existente, None
+    return None, existente
+
+
+def _abandonada(registro, ahora=None):
+    limite = (ahora or timezone.now()) - timedelta(seconds=settings.ORDERS_IDEMPOTENCY_LOCK)
+    return registro.status_code is None and registro.locked_at <= limite
+
+
+def _leer(pk):
+    return IdempotencyKey.objects.filter(pk=pk).first()
+
+
+def _terminar(registro, datos, codigo):
+    """Guarda la respuesta; un error 5xx libera la clave para reintentar."""
+    if codigo >= 500:
+        _liberar(registro)
+    else:
+        # Pasada por el mismo JSON de la API: la repetición es idéntica a la original
+        IdempotencyKey.objects.filter(pk=registro.pk).update(status_code=codigo, response=loads(dumps(datos)))
+
+
+def _liberar(registro):
+    IdempotencyKey.objects.filter(pk=registro.pk, status_code__isnull=True).delete()
+
+
+def ejecutar(clave, endpoint, datos, funcion):
+    """
+    Ejecuta ``funcion`` una sola vez por Idempotency-Key.
+
+    La primera solicitud con la clave ejecuta y guarda su respuesta
+    (salvo un error 5xx o una excepción, que liberan la clave). Las
+    repeticiones dentro de ORDERS_IDEMPOTENCY_TTL devuelven la respuesta
+    guardada sin ejecutar nada; las que llegan mientras la primera sigue
+    en curso la esperan hasta ORDERS_IDEMPOTENCY_WAIT segundos.
+
+    Args:
+        clave (str): Valor del header Idempotency-Key.
+        endpoint (str): Nombre del endpoint (parte de la huella).
+        datos (dict): Datos de la solicitud (parte de la huella).
+        funcion (callable): Sin argumentos; devuelve (datos, código HTTP).
+
+    Returns:
+        tuple: (datos, código HTTP, repetida).
+
+    Raises:
+        ClaveInvalida, ClaveReutilizada, SolicitudEnCurso: Ver cada excepción.
+    """
+    validar_clave(clave)
+    huella = huella_solicitud(endpoint, datos)
+    limite = time.monotonic() + settings.ORDERS_IDEMPOTENCY_WAIT
+
+    while True:
+        propio, existente = _reservar(clave, huella)
+        if propio is not None:
+            try:
+                datos_respuesta, codigo = funcion()
+            except BaseException:
+                _liberar(propio)
+                raise
+            _terminar(propio, datos_respuesta, codigo)
+            return datos_respuesta, codigo, False
+
+        pausa = _PAUSA_INICIAL
+        while existente is not None and existente.status_code is None and not _abandonada(existente):
+            if time.monotonic() >= limite:
+                raise SolicitudEnCurso('Hay una solicitud con la misma Idempotency-Key en curso')
+            time.sleep(pausa)
+            pausa = min(pausa * 2, _PAUSA_MAXIMA)
+            existente = _leer(existente.pk)
+
+        if existente is not None and existente.status_code is not None:
+            return existente.response, existente.status_code, True
+        # Liberada o abandonada: se vuelve a intentar reservarla
+
+
+async def aejecutar(clave, endpoint, datos, funcion):
+    """
+    Versión asíncrona de ``ejecutar``: ``funcion`` es una corrutina y la
+    espera de los duplicados no ocupa un thread.
+    """
+    validar_clave(clave)
+    huella = huella_solicitud(endpoint, datos)
+    limite = time.monotonic() + settings.ORDERS_IDEMPOTENCY_WAIT
+
+    while True:
+        propio, existente = await sync_to_async(_reservar)(clave, huella)
+        if propio is not None:
+            try:
+                datos_respuesta, codigo = await funcion()
+            except BaseException:
+                await sync_to_async(_liberar)(propio)
+                raise
+            await sync_to_async(_terminar)(propio, datos_respuesta, codigo)
+            return datos_respuesta, codigo, False
+
+        pausa = _PAUSA_INICIAL
+        while existente is not None and existente.status_code is None and not _abandonada(existente):
+            if time.monotonic() >= limite:
+                raise SolicitudEnCurso('Hay una solicitud con la misma Idempotency-Key en curso')
+            await asyncio.sleep(pausa)
+            pausa = min(pausa * 2, _PAUSA_MAXIMA)
+            existente = await sync_to_async(_leer)(existente.pk)
+
+        if existente is not None and existente.status_code is not None:
+            return existente.response, existente.status_code, True
+
+
+def purgar_vencidas(lote=1000):
+    """
+    Borra un lote de claves vencidas.
+
+    Returns:
+        int: Cantidad de claves borradas.
+    """
+    ids = list(
+        IdempotencyKey.objects.filter(expires_at__lte=timezone.now())
+        .values_list('pk', flat=True)[:lote]
+    )
+    if not ids:
+        return 0
+    borradas, _ = IdempotencyKey.objects.filter(pk__in=ids, expires_at__lte=timezone.now()).delete()
+    return borradas
@@ -0,0 +1,57 @@
+# lru.py - Caché LRU acotada y thread-safe para uso en memoria del proceso
+
+import time
+import threading
+from collections import OrderedDict
+
+
+class LRUCache:
+    """
+    Diccionario con tamaño máximo que descarta la entrada menos usada.
+
+    Cada entrada puede tener un TTL opcional en segundos. Se comparte
+    entre los threads del worker, por eso todas las operaciones toman
+    un lock.
+    """
+
+    def __init__(self, maxsize=1024):
+        self.maxsize = maxsize
+        self._datos = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, clave, default=None):
+        with self._lock:
+            try:
+                valor, expira = self._datos[clave]
+            except KeyError:
+                return default
+            if expira is not None and expira < time.monotonic():
+                del self._datos[clave]
+                return default
+            self._datos.move_to_end(clave)
+            return valor
+
+    def set(self, clave, valor=True, ttl=None):
+        expira = time.monotonic() + ttl if ttl is not None else None
+        with self._lock:
+            self._datos[clave] = (valor, expira)
+            self._datos.move_to_end(clave)
+            if len(self._datos) > self.maxsize:
+                self._datos.popitem(last=False)
+
+    def discard(self, clave):
+        with self._lock:
+            self._datos.pop(clave, None)
+
+    def clear(self):
+        with self._lock:
+            self._datos.clear()
+
+    def __contains__(self, clave):
+        return self.get(clave, _AUSENTE) is not _AUSENTE
+
+    def __len__(self):
+        return len(self._datos)
+
+
+_AUSENTE = object()
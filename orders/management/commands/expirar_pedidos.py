@@ -0,0 +1,46 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from orders.vencimientos import expirar_pedidos_vencidos
+
+
+class Command(BaseCommand):
+    help = (
+        "Pasa a FAILED los pedidos PENDING cuya deuda en AdamsPay ya venció. "
+        "Trabaja en lotes cortos y puede correr junto al tráfico normal."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--lote', type=int, default=1000,
+                            help='Pedidos a vencer por transacción (default: 1000)')
+        parser.add_argument('--espera', type=float, default=60.0,
+                            help='Segundos de espera cuando no hay vencidos (default: 60)')
+        parser.add_argument('--pausa', type=float, default=0.1,
+                            help='Segundos entre lotes para no saturar la base (default: 0.1)')
+        parser.add_argument('--una-vez', action='store_true',
+                            help='Vence los pedidos actuales y termina (para cron)')
+
+    def handle(self, *args, **options):
+        lote = options['lote']
+
+        self.stdout.write("Barrido de pedidos vencidos iniciado")
+
+        total = 0
+        try:
+            while True:
+                vencidos = expirar_pedidos_vencidos(lote)
+                total += vencidos
+                if vencidos:
+                    self.stdout.write(f"Pedidos vencidos: {vencidos}")
+
+                if vencidos < lote:
+                    if options['una_vez']:
+                        break
+                    time.sleep(options['espera'])
+                else:
+                    time.sleep(options['pausa'])
+        except KeyboardInterrupt:
+            pass
+
+        self.stdout.write(self.style.SUCCESS(f"Barrido detenido ({total} pedidos vencidos)"))
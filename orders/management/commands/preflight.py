@@ -0,0 +1,38 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from orders.arranque import LockNoDisponible, esta_listo, preparar
+
+
+class Command(BaseCommand):
+    help = (
+        "Prepara la base antes de iniciar los workers: toma un advisory lock de "
+        "PostgreSQL, aplica las migraciones pendientes una sola vez y escribe el "
+        "marcador de listo."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--marcador',
+                            help='Ruta del marcador de listo (default: PREFLIGHT_MARKER)')
+        parser.add_argument('--espera', type=float, default=300.0,
+                            help='Segundos máximos de espera por el lock (default: 300)')
+        parser.add_argument('--verificar', action='store_true',
+                            help='Solo verifica que exista el marcador (sale con error si no)')
+
+    def handle(self, *args, **options):
+        if options['verificar']:
+            if not esta_listo(options['marcador']):
+                raise CommandError("Preflight pendiente: no existe el marcador de listo")
+            self.stdout.write(self.style.SUCCESS("Preflight completo"))
+            return
+
+        try:
+            datos = preparar(options['marcador'], options['espera'])
+        except LockNoDisponible as e:
+            raise CommandError(str(e))
+
+        aplicadas = datos['migraciones_aplicadas']
+        for migracion in aplicadas:
+            self.stdout.write(f"  Aplicada {migracion}")
+        self.stdout.write(self.style.SUCCESS(
+            f"Preflight completo ({len(aplicadas)} migraciones aplicadas)"
+        ))
@@ -0,0 +1,41 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from orders.notificaciones import procesar_eventos_pendientes
+
+
+class Command(BaseCommand):
+    help = (
+        "Aplica por lotes las notificaciones de AdamsPay encoladas por el callback "
+        "(modo ADAMSPAY_WEBHOOK_QUEUE). Se pueden ejecutar varios procesos en paralelo."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--lote', type=int, default=100,
+                            help='Eventos a procesar por iteración (default: 100)')
+        parser.add_argument('--espera', type=float, default=0.5,
+                            help='Segundos de espera cuando no hay eventos (default: 0.5)')
+        parser.add_argument('--una-vez', action='store_true',
+                            help='Procesa los eventos actuales y termina')
+
+    def handle(self, *args, **options):
+        lote = options['lote']
+        espera = options['espera']
+
+        self.stdout.write("Consumidor de webhooks AdamsPay iniciado")
+
+        try:
+            while True:
+                procesados = procesar_eventos_pendientes(lote)
+                if procesados:
+                    self.stdout.write(f"Eventos procesados: {procesados}")
+
+                if procesados < lote:
+                    if options['una_vez']:
+                        break
+                    time.sleep(espera)
+        except KeyboardInterrupt:
+            pass
+
+        self.stdout.write(self.style.SUCCESS("Consumidor de webhooks detenido"))
@@ -0,0 +1,31 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from orders.idempotencia import purgar_vencidas
+
+
+class Command(BaseCommand):
+    help = (
+        "Borra las Idempotency-Key vencidas (ORDERS_IDEMPOTENCY_TTL) en lotes "
+        "cortos y termina. Pensado para cron."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--lote', type=int, default=1000,
+                            help='Claves a borrar por lote (default: 1000)')
+        parser.add_argument('--pausa', type=float, default=0.1,
+                            help='Segundos entre lotes para no saturar la base (default: 0.1)')
+
+    def handle(self, *args, **options):
+        lote = options['lote']
+
+        total = 0
+        while True:
+            borradas = purgar_vencidas(lote)
+            total += borradas
+            if borradas < lote:
+                break
+            time.sleep(options['pausa'])
+
+        self.stdout.write(self.style.SUCCESS(f"Idempotency-Key vencidas borradas: {total}"))
@@ -0,0 +1,34 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from orders.notificaciones import purgar_eventos, purgar_huellas
+
+
+class Command(BaseCommand):
+    help = (
+        "Borra las huellas de notificaciones de AdamsPay más viejas que "
+        "ADAMSPAY_DEDUP_RETENTION_DAYS y los eventos de webhook procesados hace más "
+        "de ADAMSPAY_WEBHOOK_RETENTION_DAYS, en lotes cortos, y termina. Pensado para cron."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--lote', type=int, default=1000,
+                            help='Filas a borrar por lote (default: 1000)')
+        parser.add_argument('--pausa', type=float, default=0.1,
+                            help='Segundos entre lotes para no saturar la base (default: 0.1)')
+
+    def handle(self, *args, **options):
+        for mensaje, purgar in (('Huellas de notificaciones borradas', purgar_huellas),
+                                ('Eventos de webhook borrados', purgar_eventos)):
+            total = self._purgar(purgar, options['lote'], options['pausa'])
+            self.stdout.write(self.style.SUCCESS(f"{mensaje}: {total}"))
+
+    def _purgar(self, purgar, lote, pausa):
+        total = 0
+        while True:
+            borradas = purgar(lote)
+            total += borradas
+            if borradas < lote:
+                return total
+            time.sleep(pausa)
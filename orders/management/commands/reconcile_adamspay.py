@@ -0,0 +1,66 @@
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand, CommandError
+
+from orders.conciliacion import conciliar_pendientes
+from orders.deudas import modo_simulacion
+
+
+class Command(BaseCommand):
+    help = (
+        "Consulta en AdamsPay los pedidos PENDING antiguos (por ejemplo si se perdió "
+        "un webhook) y aplica su estado real en lotes."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--minutos', type=int, default=30,
+                            help='Solo pedidos creados hace más de N minutos (default: 30)')
+        parser.add_argument('--chunk', type=int, default=500,
+                            help='Pedidos por chunk de lectura y actualización (default: 500)')
+        parser.add_argument('--hilos', type=int, default=8,
+                            help='Consultas simultáneas a AdamsPay (default: 8)')
+        parser.add_argument('--tasa', type=float, default=20.0,
+                            help='Máximo de consultas por segundo, 0 sin límite (default: 20)')
+        parser.add_argument('--limite', type=int, default=None,
+                            help='Máximo de pedidos a revisar')
+        parser.add_argument('--dry-run', action='store_true',
+                            help='Solo informa lo que cambiaría, sin modificar pedidos')
+
+    def handle(self, *args, **options):
+        if modo_simulacion():
+            raise CommandError("Configure ADAMSPAY_API_KEY para consultar las deudas en AdamsPay")
+
+        self.stdout.write(
+            f"Conciliando pedidos PENDING de más de {options['minutos']} minutos"
+            f"{' (dry-run)' if options['dry_run'] else ''}"
+        )
+
+        resumen = conciliar_pendientes(
+            antiguedad=timedelta(minutes=options['minutos']),
+            chunk_size=options['chunk'],
+            hilos=options['hilos'],
+            por_segundo=options['tasa'],
+            dry_run=options['dry_run'],
+            limite=options['limite'],
+        )
+
+        self.stdout.write(f"Revisados:   {resumen['revisados']}")
+        self.stdout.write(f"Pagados:     {resumen['pagados']}")
+        self.stdout.write(f"Fallidos:    {resumen['fallidos']}")
+        self.stdout.write(f"Pendientes:  {resumen['pendientes']}")
+        for error, cantidad in sorted(resumen['errores'].items()):
+            self.stdout.write(self.style.WARNING(f"Error {error}: {cantidad}"))
+        if options['dry_run']:
+            self.stdout.write("Dry-run: no se modificó ningún pedido")
+        else:
+            self.stdout.write(f"Actualizados: {resumen['actualizados']}")
+
+        if resumen['interrumpido']:
+            self.stdout.write(self.style.ERROR(
+                "Conciliación interrumpida: AdamsPay no responde (circuit breaker abierto)"
+            ))
+
+        tasa = resumen['revisados'] / resumen['segundos'] if resumen['segundos'] else 0
+        self.stdout.write(self.style.SUCCESS(
+            f"Conciliación terminada en {resumen['segundos']} s ({tasa:.1f} pedidos/s)"
+        ))
@@ -0,0 +1,41 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from orders.deudas import procesar_registros_pendientes
+
+
+class Command(BaseCommand):
+    help = (
+        "Registra en AdamsPay las deudas pendientes del outbox (modo ADAMSPAY_OUTBOX). "
+        "Se pueden ejecutar varios procesos en paralelo."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--lote', type=int, default=10,
+                            help='Registros a procesar por iteración (default: 10)')
+        parser.add_argument('--espera', type=float, default=1.0,
+                            help='Segundos de espera cuando no hay pendientes (default: 1.0)')
+        parser.add_argument('--una-vez', action='store_true',
+                            help='Procesa los pendientes actuales y termina')
+
+    def handle(self, *args, **options):
+        lote = options['lote']
+        espera = options['espera']
+
+        self.stdout.write("Worker de registro de deudas AdamsPay iniciado")
+
+        try:
+            while True:
+                procesados = procesar_registros_pendientes(lote)
+                if procesados:
+                    self.stdout.write(f"Registros procesados: {procesados}")
+
+                if procesados < lote:
+                    if options['una_vez']:
+                        break
+                    time.sleep(espera)
+        except KeyboardInterrupt:
+            pass
+
+        self.stdout.write(self.style.SUCCESS("Worker de registro de deudas detenido"))
@@ -0,0 +1,132 @@
+# metricas.py - Métricas Prometheus de la app orders
+
+import os
+import time
+import contextvars
+
+from prometheus_client import (
+    CONTENT_TYPE_LATEST, CollectorRegistry, Counter, Histogram, REGISTRY,
+    generate_latest, multiprocess,
+)
+
+# Con PROMETHEUS_MULTIPROC_DIR definida (startup.sh) cada worker de gunicorn
+# escribe sus valores en archivos mmap de ese directorio y /metrics los suma
+MULTIPROCESO = bool(os.getenv('PROMETHEUS_MULTIPROC_DIR'))
+
+# Latencias en segundos: del caché (ms) a AdamsPay lento (varios segundos)
+_BUCKETS_LATENCIA = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30)
+
+DURACION_SOLICITUD = Histogram(
+    'orders_http_request_duration_seconds',
+    'Duración de las solicitudes HTTP por vista',
+    ['view', 'method'],
+    buckets=_BUCKETS_LATENCIA,
+)
+SOLICITUDES = Counter(
+    'orders_http_requests',
+    'Solicitudes HTTP por vista y código de estado',
+    ['view', 'method', 'status'],
+)
+CONSULTAS_SOLICITUD = Histogram(
+    'orders_db_queries_per_request',
+    'Consultas a la base por solicitud',
+    ['view'],
+    buckets=(0, 1, 2, 3, 5, 8, 13, 21, 50, 100),
+)
+TIEMPO_DB_SOLICITUD = Histogram(
+    'orders_db_time_per_request_seconds',
+    'Tiempo total en la base por solicitud',
+    ['view'],
+    buckets=_BUCKETS_LATENCIA,
+)
+DURACION_ADAMSPAY = Histogram(
+    'orders_adamspay_request_duration_seconds',
+    'Duración de las llamadas a AdamsPay (incluye reintentos)',
+    ['method', 'outcome'],
+    buckets=_BUCKETS_LATENCIA,
+)
+LLAMADAS_ADAMSPAY = Counter(
+    'orders_adamspay_requests',
+    'Llamadas a AdamsPay por resultado (ok, error, rechazada)',
+    ['method', 'outcome'],
+)
+WEBHOOKS_DESCONOCIDOS = Counter(
+    'orders_webhook_unknown_orders',
+    'Notificaciones con pedido inexistente (base = buscado, cache = caché negativa)',
+    ['source'],
+)
+EVENTOS_WEBHOOK = Counter(
+    'orders_webhook_events_processed',
+    'Eventos de la cola de webhooks procesados',
+)
+DURACION_LOTE_WEBHOOKS = Histogram(
+    'orders_webhook_batch_duration_seconds',
+    'Duración de cada lote de la cola de webhooks',
+    buckets=_BUCKETS_LATENCIA,
+)
+
+# Consultas y segundos en la base de la solicitud actual (lo fija MetricasMiddleware)
+_consultas_solicitud = contextvars.ContextVar('consultas_solicitud', default=None)
+
+
+def iniciar_medicion_db():
+    """
+    Empieza a contar consultas en el contexto actual.
+
+    Returns:
+        tuple: (acumulador [consultas, segundos], token para ``terminar_medicion_db``).
+    """
+    acumulador = [0, 0.0]
+    return acumulador, _consultas_solicitud.set(acumulador)
+
+
+def terminar_medicion_db(token):
+    _consultas_solicitud.reset(token)
+
+
+def medir_consulta(execute, sql, params, many, context):
+    """
+    ``execute_wrapper`` instalado en cada conexión (ver ``instalar_en_conexion``).
+
+    Suma la consulta a la solicitud en curso; fuera de una solicitud solo
+    ejecuta. Los contextvars pasan a los threads de ``sync_to_async``, así
+    también cuentan las consultas del ORM asíncrono.
+    """
+    acumulador = _consultas_solicitud.get()
+    if acumulador is None:
+        return execute(sql, params, many, context)
+    inicio = time.perf_counter()
+    try:
+        return execute(sql, params, many, context)
+    finally:
+        acumulador[0] += 1
+        acumulador[1] += time.perf_counter() - inicio
+
+
+def instalar_en_conexion(sender, connection, **kwargs):
+    """Receptor de ``connection_created``: agrega ``medir_consulta`` a la conexión."""
+    if medir_consulta not in connection.execute_wrappers:
+        connection.execute_wrappers.append(medir_consulta)
+
+
+def registrar_adamspay(metodo, latencia=0.0, error=False, rechazada=False):
+    """Registra una llamada a AdamsPay (la usa el cliente en ``_contar``)."""
+    resultado = 'rechazada' if rechazada else 'error' if error else 'ok'
+    LLAMADAS_ADAMSPAY.labels(metodo, resultado).inc()
+    if not rechazada:
+        DURACION_ADAMSPAY.labels(metodo, resultado).observe(latencia)
+
+
+def exportar():
+    """
+    Devuelve las métricas en formato de texto de Prometheus.
+
+    Returns:
+        tuple: (contenido en bytes, content type).
+    """
+    if MULTIPROCESO:
+        registro = CollectorRegistry()
+        multiprocess.MultiProcessCollector(registro)
+    else:
+        registro = REGISTRY
+    return generate_latest(registro), CONTENT_TYPE_LATEST
@@ -0,0 +1,110 @@
+# middleware.py - Middlewares de la app orders
+
+import re
+import time
+import uuid
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+
+from .metricas import (
+    CONSULTAS_SOLICITUD, DURACION_SOLICITUD, SOLICITUDES, TIEMPO_DB_SOLICITUD,
+    iniciar_medicion_db, terminar_medicion_db,
+)
+from .registro import asignar_correlation_id, restaurar_correlation_id
+
+# IDs de correlación aceptados desde el cliente o el proxy
+_ID_VALIDO = re.compile(r'^[A-Za-z0-9._-]{1,64}$')
+
+
+class CorrelacionMiddleware:
+    """
+    Asigna un ID de correlación a cada solicitud.
+
+    Usa el encabezado ``X-Request-ID`` si viene uno válido o genera uno
+    nuevo; todos los logs de la solicitud lo incluyen y se devuelve en la
+    respuesta. Funciona bajo WSGI y ASGI (el ID vive en un contextvar).
+    """
+
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+
+    def _correlation_id(self, request):
+        valor = request.headers.get('X-Request-ID', '')
+        return valor if _ID_VALIDO.match(valor) else uuid.uuid4().hex
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        correlation_id = self._correlation_id(request)
+        token = asignar_correlation_id(correlation_id)
+        try:
+            response = self.get_response(request)
+        finally:
+            restaurar_correlation_id(token)
+        response['X-Request-ID'] = correlation_id
+        return response
+
+    async def __acall__(self, request):
+        correlation_id = self._correlation_id(request)
+        token = asignar_correlation_id(correlation_id)
+        try:
+            response = await self.get_response(request)
+        finally:
+            restaurar_correlation_id(token)
+        response['X-Request-ID'] = correlation_id
+        return response
+
+
+class MetricasMiddleware:
+    """
+    Mide cada solicitud: duración y código por vista, y cantidad y tiempo
+    de consultas a la base (ver ``orders.metricas``).
+
+    Va después de WhiteNoise, así los archivos estáticos no se miden. En
+    las respuestas en streaming (SSE) la duración llega hasta que empieza
+    el stream.
+    """
+
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        inicio = time.perf_counter()
+        consultas, token = iniciar_medicion_db()
+        try:
+            response = self.get_response(request)
+        finally:
+            terminar_medicion_db(token)
+        self._registrar(request, response, time.perf_counter() - inicio, consultas)
+        return response
+
+    async def __acall__(self, request):
+        inicio = time.perf_counter()
+        consultas, token = iniciar_medicion_db()
+        try:
+            response = await self.get_response(request)
+        finally:
+            terminar_medicion_db(token)
+        self._registrar(request, response, time.perf_counter() - inicio, consultas)
+        return response
+
+    def _registrar(self, request, response, duracion, consultas):
+        resolver_match = getattr(request, 'resolver_match', None)
+        vista = resolver_match.view_name if resolver_match else 'sin_ruta'
+        metodo = request.method
+        DURACION_SOLICITUD.labels(vista, metodo).observe(duracion)
+        SOLICITUDES.labels(vista, metodo, str(response.status_code)).inc()
+        CONSULTAS_SOLICITUD.labels(vista).observe(consultas[0])
+        TIEMPO_DB_SOLICITUD.labels(vista).observe(consultas[1])
@@ -0,0 +1,24 @@
+# Generated by Django 6.0.1 on 2026-10-18 11:28
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('orders', '0003_webhookevent'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ProcessedNotification',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('fingerprint', models.CharField(max_length=40, unique=True)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+            ],
+            options={
+                'indexes': [models.Index(fields=['created_at'], name='orders_notif_created_idx')],
+            },
+        ),
+    ]
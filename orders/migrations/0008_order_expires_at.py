@@ -0,0 +1,46 @@
+# Generated by Django 6.0.1 on 2026-10-18 12:40
+
+from datetime import timedelta
+
+from django.db import migrations, models
+
+# Los pedidos existentes se crearon con deudas válidas por 2 días
+VALIDEZ_ANTERIOR = timedelta(days=2)
+LOTE = 5000
+
+
+def completar_vencimientos(apps, schema_editor):
+    """Completa expires_at de los pedidos existentes en lotes cortos."""
+    Order = apps.get_model('orders', 'Order')
+    while True:
+        ids = list(
+            Order.objects.filter(expires_at__isnull=True).values_list('id', flat=True)[:LOTE]
+        )
+        if not ids:
+            break
+        Order.objects.filter(id__in=ids).update(
+            expires_at=models.F('created_at') + VALIDEZ_ANTERIOR
+        )
+
+
+class Migration(migrations.Migration):
+
+    # Cada lote del backfill se confirma por separado: no bloquea la tabla entera
+    atomic = False
+
+    dependencies = [
+        ('orders', '0007_orderitem'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='order',
+            name='expires_at',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+        migrations.RunPython(completar_vencimientos, migrations.RunPython.noop),
+        migrations.AddIndex(
+            model_name='order',
+            index=models.Index(condition=models.Q(('status', 'PENDING')), fields=['expires_at'], name='orders_pending_expiry_idx'),
+        ),
+    ]
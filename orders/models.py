@@ -1,5 +1,41 @@
 import uuid
 from django.db import models
+from django.db.models import F
+from django.utils import timezone
+
+class OrderQuerySet(models.QuerySet):
+    def actualizar(self, **campos):
+        """
+        ``update()`` que además incrementa ``version`` y renueva ``updated_at``.
+
+        Todo cambio visible de un pedido debe pasar por aquí (o por
+        ``transicionar``) para que los ETags de la API cambien con él.
+
+        Returns:
+            int: Cantidad de pedidos actualizados.
+        """
+        campos.setdefault('updated_at', timezone.now())
+        return self.update(version=F('version') + 1, **campos)
+
+    def transicionar(self, nuevo_estado):
+        """
+        Aplica una transición de estado con un único UPDATE condicional.
+
+        Solo se actualizan las filas cuyo estado actual admite pasar a
+        ``nuevo_estado`` (``UPDATE ... WHERE id IN (...) AND status IN (...)``),
+        por lo que un "pending" tardío nunca pisa un PAID concurrente.
+
+        Args:
+            nuevo_estado (str): Estado destino ('PAID' o 'FAILED').
+
+        Returns:
+            int: Cantidad de pedidos que cambiaron de estado.
+        """
+        origenes = Order.estados_origen(nuevo_estado)
+        if not origenes:
+            return 0
+        return self.filter(status__in=origenes).actualizar(status=nuevo_estado)
+
 
 class Order(models.Model):
     STATUS_CHOICES = [
@@ -8,16 +44,183 @@ class Order(models.Model):
         ('FAILED', 'Failed'),
     ]
 
+    # Máquina de estados: PENDING -> PAID/FAILED; PAID y FAILED son finales
+    TRANSICIONES = {
+        'PENDING': ('PAID', 'FAILED'),
+        'PAID': (),
+        'FAILED': (),
+    }
+
     id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
     product_name = models.CharField(max_length=100)
     amount = models.DecimalField(max_digits=10, decimal_places=2)
     status = models.CharField(max_length=10, choices=STATUS_CHOICES, default='PENDING')
     payment_link = models.URLField(null=True, blank=True)
     created_at = models.DateTimeField(auto_now_add=True)
+    # Se incrementan en cada cambio de estado o de payment_link (ETag / Last-Modified)
+    updated_at = models.DateTimeField(auto_now=True)
+    version = models.PositiveIntegerField(default=1)
+    # Fin del validPeriod de la deuda en AdamsPay; vencido, el pedido pasa a FAILED
+    expires_at = models.DateTimeField(null=True, blank=True)
+
+    objects = OrderQuerySet.as_manager()
+
+    class Meta:
+        indexes = [
+            # Listado por estado y paginación por cursor (created_at, id)
+            models.Index(fields=['status', 'created_at', 'id'], name='orders_status_cursor_idx'),
+            models.Index(fields=['created_at', 'id'], name='orders_created_idx'),
+            # Solo los pendientes pueden vencer: el índice parcial se mantiene chico
+            models.Index(
+                fields=['expires_at'],
+                condition=models.Q(status='PENDING'),
+                name='orders_pending_expiry_idx',
+            ),
+        ]
     
     def __str__(self):
         return f"{self.product_name} - {self.get_status_display()}"
+
+    @classmethod
+    def estados_origen(cls, nuevo_estado):
+        """Devuelve los estados desde los que se puede pasar a ``nuevo_estado``."""
+        return [origen for origen, destinos in cls.TRANSICIONES.items() if nuevo_estado in destinos]
+
+    @classmethod
+    def es_final(cls, estado):
+        """Indica si el estado es terminal (no admite más transiciones)."""
+        return estado in cls.TRANSICIONES and not cls.TRANSICIONES[estado]
     
     def get_status_display(self):
         """Devuelve el nombre para mostrar del estado."""
-        return dict(self.STATUS_CHOICES).get(self.status, self.status)
\ No newline at end of file
+        return dict(self.STATUS_CHOICES).get(self.status, self.status)
+
+
+class OrderItem(models.Model):
+    """
+    Línea de un pedido creado desde el carrito.
+
+    El ``amount`` del pedido es la suma de ``subtotal`` de sus líneas,
+    calculada en el servidor al crearlo.
+    """
+    order = models.ForeignKey(Order, on_delete=models.CASCADE, related_name='items')
+    product_name = models.CharField(max_length=100)
+    unit_price = models.DecimalField(max_digits=10, decimal_places=2)
+    quantity = models.PositiveIntegerField(default=1)
+
+    def __str__(self):
+        return f"{self.quantity} x {self.product_name}"
+
+    @property
+    def subtotal(self):
+        return self.unit_price * self.quantity
+
+
+class DebtRegistration(models.Model):
+    """
+    Registro pendiente de una deuda en AdamsPay (outbox).
+
+    Se crea en la misma transacción que el pedido cuando el modo outbox
+    está activo; el comando ``registrar_deudas`` lo consume en segundo plano.
+    Mientras un worker llama a AdamsPay queda PROCESSING y ``next_attempt_at``
+    es el fin de su reserva.
+    """
+    STATUS_CHOICES = [
+        ('PENDING', 'Pending'),
+        ('PROCESSING', 'Processing'),
+        ('DONE', 'Done'),
+        ('FAILED', 'Failed'),
+    ]
+
+    order = models.OneToOneField(Order, on_delete=models.CASCADE, related_name='debt_registration')
+    status = models.CharField(max_length=10, choices=STATUS_CHOICES, default='PENDING')
+    attempts = models.PositiveIntegerField(default=0)
+    last_error = models.TextField(blank=True, default='')
+    next_attempt_at = models.DateTimeField(default=timezone.now)
+    created_at = models.DateTimeField(auto_now_add=True)
+    processed_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['status', 'next_attempt_at'], name='orders_debtreg_pending_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.order_id} - {self.status}"
+
+
+class WebhookEvent(models.Model):
+    """
+    Notificación de AdamsPay recibida y pendiente de aplicar.
+
+    Tabla append-only: el callback solo inserta el payload crudo y el
+    comando ``procesar_webhooks`` la consume por lotes.
+    """
+    id = models.BigAutoField(primary_key=True)
+    payload = models.JSONField()
+    received_at = models.DateTimeField(auto_now_add=True)
+    processed_at = models.DateTimeField(null=True, blank=True)
+    error = models.CharField(max_length=100, blank=True, default='')
+
+    class Meta:
+        indexes = [
+            models.Index(
+                fields=['id'],
+                condition=models.Q(processed_at__isnull=True),
+                name='orders_webhook_pending_idx',
+            ),
+            # Purga de eventos procesados (purgar_notificaciones)
+            models.Index(
+                fields=['processed_at'],
+                condition=models.Q(processed_at__isnull=False),
+                name='orders_webhook_processed_idx',
+            ),
+        ]
+
+    def __str__(self):
+        return f"Webhook {self.id} - {self.received_at}"
+
+
+class ProcessedNotification(models.Model):
+    """
+    Huella de una notificación de AdamsPay ya aplicada.
+
+    El índice único sobre ``fingerprint`` descarta los reintentos de
+    AdamsPay antes de consultar el pedido.
+    """
+    fingerprint = models.CharField(max_length=40, unique=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        indexes = [
+            # Purga de huellas viejas (purgar_notificaciones)
+            models.Index(fields=['created_at'], name='orders_notif_created_idx'),
+        ]
+
+    def __str__(self):
+        return self.fingerprint
+
+
+class IdempotencyKey(models.Model):
+    """
+    Respuesta guardada de una creación de pedido con header Idempotency-Key.
+
+    El índice único sobre ``key`` deja pasar una sola solicitud por clave;
+    mientras ``status_code`` es nulo esa solicitud sigue en curso y los
+    duplicados la esperan (ver ``orders/idempotencia.py``).
+    """
+    key = models.CharField(max_length=255, unique=True)
+    # SHA-256 del endpoint y el cuerpo: la misma clave con otra solicitud es un error
+    request_hash = models.CharField(max_length=64)
+    status_code = models.PositiveSmallIntegerField(null=True, blank=True)
+    response = models.JSONField(null=True, blank=True)
+    locked_at = models.DateTimeField(default=timezone.now)
+    expires_at = models.DateTimeField()
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['expires_at'], name='orders_idempotency_exp_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.key} - {self.status_code or 'en curso'}"
@@ -0,0 +1,366 @@
+# notificaciones.py - Interpretación y cola de notificaciones de AdamsPay
+
+import os
+import json
+import uuid
+import hashlib
+import time
+import logging
+import threading
+
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import IntegrityError, transaction
+from django.utils import timezone
+
+from .lru import LRUCache
+from .metricas import DURACION_LOTE_WEBHOOKS, EVENTOS_WEBHOOK, WEBHOOKS_DESCONOCIDOS
+from .models import Order, ProcessedNotification, WebhookEvent
+from .signals import notificar_cambio
+
+logger = logging.getLogger(__name__)
+
+# Huellas recientes ya aplicadas, delante del índice único de la base
+ADAMSPAY_DEDUP_CACHE_SIZE = int(os.getenv('ADAMSPAY_DEDUP_CACHE_SIZE', '10000'))
+_huellas_recientes = LRUCache(ADAMSPAY_DEDUP_CACHE_SIZE)
+
+# Caché negativa de IDs de pedido que no existen en la base
+ADAMSPAY_UNKNOWN_CACHE_SIZE = int(os.getenv('ADAMSPAY_UNKNOWN_CACHE_SIZE', '10000'))
+_pedidos_desconocidos = LRUCache(ADAMSPAY_UNKNOWN_CACHE_SIZE)
+_contadores_desconocidos = {'consultados': 0, 'desde_cache': 0}
+_contadores_lock = threading.Lock()
+
+
+def _como_dict(valor):
+    """Devuelve ``valor`` si es un dict; si no (p. ej. un campo de formulario), uno vacío."""
+    return valor if isinstance(valor, dict) else {}
+
+
+def extraer_order_id(datos):
+    """
+    Extrae el ID del pedido de una notificación de AdamsPay.
+
+    Args:
+        datos (dict|str): Notificación en formato dict o JSON.
+            Se busca en externalId, debt.docId, id u order_id.
+
+    Returns:
+        str|None: ID del pedido, o None si no se encontró.
+    """
+    order_id = None
+
+    if isinstance(datos, dict):
+        if 'externalId' in datos:
+            order_id = datos['externalId']
+        elif 'docId' in _como_dict(datos.get('debt')):
+            order_id = datos['debt']['docId']
+        elif 'id' in datos:
+            order_id = datos['id']
+        elif 'order_id' in datos:
+            order_id = datos['order_id']
+    elif isinstance(datos, str):
+        try:
+            datos_parseados = _como_dict(json.loads(datos))
+            if 'externalId' in datos_parseados:
+                order_id = datos_parseados['externalId']
+            elif 'docId' in _como_dict(datos_parseados.get('debt')):
+                order_id = datos_parseados['debt']['docId']
+        except:
+            pass
+
+    return order_id
+
+
+def determinar_estado(datos):
+    """
+    Mapea el estado de una notificación de AdamsPay al estado del pedido.
+
+    Args:
+        datos (dict|str): Notificación. Se consideran ``status`` y
+            ``debt.payStatus.status`` (este último tiene prioridad).
+
+    Returns:
+        str: 'PENDING', 'PAID' o 'FAILED'.
+    """
+    nuevo_estado = 'PENDING'
+
+    if isinstance(datos, dict):
+        estado_datos = str(datos.get('status', '')).lower()
+
+        # Verificar en diferentes ubicaciones posibles
+        if estado_datos in ['paid', 'approved', 'completed', 'confirmed']:
+            nuevo_estado = 'PAID'
+        elif estado_datos in ['failed', 'rejected', 'expired', 'cancelled']:
+            nuevo_estado = 'FAILED'
+        elif estado_datos == 'pending':
+            nuevo_estado = 'PENDING'
+
+        # También verificar en debt.payStatus.status
+        pay_status = _como_dict(_como_dict(datos.get('debt')).get('payStatus'))
+        if pay_status:
+            pay_status = str(pay_status.get('status', '')).lower()
+            if pay_status in ['paid', 'approved']:
+                nuevo_estado = 'PAID'
+            elif pay_status in ['failed', 'rejected']:
+                nuevo_estado = 'FAILED'
+
+    return nuevo_estado
+
+
+def calcular_huella(datos):
+    """
+    Calcula la huella de una notificación: (docId, payStatus, hora del evento).
+
+    Dos notificaciones con la misma huella representan la misma transición,
+    por ejemplo un reintento de AdamsPay o un redirect repetido.
+
+    Args:
+        datos (dict|str): Notificación de AdamsPay.
+
+    Returns:
+        str: SHA-1 hexadecimal de la huella.
+    """
+    hora = ''
+    if isinstance(datos, dict):
+        pay_status = _como_dict(_como_dict(datos.get('debt')).get('payStatus'))
+        hora = pay_status.get('time', '') or datos.get('time', '')
+
+    clave = f"{extraer_order_id(datos)}|{determinar_estado(datos)}|{hora}"
+    return hashlib.sha1(clave.encode('utf-8')).hexdigest()
+
+
+def huella_vista(huella):
+    """Indica si la huella ya se aplicó según la caché del proceso (sin consultar la base)."""
+    return huella in _huellas_recientes
+
+
+def registrar_huella(huella):
+    """
+    Registra una huella en el índice único de notificaciones procesadas.
+
+    Debe llamarse dentro de la transacción que aplica la notificación:
+    si esa transacción se revierte, la huella tampoco queda registrada.
+
+    Args:
+        huella (str): Huella calculada con ``calcular_huella``.
+
+    Returns:
+        bool: True si es nueva, False si es un duplicado.
+    """
+    if huella_vista(huella):
+        return False
+
+    try:
+        with transaction.atomic():
+            ProcessedNotification.objects.create(fingerprint=huella)
+    except IntegrityError:
+        _huellas_recientes.set(huella)
+        return False
+
+    transaction.on_commit(lambda: _huellas_recientes.set(huella))
+    return True
+
+
+def _recordar_huellas(huellas):
+    for huella in huellas:
+        _huellas_recientes.set(huella)
+
+
+def pedido_desconocido(order_uuid):
+    """
+    Indica si el pedido ya se buscó y no existe (sin consultar la base).
+
+    Cuenta el rechazo para las métricas de webhooks con pedido desconocido.
+    """
+    if order_uuid in _pedidos_desconocidos:
+        WEBHOOKS_DESCONOCIDOS.labels('cache').inc()
+        with _contadores_lock:
+            _contadores_desconocidos['desde_cache'] += 1
+        return True
+    return False
+
+
+def marcar_pedido_desconocido(order_uuid):
+    """Guarda en la caché negativa un pedido que no existe en la base."""
+    _pedidos_desconocidos.set(order_uuid)
+    WEBHOOKS_DESCONOCIDOS.labels('base').inc()
+    with _contadores_lock:
+        _contadores_desconocidos['consultados'] += 1
+
+
+def estadisticas_desconocidos():
+    """
+    Devuelve los contadores de notificaciones con pedido inexistente.
+
+    Returns:
+        dict: consultados (buscados en la base), desde_cache (rechazados
+            por la caché negativa) y en_cache (tamaño actual de la caché).
+    """
+    with _contadores_lock:
+        datos = dict(_contadores_desconocidos)
+    datos['en_cache'] = len(_pedidos_desconocidos)
+    return datos
+
+
+def encolar_evento(datos):
+    """
+    Guarda el payload crudo de un webhook para procesarlo después.
+
+    Args:
+        datos (dict|str): Payload tal como llegó al callback.
+
+    Returns:
+        WebhookEvent: Evento guardado.
+    """
+    if hasattr(datos, 'dict'):
+        # QueryDict de formularios
+        datos = datos.dict()
+    return WebhookEvent.objects.create(payload=datos)
+
+
+async def aencolar_evento(datos):
+    """Versión asíncrona de ``encolar_evento`` (async ORM)."""
+    if hasattr(datos, 'dict'):
+        datos = datos.dict()
+    return await WebhookEvent.objects.acreate(payload=datos)
+
+
+def procesar_eventos_pendientes(lote=100):
+    """
+    Aplica un lote de eventos de webhook pendientes.
+
+    Los eventos se reclaman con ``SELECT ... FOR UPDATE SKIP LOCKED`` para
+    que varios consumidores puedan trabajar en paralelo. Los duplicados se
+    descartan con una sola consulta al índice de huellas. Por pedido se
+    toma el primer estado final del lote (o el último si no hay finales) y
+    los cambios se aplican con un ``UPDATE`` condicional por estado destino,
+    en lugar de un get/save por evento.
+
+    Args:
+        lote (int): Cantidad máxima de eventos a procesar.
+
+    Returns:
+        int: Cantidad de eventos procesados.
+    """
+    inicio = time.perf_counter()
+    with transaction.atomic():
+        eventos = list(
+            WebhookEvent.objects
+            .select_for_update(skip_locked=True)
+            .filter(processed_at__isnull=True)
+            .order_by('id')[:lote]
+        )
+        if not eventos:
+            return 0
+
+        # Descartar duplicados: caché del proceso, luego el índice único
+        huellas = {evento.id: calcular_huella(evento.payload) for evento in eventos}
+        ya_procesadas = set(
+            ProcessedNotification.objects
+            .filter(fingerprint__in=[h for h in huellas.values() if not huella_vista(h)])
+            .values_list('fingerprint', flat=True)
+        )
+
+        estados = {}
+        errores = {}
+        nuevas = []
+        for evento in eventos:
+            huella = huellas[evento.id]
+            if huella_vista(huella) or huella in ya_procesadas:
+                errores[evento.id] = 'Duplicado'
+                continue
+            # También descarta duplicados dentro del mismo lote
+            ya_procesadas.add(huella)
+
+            order_id = extraer_order_id(evento.payload)
+            if not order_id:
+                errores[evento.id] = 'ID no encontrado'
+                continue
+            try:
+                order_uuid = uuid.UUID(str(order_id))
+            except ValueError:
+                errores[evento.id] = 'UUID inválido'
+                continue
+            # Un estado final del lote no se reemplaza por uno posterior
+            if not Order.es_final(estados.get(order_uuid)):
+                estados[order_uuid] = determinar_estado(evento.payload)
+            nuevas.append(huella)
+
+        ProcessedNotification.objects.bulk_create(
+            [ProcessedNotification(fingerprint=huella) for huella in nuevas],
+            ignore_conflicts=True,
+        )
+        transaction.on_commit(lambda: _recordar_huellas(nuevas))
+
+        por_estado = {}
+        for order_uuid, nuevo_estado in estados.items():
+            por_estado.setdefault(nuevo_estado, []).append(order_uuid)
+
+        for nuevo_estado, ids in por_estado.items():
+            # Se bloquean primero los pedidos que admiten la transición, así
+            # solo se avisa de los que cambian (no de duplicados ni tardíos)
+            cambiados = list(
+                Order.objects.select_for_update()
+                .filter(id__in=ids, status__in=Order.estados_origen(nuevo_estado))
+                .values_list('id', flat=True)
+            )
+            if not cambiados:
+                continue
+            actualizados = Order.objects.filter(id__in=cambiados).transicionar(nuevo_estado)
+            logger.info("Webhooks: %d pedidos actualizados a %s", actualizados, nuevo_estado)
+            notificar_cambio(cambiados, nuevo_estado)
+
+        # Marcar el lote como procesado (un UPDATE por tipo de resultado)
+        ahora = timezone.now()
+        por_error = {'': [evento.id for evento in eventos if evento.id not in errores]}
+        for evento_id, error in errores.items():
+            por_error.setdefault(error, []).append(evento_id)
+        for error, ids in por_error.items():
+            if ids:
+                WebhookEvent.objects.filter(id__in=ids).update(processed_at=ahora, error=error)
+
+    # Los lotes vacíos (la cola al día) no se miden
+    DURACION_LOTE_WEBHOOKS.observe(time.perf_counter() - inicio)
+    EVENTOS_WEBHOOK.inc(len(eventos))
+    return len(eventos)
+
+
+def purgar_huellas(lote=1000):
+    """
+    Borra un lote de huellas más viejas que ADAMSPAY_DEDUP_RETENTION_DAYS.
+
+    AdamsPay deja de reintentar mucho antes, así que una huella vieja ya no
+    descarta ningún duplicado.
+
+    Returns:
+        int: Cantidad de huellas borradas.
+    """
+    limite = timezone.now() - timedelta(days=settings.ADAMSPAY_DEDUP_RETENTION_DAYS)
+    ids = list(
+        ProcessedNotification.objects.filter(created_at__lt=limite)
+        .order_by('created_at').values_list('pk', flat=True)[:lote]
+    )
+    if not ids:
+        return 0
+    borradas, _ = ProcessedNotification.objects.filter(pk__in=ids).delete()
+    return borradas
+
+
+def purgar_eventos(lote=1000):
+    """
+    Borra un lote de eventos de webhook ya procesados hace más de
+    ADAMSPAY_WEBHOOK_RETENTION_DAYS. Los pendientes nunca se borran.
+
+    Returns:
+        int: Cantidad de eventos borrados.
+    """
+    limite = timezone.now() - timedelta(days=settings.ADAMSPAY_WEBHOOK_RETENTION_DAYS)
+    ids = list(
+        WebhookEvent.objects.filter(processed_at__lt=limite)
+        .order_by('processed_at').values_list('pk', flat=True)[:lote]
+    )
+    if not ids:
+        return 0
+    borrados, _ = WebhookEvent.objects.filter(pk__in=ids).delete()
+    return borrados
@@ -0,0 +1,168 @@
+# paginas.py - Páginas HTML cacheadas (home y resultado de pago)
+
+import gzip
+import hashlib
+import logging
+import os
+import re
+
+import brotli
+from django.conf import settings
+from django.core.cache import cache
+from django.http import HttpResponse
+from django.template.loader import get_template, render_to_string
+from django.utils.cache import get_conditional_response, patch_vary_headers
+
+from .lru import LRUCache
+
+logger = logging.getLogger(__name__)
+
+# Plantillas cuyo contenido define la versión de las páginas cacheadas
+PLANTILLAS = ('index.html', 'payment_result.html')
+
+# Lugar del detalle del pedido dentro de payment_result.html
+_MARCADOR_DETALLE = '@@detalle@@'
+
+_RE_BROTLI = re.compile(r'\bbr\b')
+_RE_GZIP = re.compile(r'\bgzip\b')
+
+# Páginas ya armadas en este proceso, por (nombre, versión)
+_paginas_locales = LRUCache(maxsize=16)
+_version = None
+
+
+def version_paginas():
+    """
+    Devuelve la versión de las páginas cacheadas de este deploy.
+
+    Es un hash de las plantillas, del manifest de estáticos (cambia con
+    cada CSS/JS nuevo), de ``RENDER_GIT_COMMIT`` y de ORDERS_LIVE_UPDATES. Forma parte de las
+    claves de la caché compartida y del ETag, así un deploy nunca sirve
+    páginas del anterior. Con DEBUG se recalcula en cada solicitud.
+    """
+    global _version
+    if _version is not None and not settings.DEBUG:
+        return _version
+
+    resumen = hashlib.sha256(os.getenv('RENDER_GIT_COMMIT', '').encode())
+    resumen.update(str(settings.ORDERS_LIVE_UPDATES).encode())
+    for nombre in PLANTILLAS:
+        with open(get_template(nombre).origin.name, 'rb') as f:
+            resumen.update(f.read())
+    manifest = os.path.join(settings.STATIC_ROOT, 'staticfiles.json')
+    if os.path.exists(manifest):
+        with open(manifest, 'rb') as f:
+            resumen.update(f.read())
+    _version = resumen.hexdigest()[:16]
+    return _version
+
+
+def _obtener(nombre, construir):
+    """
+    Devuelve una página armada, construyéndola una sola vez por versión.
+
+    Busca en la memoria del proceso, luego en la caché compartida (para
+    que los workers nuevos no vuelvan a renderizar) y por último llama a
+    ``construir``. Con DEBUG siempre construye.
+    """
+    if settings.DEBUG:
+        return construir()
+
+    version = version_paginas()
+    valor = _paginas_locales.get((nombre, version))
+    if valor is not None:
+        return valor
+
+    clave = f'orders:pagina:{nombre}'
+    try:
+        valor = cache.get(clave, version=version)
+    except Exception as e:
+        # La caché es una optimización: si no responde se renderiza
+        logger.warning("Error leyendo la página %s de la caché: %s", nombre, e)
+    if valor is None:
+        valor = construir()
+        try:
+            cache.set(clave, valor, timeout=settings.ORDERS_PAGE_CACHE_TTL, version=version)
+        except Exception as e:
+            logger.warning("Error guardando la página %s en caché: %s", nombre, e)
+    _paginas_locales.set((nombre, version), valor)
+    return valor
+
+
+def _construir_home():
+    """Renderiza index.html y la comprime una vez con brotli y gzip."""
+    html = render_to_string('index.html', {'eventos_en_vivo': settings.ORDERS_LIVE_UPDATES}).encode('utf-8')
+    return {
+        'identity': html,
+        'br': brotli.compress(html, quality=11),
+        'gzip': gzip.compress(html, compresslevel=9, mtime=0),
+    }
+
+
+def _elegir_codificacion(request):
+    aceptadas = request.headers.get('Accept-Encoding', '')
+    if _RE_BROTLI.search(aceptadas):
+        return 'br'
+    if _RE_GZIP.search(aceptadas):
+        return 'gzip'
+    return 'identity'
+
+
+def respuesta_home(request):
+    """
+    Responde la página principal desde la caché.
+
+    La página es igual para todos los visitantes (sin sesión ni CSRF), así
+    que se sirve ya comprimida, con ``Cache-Control: public`` por
+    ORDERS_PAGE_MAX_AGE segundos y un ETag de la versión (304 si el
+    navegador ya la tiene).
+
+    Args:
+        request (HttpRequest): Objeto de solicitud HTTP.
+
+    Returns:
+        HttpResponse: index.html (o 304 Not Modified).
+    """
+    etag = f'W/"{version_paginas()}"'
+    response = get_conditional_response(request, etag=etag)
+    if response is None:
+        variantes = _obtener('home', _construir_home)
+        codificacion = _elegir_codificacion(request)
+        response = HttpResponse(variantes[codificacion], content_type='text/html; charset=utf-8')
+        if codificacion != 'identity':
+            response['Content-Encoding'] = codificacion
+        response['Content-Length'] = str(len(variantes[codificacion]))
+    response['ETag'] = etag
+    response['Cache-Control'] = f'public, max-age={settings.ORDERS_PAGE_MAX_AGE}'
+    patch_vary_headers(response, ('Accept-Encoding',))
+    return response
+
+
+def _construir_resultado():
+    """Renderiza la parte fija de payment_result.html, partida en el marcador."""
+    html = render_to_string('payment_result.html', {'detalle': _MARCADOR_DETALLE})
+    antes, despues = html.split(_MARCADOR_DETALLE)
+    return antes, despues
+
+
+def respuesta_resultado(order=None, error=None):
+    """
+    Responde la página de resultado del pago.
+
+    Solo se renderiza el detalle del pedido (payment_result_detalle.html);
+    la estructura con los estilos sale de la caché. La respuesta depende
+    del estado del pedido, por eso no la guardan navegadores ni proxies.
+
+    Args:
+        order (Order|dict, opcional): Pedido a mostrar (modelo o datos de
+            ``obtener_pedido``).
+        error (str, opcional): Mensaje si el pedido no existe.
+
+    Returns:
+        HttpResponse: payment_result.html con el detalle del pedido.
+    """
+    antes, despues = _obtener('payment_result', _construir_resultado)
+    detalle = render_to_string('payment_result_detalle.html', {'order': order, 'error': error})
+    response = HttpResponse(antes + detalle + despues)
+    response['Cache-Control'] = 'private, no-cache'
+    return response
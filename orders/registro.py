@@ -0,0 +1,152 @@
+# registro.py - Logging estructurado de la app orders
+
+import os
+import json
+import queue
+import atexit
+import random
+import zlib
+import logging
+import threading
+import contextvars
+from datetime import datetime, timezone
+from logging.handlers import QueueHandler, QueueListener
+
+# ID de correlación de la solicitud actual (lo asigna CorrelacionMiddleware)
+_correlation_id = contextvars.ContextVar('correlation_id', default='-')
+
+# Atributos propios de LogRecord: el resto viene de ``extra=``
+_ATRIBUTOS_RECORD = set(vars(logging.LogRecord('', 0, '', 0, '', None, None))) | {
+    'message', 'asctime', 'correlation_id', 'taskName',
+}
+
+
+def obtener_correlation_id():
+    """Devuelve el ID de correlación actual ('-' fuera de una solicitud)."""
+    return _correlation_id.get()
+
+
+def asignar_correlation_id(valor):
+    """
+    Asigna el ID de correlación del contexto actual.
+
+    Returns:
+        contextvars.Token: Para restaurar el valor anterior con ``restaurar_correlation_id``.
+    """
+    return _correlation_id.set(valor)
+
+
+def restaurar_correlation_id(token):
+    _correlation_id.reset(token)
+
+
+class FiltroCorrelacion(logging.Filter):
+    """Agrega ``correlation_id`` a cada registro (en el thread que lo emite)."""
+
+    def filter(self, record):
+        record.correlation_id = _correlation_id.get()
+        return True
+
+
+class FiltroMuestreo(logging.Filter):
+    """
+    Deja pasar solo una fracción ``tasa`` de los registros.
+
+    La decisión se toma por ID de correlación: de una solicitud muestreada
+    se conservan todos sus payloads, de las demás ninguno.
+    """
+
+    def __init__(self, tasa=1.0):
+        super().__init__()
+        self.tasa = float(tasa)
+
+    def filter(self, record):
+        if self.tasa >= 1:
+            return True
+        if self.tasa <= 0:
+            return False
+        correlation_id = _correlation_id.get()
+        if correlation_id == '-':
+            return random.random() < self.tasa
+        return zlib.crc32(correlation_id.encode('utf-8')) % 10000 < self.tasa * 10000
+
+
+class FormateadorJSON(logging.Formatter):
+    """
+    Una línea JSON por registro: hora, nivel, logger, mensaje,
+    correlation_id y los campos pasados con ``extra=``.
+    """
+
+    def format(self, record):
+        datos = {
+            'time': datetime.fromtimestamp(record.created, timezone.utc).isoformat(timespec='milliseconds'),
+            'level': record.levelname,
+            'logger': record.name,
+            'message': record.getMessage(),
+            'correlation_id': getattr(record, 'correlation_id', '-'),
+        }
+        for clave, valor in vars(record).items():
+            if clave not in _ATRIBUTOS_RECORD:
+                datos[clave] = valor
+        if record.exc_info and not record.exc_text:
+            record.exc_text = self.formatException(record.exc_info)
+        if record.exc_text:
+            datos['exception'] = record.exc_text
+        return json.dumps(datos, ensure_ascii=False, default=str)
+
+
+class ManejadorCola(QueueHandler):
+    """
+    Encola los registros y los escribe en stderr desde un thread aparte.
+
+    El thread de la solicitud solo arma el mensaje; el JSON y la escritura
+    los hace un ``QueueListener`` propio de cada proceso (se inicia en el
+    primer registro, también después de un fork de gunicorn).
+
+    Args:
+        formato_json (bool): Si es True escribe una línea JSON por registro; si no,
+            texto legible para desarrollo.
+    """
+
+    def __init__(self, formato_json=True):
+        super().__init__(queue.SimpleQueue())
+        destino = logging.StreamHandler()
+        if formato_json:
+            destino.setFormatter(FormateadorJSON())
+        else:
+            destino.setFormatter(logging.Formatter(
+                '%(asctime)s %(levelname)s %(name)s [%(correlation_id)s] %(message)s'
+            ))
+        self.destino = destino
+        self._listener = None
+        self._listener_pid = None
+        self._lock_listener = threading.Lock()
+
+    def _iniciar_listener(self):
+        pid = os.getpid()
+        if self._listener_pid == pid:
+            return
+        with self._lock_listener:
+            if self._listener_pid == pid:
+                return
+            # Después de un fork la cola heredada puede tener registros del padre
+            self.queue = queue.SimpleQueue()
+            self._listener = QueueListener(self.queue, self.destino, respect_handler_level=True)
+            self._listener.start()
+            self._listener_pid = pid
+            atexit.register(self._listener.stop)
+
+    def prepare(self, record):
+        # A diferencia de QueueHandler.prepare no aplica el formato aquí:
+        # solo fija el mensaje (por si los args cambian después) y la traza
+        record = logging.makeLogRecord(vars(record))
+        record.msg = record.getMessage()
+        record.args = None
+        if record.exc_info:
+            record.exc_text = logging.Formatter().formatException(record.exc_info)
+            record.exc_info = None
+        return record
+
+    def emit(self, record):
+        self._iniciar_listener()
+        super().emit(record)
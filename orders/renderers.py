@@ -0,0 +1,94 @@
+# renderers.py - JSON de la API con orjson (opcional)
+
+import json
+
+from django.conf import settings
+from django.http import HttpResponse
+from rest_framework.exceptions import ParseError
+from rest_framework.parsers import JSONParser
+from rest_framework.renderers import JSONRenderer
+from rest_framework.utils.encoders import JSONEncoder
+
+try:
+    import orjson
+except ImportError:  # Sin orjson se usa el json de la biblioteca estándar
+    orjson = None
+
+USAR_ORJSON = orjson is not None and settings.ORDERS_ORJSON
+
+# Fechas con 'Z' para UTC, igual que el JSONEncoder de DRF
+_OPCIONES_ORJSON = orjson.OPT_UTC_Z if orjson is not None else 0
+
+
+def _por_defecto(valor):
+    """Tipos que orjson no conoce (Decimal, lazy strings): como los trata DRF."""
+    return JSONEncoder().default(valor)
+
+
+def dumps(datos):
+    """
+    Serializa a JSON compacto en UTF-8.
+
+    Con orjson la salida es la misma que la del JSONRenderer de DRF
+    (fechas ISO 8601 con 'Z', sin escapar caracteres no ASCII).
+
+    Returns:
+        bytes: El JSON.
+    """
+    if USAR_ORJSON:
+        return orjson.dumps(datos, default=_por_defecto, option=_OPCIONES_ORJSON)
+    return json.dumps(datos, cls=JSONEncoder, ensure_ascii=False, separators=(',', ':')).encode('utf-8')
+
+
+def loads(contenido):
+    """
+    Parsea JSON (bytes o str).
+
+    Raises:
+        ValueError: Si el JSON es inválido.
+    """
+    if USAR_ORJSON:
+        return orjson.loads(contenido)
+    return json.loads(contenido)
+
+
+class ORJSONRenderer(JSONRenderer):
+    """
+    JSONRenderer de DRF que serializa con orjson.
+
+    Con ``; indent=N`` en Accept (o desde el browsable API) delega en el
+    renderer de DRF, que es el que sabe indentar.
+    """
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        if data is None:
+            return b''
+        if not USAR_ORJSON or self.get_indent(accepted_media_type, renderer_context or {}) is not None:
+            return super().render(data, accepted_media_type, renderer_context)
+        return dumps(data)
+
+
+class ORJSONParser(JSONParser):
+    """JSONParser de DRF que parsea con orjson (cuerpos en UTF-8)."""
+
+    renderer_class = ORJSONRenderer
+
+    def parse(self, stream, media_type=None, parser_context=None):
+        encoding = (parser_context or {}).get('encoding', settings.DEFAULT_CHARSET)
+        if not USAR_ORJSON or encoding.lower().replace('-', '') != 'utf8':
+            return super().parse(stream, media_type, parser_context)
+        try:
+            return orjson.loads(stream.read())
+        except orjson.JSONDecodeError as exc:
+            raise ParseError(f'JSON parse error - {exc}')
+
+
+class RespuestaJSON(HttpResponse):
+    """
+    Equivalente a ``JsonResponse`` para las vistas que no pasan por DRF
+    (las asíncronas), serializado con ``dumps``.
+    """
+
+    def __init__(self, datos, **kwargs):
+        kwargs.setdefault('content_type', 'application/json')
+        super().__init__(content=dumps(datos), **kwargs)
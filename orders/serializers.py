@@ -1,7 +1,73 @@
+# serializers.py - Esquema de los datos de pedido que devuelve la API
+
+from decimal import Decimal
+
 from rest_framework import serializers
 from .models import Order
 
+# Campos de un pedido en order_status, el listado, la caché y los eventos.
+# Las lecturas de varios pedidos los proyectan con .values(*CAMPOS_PEDIDO), sin
+# instancias de Order (para uno solo la instancia es más barata)
+CAMPOS_PEDIDO = (
+    'id', 'product_name', 'amount', 'status', 'payment_link',
+    'created_at', 'updated_at', 'version',
+)
+
+# Campos de la respuesta de create_order y cart_checkout
+CAMPOS_CREACION = ('id', 'product_name', 'amount', 'status', 'payment_link')
+
+# Mismo formato que la base (p. ej. '1000.00') aunque el monto venga como int
+_CENTAVOS = Decimal(1).scaleb(-Order._meta.get_field('amount').decimal_places)
+
+
+def formatear_monto(monto):
+    """Monto como texto con los decimales del campo Order.amount."""
+    return str(Decimal(str(monto)).quantize(_CENTAVOS))
+
+
+def fila_a_dict(fila):
+    """Convierte una fila ``.values(*CAMPOS_PEDIDO)`` al formato de la API."""
+    fila['id'] = str(fila['id'])
+    fila['amount'] = str(fila['amount'])
+    return fila
+
+
+def pedido_a_dict(order, campos=CAMPOS_PEDIDO):
+    """
+    Datos de una instancia de Order en el formato de la API.
+
+    Args:
+        order (Order): Pedido recién creado o modificado.
+        campos (tuple): Campos a incluir (CAMPOS_PEDIDO o CAMPOS_CREACION).
+
+    Returns:
+        dict: Igual que ``fila_a_dict`` para los mismos campos.
+    """
+    datos = {campo: getattr(order, campo) for campo in campos}
+    datos['id'] = str(order.id)
+    datos['amount'] = formatear_monto(order.amount)
+    return datos
+
+
+def linea_a_dict(linea):
+    """Datos de una línea del carrito (OrderItem) en el formato de la API."""
+    return {
+        'product_name': linea.product_name,
+        'unit_price': str(linea.unit_price),
+        'quantity': linea.quantity,
+        'subtotal': str(linea.subtotal),
+    }
+
+
 class OrderSerializer(serializers.ModelSerializer):
+    """
+    Serializador DRF con el esquema de CAMPOS_PEDIDO.
+
+    Las vistas no lo usan (arman las respuestas con las funciones de este
+    módulo, sin validación ni instancias por campo); queda para el admin
+    de la API y herramientas que necesiten el esquema.
+    """
+
     class Meta:
         model = Order
-        fields = '__all__'
+        fields = CAMPOS_PEDIDO
@@ -0,0 +1,28 @@
+# signals.py - Señales de la aplicación de pedidos
+
+from django.db import transaction
+from django.dispatch import Signal
+
+# Se envía después del commit cuando uno o más pedidos pueden haber cambiado
+# (estado o payment_link). Argumentos: order_ids (list[UUID]) y status
+# (str con el nuevo estado si se conoce con certeza, o None).
+order_changed = Signal()
+
+
+def notificar_cambio(order_ids, status=None):
+    """
+    Programa el envío de ``order_changed`` para después del commit.
+
+    Args:
+        order_ids (list[UUID]): Pedidos afectados.
+        status (str, opcional): Nuevo estado, si todos pasaron a él.
+    """
+    order_ids = list(order_ids)
+    if not order_ids:
+        return
+
+    from .models import Order
+
+    transaction.on_commit(
+        lambda: order_changed.send_robust(sender=Order, order_ids=order_ids, status=status)
+    )
@@ -1,3 +1,1087 @@
-from django.test import TestCase
+import gzip
+import importlib.util
+import io
+import json
+import os
+import tempfile
+import threading
+import uuid
+import time
+from datetime import timedelta
+from decimal import Decimal
+from pathlib import Path
+from unittest import mock, skipUnless
 
-# Create your tests here.
+import brotli
+import requests
+from asgiref.sync import sync_to_async
+from django.contrib.admin.sites import AdminSite
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.core.files.base import ContentFile
+from django.core.management import CommandError, call_command
+from django.db import connection, transaction
+from django.test import RequestFactory, TestCase, TransactionTestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import Resolver404, resolve
+from django.utils import timezone
+from rest_framework.exceptions import ParseError
+from rest_framework.renderers import JSONRenderer
+
+from dononofre.estaticos import EstaticosMinificados
+
+from . import cache as cache_pedidos, deudas, idempotencia, notificaciones, paginas, renderers, views
+from .admin import OrderAdmin
+from .adamspay import AdamsPayNoDisponible, CircuitBreaker, ClienteAdamsPay
+from .models import (
+    DebtRegistration, IdempotencyKey, Order, OrderItem, ProcessedNotification, WebhookEvent,
+)
+from .serializers import CAMPOS_PEDIDO, fila_a_dict
+from .signals import notificar_cambio, order_changed
+
+
+def crear_pedido(**campos):
+    campos.setdefault('product_name', 'Jamón Ibérico')
+    campos.setdefault('amount', 153000)
+    return Order.objects.create(**campos)
+
+
+def notificacion(order_id, estado='paid', hora='2026-10-18T12:00:00'):
+    return {'debt': {'docId': str(order_id), 'payStatus': {'status': estado, 'time': hora}}}
+
+
+@override_settings(ADAMSPAY_OUTBOX=True)
+class CrearPedidoOutboxTests(TestCase):
+    def test_encola_el_registro_y_responde_202(self):
+        with mock.patch.object(views, 'modo_simulacion', return_value=False):
+            response = self.client.post('/api/orders/', {'product_name': 'Queso Brie', 'amount': 98000},
+                                        content_type='application/json')
+
+        self.assertEqual(response.status_code, 202)
+        self.assertIsNone(response.json()['payment_link'])
+        registro = DebtRegistration.objects.get()
+        self.assertEqual((str(registro.order_id), registro.status), (response.json()['id'], 'PENDING'))
+
+
+class ClienteAdamsPayTests(TestCase):
+    def test_circuito_se_abre_tras_fallos_consecutivos(self):
+        circuito = CircuitBreaker(umbral=2, tiempo_apertura=60)
+        circuito.registrar_fallo()
+        self.assertEqual(circuito.estado, 'cerrado')
+        circuito.registrar_fallo()
+
+        self.assertEqual(circuito.estado, 'abierto')
+        self.assertFalse(circuito.permitir())
+
+    def test_circuito_semiabierto_deja_pasar_una_prueba(self):
+        circuito = CircuitBreaker(umbral=1, tiempo_apertura=0)
+        circuito.registrar_fallo()
+
+        self.assertEqual(circuito.estado, 'semi-abierto')
+        self.assertTrue(circuito.permitir())
+        self.assertFalse(circuito.permitir())
+        circuito.registrar_exito()
+        self.assertEqual(circuito.estado, 'cerrado')
+
+    def test_circuito_abierto_no_llama_a_adamspay(self):
+        cliente = ClienteAdamsPay(base_url='http://adamspay.test', api_key='clave')
+        cliente.circuito = CircuitBreaker(umbral=1, tiempo_apertura=60)
+        cliente.circuito.registrar_fallo()
+
+        with mock.patch.object(cliente.session, 'request') as solicitud:
+            with self.assertRaises(AdamsPayNoDisponible):
+                cliente.crear_deuda({'debt': {}})
+
+        solicitud.assert_not_called()
+        self.assertEqual(cliente.estadisticas()['rechazadas'], 1)
+
+    def test_errores_5xx_cuentan_para_el_circuito(self):
+        cliente = ClienteAdamsPay(base_url='http://adamspay.test', api_key='clave')
+        respuesta = mock.Mock(status_code=503)
+
+        with mock.patch.object(cliente.session, 'request', return_value=respuesta):
+            self.assertIs(cliente.crear_deuda({'debt': {}}), respuesta)
+
+        estadisticas = cliente.estadisticas()
+        self.assertEqual((estadisticas['llamadas'], estadisticas['errores']), (1, 1))
+
+
+class RegistroDeudasTests(TestCase):
+    def crear_registro(self):
+        order = crear_pedido()
+        return DebtRegistration.objects.create(order=order)
+
+    def test_registra_y_asigna_link(self):
+        registro = self.crear_registro()
+
+        self.assertEqual(deudas.procesar_registros_pendientes(), 1)
+
+        registro.refresh_from_db()
+        registro.order.refresh_from_db()
+        self.assertEqual((registro.status, registro.attempts), ('DONE', 1))
+        self.assertTrue(registro.order.payment_link)
+
+    def test_error_de_conexion_reintenta_con_backoff(self):
+        registro = self.crear_registro()
+
+        with mock.patch.object(deudas, 'registrar_deuda', side_effect=requests.ConnectionError('caído')):
+            self.assertEqual(deudas.procesar_registros_pendientes(), 1)
+            # El reintento todavía no venció
+            self.assertEqual(deudas.procesar_registros_pendientes(), 0)
+
+        registro.refresh_from_db()
+        self.assertEqual((registro.status, registro.attempts), ('PENDING', 1))
+        self.assertGreater(registro.next_attempt_at, timezone.now())
+
+    def test_circuito_abierto_reintenta_mas_tarde(self):
+        registro = self.crear_registro()
+
+        with mock.patch.object(deudas, 'registrar_deuda', side_effect=AdamsPayNoDisponible('abierto')):
+            deudas.procesar_registros_pendientes()
+
+        registro.refresh_from_db()
+        registro.order.refresh_from_db()
+        self.assertEqual(registro.status, 'PENDING')
+        self.assertIsNone(registro.order.payment_link)
+
+    def test_error_inesperado_falla_el_pedido(self):
+        registro = self.crear_registro()
+
+        with mock.patch.object(deudas, 'registrar_deuda', side_effect=KeyError('payUrl')):
+            deudas.procesar_registros_pendientes()
+
+        registro.refresh_from_db()
+        registro.order.refresh_from_db()
+        self.assertEqual(registro.status, 'FAILED')
+        self.assertEqual(registro.order.status, 'FAILED')
+
+    def test_reserva_vigente_no_se_reclama_dos_veces(self):
+        registro = self.crear_registro()
+
+        reclamado = deudas._reclamar_registro()
+        self.assertEqual(reclamado.pk, registro.pk)
+        self.assertEqual(reclamado.status, 'PROCESSING')
+        self.assertIsNone(deudas._reclamar_registro())
+
+    def test_reserva_vencida_la_retoma_otro_worker(self):
+        self.crear_registro()
+        abandonado = deudas._reclamar_registro()
+        DebtRegistration.objects.filter(pk=abandonado.pk).update(next_attempt_at=timezone.now())
+
+        retomado = deudas._reclamar_registro()
+        self.assertEqual((retomado.pk, retomado.attempts), (abandonado.pk, 2))
+
+        # El resultado del worker anterior ya no se aplica
+        deudas._procesar_registro(abandonado)
+        retomado.refresh_from_db()
+        self.assertEqual(retomado.status, 'PROCESSING')
+
+
+@skipUnless(connection.vendor == 'postgresql', 'SKIP LOCKED solo existe en PostgreSQL')
+class RegistroDeudasSkipLockedTests(TransactionTestCase):
+    def test_fila_bloqueada_se_salta(self):
+        bloqueada = DebtRegistration.objects.create(order=crear_pedido())
+        libre = DebtRegistration.objects.create(
+            order=crear_pedido(), next_attempt_at=timezone.now() + timedelta(seconds=1),
+        )
+        time.sleep(1)
+        tomada, liberar = threading.Event(), threading.Event()
+
+        def bloquear():
+            with transaction.atomic():
+                DebtRegistration.objects.select_for_update().get(pk=bloqueada.pk)
+                tomada.set()
+                liberar.wait(5)
+            connection.close()
+
+        hilo = threading.Thread(target=bloquear)
+        hilo.start()
+        try:
+            tomada.wait(5)
+            reclamado = deudas._reclamar_registro()
+        finally:
+            liberar.set()
+            hilo.join()
+
+        self.assertEqual(reclamado.pk, libre.pk)
+
+
+class TransicionesTests(TestCase):
+    def test_transicionar_desde_pending(self):
+        order = crear_pedido()
+
+        self.assertEqual(Order.objects.filter(id=order.id).transicionar('PAID'), 1)
+        order.refresh_from_db()
+        self.assertEqual(order.status, 'PAID')
+
+    def test_estado_final_no_cambia(self):
+        order = crear_pedido(status='PAID')
+
+        self.assertEqual(Order.objects.filter(id=order.id).transicionar('FAILED'), 0)
+        self.assertEqual(Order.objects.filter(id=order.id).transicionar('PENDING'), 0)
+        order.refresh_from_db()
+        self.assertEqual(order.status, 'PAID')
+
+    def test_pending_tardio_no_pisa_un_pago(self):
+        order = crear_pedido()
+        self.client.post('/api/adams/callback/', notificacion(order.id, 'paid'), content_type='application/json')
+        response = self.client.post('/api/adams/callback/', notificacion(order.id, 'pending', hora='T2'),
+                                    content_type='application/json')
+
+        self.assertFalse(response.json()['applied'])
+        self.assertEqual(response.json()['status'], 'PAID')
+
+
+class NotificacionesDuplicadasTests(TestCase):
+    def setUp(self):
+        notificaciones._huellas_recientes.clear()
+
+    def notificar(self, datos):
+        return self.client.post('/api/adams/callback/', datos, content_type='application/json')
+
+    def test_callback_repetido_se_aplica_una_vez(self):
+        order = crear_pedido()
+        primera = self.notificar(notificacion(order.id))
+        segunda = self.notificar(notificacion(order.id))
+
+        self.assertTrue(primera.json()['applied'])
+        self.assertTrue(segunda.json()['duplicate'])
+        self.assertEqual(ProcessedNotification.objects.count(), 1)
+        order.refresh_from_db()
+        self.assertEqual(order.status, 'PAID')
+
+    def test_otro_estado_no_es_duplicado(self):
+        order = crear_pedido()
+        self.notificar(notificacion(order.id, 'pending'))
+        self.notificar(notificacion(order.id, 'paid'))
+
+        self.assertEqual(ProcessedNotification.objects.count(), 2)
+
+    def test_callback_de_formulario_con_debt_texto(self):
+        order = crear_pedido()
+        response = self.client.post('/api/adams/callback/', {
+            'debt': 'x', 'externalId': str(order.id), 'status': 'paid',
+        })
+
+        self.assertEqual(response.status_code, 200)
+        order.refresh_from_db()
+        self.assertEqual(order.status, 'PAID')
+
+    def test_huella_tolera_campos_que_no_son_dict(self):
+        for datos in ({'debt': 'x'}, {'debt': {'payStatus': 'paid'}}, '["no", "es", "un", "dict"]', None):
+            self.assertEqual(len(notificaciones.calcular_huella(datos)), 40)
+
+    @override_settings(ADAMSPAY_DEDUP_RETENTION_DAYS=30)
+    def test_purga_huellas_viejas(self):
+        vieja = ProcessedNotification.objects.create(fingerprint='vieja')
+        ProcessedNotification.objects.filter(pk=vieja.pk).update(created_at=timezone.now() - timedelta(days=31))
+        ProcessedNotification.objects.create(fingerprint='reciente')
+
+        call_command('purgar_notificaciones', lote=1, pausa=0, stdout=io.StringIO())
+
+        self.assertEqual(list(ProcessedNotification.objects.values_list('fingerprint', flat=True)), ['reciente'])
+
+
+class PedidosDesconocidosTests(TestCase):
+    def setUp(self):
+        notificaciones._pedidos_desconocidos.clear()
+
+    def notificar(self, order_id, hora):
+        return self.client.post('/api/adams/callback/', notificacion(order_id, hora=hora),
+                                content_type='application/json')
+
+    def test_reintentos_de_un_pedido_inexistente_no_consultan_la_base(self):
+        order_id = uuid.uuid4()
+        antes = notificaciones.estadisticas_desconocidos()
+
+        self.assertEqual(self.notificar(order_id, 'T1').status_code, 404)
+        with self.assertNumQueries(0):
+            self.assertEqual(self.notificar(order_id, 'T2').status_code, 404)
+
+        despues = notificaciones.estadisticas_desconocidos()
+        self.assertEqual(despues['consultados'] - antes['consultados'], 1)
+        self.assertEqual(despues['desde_cache'] - antes['desde_cache'], 1)
+        self.assertFalse(ProcessedNotification.objects.exists())
+
+    def test_cache_negativa_acotada(self):
+        with mock.patch.object(notificaciones, '_pedidos_desconocidos', notificaciones.LRUCache(2)):
+            ids = [uuid.uuid4() for _ in range(3)]
+            for order_id in ids:
+                notificaciones.marcar_pedido_desconocido(order_id)
+
+            self.assertFalse(notificaciones.pedido_desconocido(ids[0]))
+            self.assertTrue(notificaciones.pedido_desconocido(ids[2]))
+
+
+@override_settings(ADAMSPAY_WEBHOOK_QUEUE=True)
+class ColaWebhooksTests(TestCase):
+    def test_callback_solo_encola(self):
+        order = crear_pedido()
+        response = self.client.post('/api/adams/callback/', notificacion(order.id),
+                                    content_type='application/json')
+
+        self.assertEqual(response.json()['event_id'], WebhookEvent.objects.get().id)
+        order.refresh_from_db()
+        self.assertEqual(order.status, 'PENDING')
+
+    def test_lote_aplica_el_ultimo_estado_de_cada_pedido(self):
+        pagado, fallido = crear_pedido(), crear_pedido()
+        for payload in (notificacion(pagado.id, 'pending'), notificacion(pagado.id, 'paid'),
+                        notificacion(fallido.id, 'failed'), notificacion('no-es-un-uuid'), {}):
+            WebhookEvent.objects.create(payload=payload)
+
+        self.assertEqual(notificaciones.procesar_eventos_pendientes(), 5)
+        self.assertEqual(notificaciones.procesar_eventos_pendientes(), 0)
+
+        pagado.refresh_from_db()
+        fallido.refresh_from_db()
+        self.assertEqual((pagado.status, fallido.status), ('PAID', 'FAILED'))
+        self.assertFalse(WebhookEvent.objects.filter(processed_at__isnull=True).exists())
+        self.assertEqual(
+            sorted(WebhookEvent.objects.exclude(error='').values_list('error', flat=True)),
+            ['ID no encontrado', 'UUID inválido'],
+        )
+
+    @override_settings(ADAMSPAY_WEBHOOK_RETENTION_DAYS=7)
+    def test_purga_solo_eventos_procesados_viejos(self):
+        viejo = WebhookEvent.objects.create(payload={}, processed_at=timezone.now() - timedelta(days=8))
+        reciente = WebhookEvent.objects.create(payload={}, processed_at=timezone.now())
+        pendiente = WebhookEvent.objects.create(payload={})
+        WebhookEvent.objects.filter(pk=pendiente.pk).update(received_at=timezone.now() - timedelta(days=30))
+
+        call_command('purgar_notificaciones', lote=1, pausa=0, stdout=io.StringIO())
+
+        self.assertEqual(set(WebhookEvent.objects.values_list('pk', flat=True)), {reciente.pk, pendiente.pk})
+        self.assertFalse(WebhookEvent.objects.filter(pk=viejo.pk).exists())
+
+
+@override_settings(ORDERS_STATUS_BATCH_MAX=4)
+class EstadoPorLotesTests(TestCase):
+    url = '/api/orders/status/'
+
+    def consultar(self, ids):
+        return self.client.post(self.url, {'ids': ids}, content_type='application/json')
+
+    def test_una_consulta_para_todo_el_lote(self):
+        pagado, pendiente = crear_pedido(status='PAID'), crear_pedido()
+        inexistente = str(uuid.uuid4())
+
+        with self.assertNumQueries(1):
+            response = self.consultar([str(pagado.id), str(pendiente.id), inexistente, 'no-es-un-uuid'])
+
+        estados = {pedido['id']: pedido['status'] for pedido in response.json()['orders']}
+        self.assertEqual(estados, {str(pagado.id): 'PAID', str(pendiente.id): 'PENDING'})
+        self.assertEqual(sorted(response.json()['not_found']), sorted([inexistente, 'no-es-un-uuid']))
+
+    def test_valida_la_lista(self):
+        self.assertEqual(self.consultar('no-es-una-lista').status_code, 400)
+        self.assertEqual(self.consultar([str(uuid.uuid4()) for _ in range(5)]).status_code, 400)
+
+
+class AvisosCapturados:
+    """Guarda los order_ids de cada ``order_changed`` enviado."""
+
+    def __init__(self):
+        self.avisos = []
+
+    def __call__(self, sender, order_ids, status=None, **kwargs):
+        self.avisos.append(sorted(order_ids))
+
+    def __enter__(self):
+        order_changed.connect(self)
+        return self
+
+    def __exit__(self, *exc):
+        order_changed.disconnect(self)
+
+
+@override_settings(ADAMSPAY_WEBHOOK_QUEUE=True)
+class AvisosDelLoteTests(TestCase):
+    def test_solo_se_avisa_de_los_pedidos_que_cambian(self):
+        pendiente, pagado = crear_pedido(), crear_pedido(status='PAID')
+        for payload in (notificacion(pendiente.id), notificacion(pagado.id, hora='T2')):
+            WebhookEvent.objects.create(payload=payload)
+
+        with AvisosCapturados() as capturados, self.captureOnCommitCallbacks(execute=True):
+            notificaciones.procesar_eventos_pendientes()
+
+        self.assertEqual(capturados.avisos, [[pendiente.id]])
+
+    def test_lote_sin_cambios_no_avisa(self):
+        pagado = crear_pedido(status='PAID')
+        WebhookEvent.objects.create(payload=notificacion(pagado.id, 'failed'))
+
+        with AvisosCapturados() as capturados, self.captureOnCommitCallbacks(execute=True):
+            notificaciones.procesar_eventos_pendientes()
+
+        self.assertEqual(capturados.avisos, [])
+
+
+class EsperasEnVivoTests(TransactionTestCase):
+    def esperar(self, order, **parametros):
+        request = RequestFactory().get('/', {'status': 'PENDING', **parametros})
+        return views.order_wait(request, order.id)
+
+    def pagar_mas_tarde(self, order, demora=0.2):
+        def pagar():
+            time.sleep(demora)
+            Order.objects.filter(id=order.id).transicionar('PAID')
+            notificar_cambio([order.id], 'PAID')
+            connection.close()
+
+        hilo = threading.Thread(target=pagar)
+        hilo.start()
+        return hilo
+
+    def test_rutas_solo_con_esperas_en_vivo(self):
+        order = crear_pedido()
+        for ruta in ('wait', 'events'):
+            with self.assertRaises(Resolver404):
+                resolve(f'/api/orders/{order.id}/{ruta}/')
+
+    def test_long_poll_despierta_con_el_cambio(self):
+        order = crear_pedido()
+        hilo = self.pagar_mas_tarde(order)
+        inicio = time.monotonic()
+
+        response = self.esperar(order, timeout=5)
+        hilo.join()
+
+        self.assertLess(time.monotonic() - inicio, 4)
+        self.assertEqual((response.data['status'], response.data['changed']), ('PAID', True))
+
+    def test_long_poll_vence_sin_cambios(self):
+        response = self.esperar(crear_pedido(), timeout=0.1)
+
+        self.assertEqual((response.data['status'], response.data['changed']), ('PENDING', False))
+
+    async def test_sse_envia_el_cambio_y_cierra_en_estado_final(self):
+        order = await sync_to_async(crear_pedido)()
+        response = await views.order_events(RequestFactory().get('/'), order.id)
+
+        eventos = []
+        async for parte in response.streaming_content:
+            eventos.append(parte)
+            if len(eventos) == 1:
+                await sync_to_async(Order.objects.filter(id=order.id).transicionar)('PAID')
+                await sync_to_async(notificar_cambio)([order.id], 'PAID')
+
+        self.assertEqual(response['Content-Type'], 'text/event-stream')
+        self.assertEqual(len(eventos), 2)
+        self.assertIn(b'"status":"PENDING"', eventos[0])
+        self.assertIn(b'"status":"PAID"', eventos[1])
+
+
+class CachePedidosTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        cache_pedidos._pedidos_locales.clear()
+
+    def pagar(self, order):
+        with self.captureOnCommitCallbacks(execute=True):
+            Order.objects.filter(id=order.id).transicionar('PAID')
+            notificar_cambio([order.id], 'PAID')
+
+    def test_segunda_lectura_no_consulta_la_base(self):
+        order = crear_pedido()
+        cache_pedidos.obtener_pedido(order.id)
+
+        with self.assertNumQueries(0):
+            pedido = cache_pedidos.obtener_pedido(order.id)
+
+        self.assertEqual((pedido['id'], pedido['amount']), (str(order.id), '153000.00'))
+
+    def test_un_cambio_invalida_el_pedido(self):
+        order = crear_pedido()
+        cache_pedidos.obtener_pedido(order.id)
+
+        self.pagar(order)
+
+        self.assertEqual(cache_pedidos.obtener_pedido(order.id)['status'], 'PAID')
+
+    def test_lectura_tardia_no_vuelve_a_cachear_el_pedido_viejo(self):
+        order = crear_pedido()
+        # Fila leída antes del webhook, guardada después de la invalidación
+        vieja = cache_pedidos.fila_a_dict(
+            Order.objects.filter(id=order.id).values(*cache_pedidos.CAMPOS_PEDIDO).get()
+        )
+        self.pagar(order)
+        cache_pedidos._guardar([vieja])
+
+        self.assertEqual(cache_pedidos.obtener_pedido(order.id)['status'], 'PAID')
+
+
+class RespuestasCondicionalesTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        cache_pedidos._pedidos_locales.clear()
+
+    def consultar(self, order, etag=None):
+        encabezados = {'HTTP_IF_NONE_MATCH': etag} if etag else {}
+        return self.client.get(f'/api/orders/{order.id}/', **encabezados)
+
+    def test_cada_cambio_incrementa_la_version(self):
+        order = crear_pedido()
+        pedidos = Order.objects.filter(id=order.id)
+
+        pedidos.actualizar(payment_link='https://pagos.example/1')
+        pedidos.transicionar('PAID')
+
+        self.assertEqual(pedidos.get().version, 3)
+
+    def test_etag_igual_responde_304(self):
+        order = crear_pedido()
+        etag = self.consultar(order)['ETag']
+
+        response = self.consultar(order, etag)
+
+        self.assertEqual(response.status_code, 304)
+        self.assertEqual(response.content, b'')
+
+    def test_etag_cambia_con_el_pedido(self):
+        order = crear_pedido()
+        etag = self.consultar(order)['ETag']
+        with self.captureOnCommitCallbacks(execute=True):
+            Order.objects.filter(id=order.id).transicionar('PAID')
+            notificar_cambio([order.id], 'PAID')
+
+        response = self.consultar(order, etag)
+
+        self.assertEqual(response.status_code, 200)
+        self.assertNotEqual(response['ETag'], etag)
+        self.assertEqual(response.json()['status'], 'PAID')
+
+
+class AdminPedidosTests(TestCase):
+    def setUp(self):
+        self.admin = OrderAdmin(Order, AdminSite())
+        self.request = RequestFactory().post('/')
+        self.request.user = User.objects.create_superuser('admin', 'admin@example.com', 'clave')
+
+    def formulario(self, order, **cambios):
+        datos = {
+            'product_name': order.product_name,
+            'amount': order.amount,
+            'status': order.status,
+            'payment_link': order.payment_link or '',
+        } | cambios
+        return self.admin.get_form(self.request, order)(datos, instance=order)
+
+    def test_cambio_de_estado_incrementa_la_version_y_avisa(self):
+        order = crear_pedido()
+        form = self.formulario(order, status='PAID')
+        self.assertTrue(form.is_valid(), form.errors)
+
+        with AvisosCapturados() as capturados, self.captureOnCommitCallbacks(execute=True):
+            self.admin.save_model(self.request, form.save(commit=False), form, change=True)
+
+        order.refresh_from_db()
+        self.assertEqual((order.status, order.version), ('PAID', 2))
+        self.assertEqual(capturados.avisos, [[order.id]])
+
+    def test_no_permite_salir_de_un_estado_final(self):
+        order = crear_pedido(status='PAID')
+
+        form = self.formulario(order, status='PENDING')
+
+        self.assertFalse(form.is_valid())
+        self.assertIn('status', form.errors)
+
+
+class ListadoPedidosTests(TestCase):
+    def setUp(self):
+        staff = User.objects.create_user('staff', password='clave', is_staff=True)
+        self.client.force_login(staff)
+
+    def listar(self, **parametros):
+        return self.client.get('/api/orders/list/', parametros)
+
+    def test_solo_para_staff(self):
+        self.client.logout()
+
+        self.assertEqual(self.listar().status_code, 403)
+        self.assertEqual(self.client.get('/api/orders/').status_code, 405)
+
+    def test_cursor_recorre_todos_los_pedidos_una_vez(self):
+        pedidos = [crear_pedido() for _ in range(5)]
+        # Mismo created_at: el cursor desempata por id
+        Order.objects.update(created_at=timezone.now())
+
+        vistos, cursor = [], None
+        while True:
+            datos = self.listar(limit=2, **({'cursor': cursor} if cursor else {})).json()
+            vistos += [pedido['id'] for pedido in datos['orders']]
+            cursor = datos['next_cursor']
+            if cursor is None:
+                break
+
+        self.assertEqual(vistos, sorted((str(pedido.id) for pedido in pedidos), reverse=True))
+
+    def test_filtra_por_estado(self):
+        pagado = crear_pedido(status='PAID')
+        crear_pedido()
+
+        datos = self.listar(status='PAID').json()
+
+        self.assertEqual([pedido['id'] for pedido in datos['orders']], [str(pagado.id)])
+
+    def test_parametros_invalidos(self):
+        for parametros in ({'cursor': 'no-es-un-cursor'}, {'status': 'PERDIDO'}, {'created_after': 'ayer'}):
+            with self.subTest(parametros=parametros):
+                self.assertEqual(self.listar(**parametros).status_code, 400)
+
+
+@override_settings(ADAMSPAY_OUTBOX=True, ORDERS_CART_MAX_ITEMS=3)
+class CheckoutCarritoTests(TestCase):
+    def checkout(self, items):
+        with mock.patch.object(views, 'modo_simulacion', return_value=False):
+            return self.client.post('/api/orders/cart/', {'items': items}, content_type='application/json')
+
+    def test_monto_calculado_en_el_servidor_y_lineas_en_un_insert(self):
+        items = [
+            {'product_name': 'Jamón Ibérico', 'unit_price': 153000, 'quantity': 2, 'subtotal': 1},
+            {'product_name': 'Queso Brie', 'unit_price': '98000.50'},
+        ]
+        with CaptureQueriesContext(connection) as consultas:
+            response = self.checkout(items)
+
+        self.assertEqual(response.status_code, 202)
+        order = Order.objects.get(id=response.json()['id'])
+        self.assertEqual(str(order.amount), '404000.50')
+        self.assertEqual(order.product_name, 'Jamón Ibérico y 1 más')
+        self.assertEqual(
+            list(order.items.order_by('id').values_list('product_name', 'quantity')),
+            [('Jamón Ibérico', 2), ('Queso Brie', 1)],
+        )
+        inserts = [q for q in consultas.captured_queries if q['sql'].startswith('INSERT INTO "orders_orderitem"')]
+        self.assertEqual(len(inserts), 1)
+
+    def test_carrito_invalido(self):
+        linea = {'product_name': 'Queso Brie', 'unit_price': 98000}
+        for items in ([], [linea] * 4, [linea | {'unit_price': 0}], [linea | {'quantity': 'dos'}], 'Queso'):
+            with self.subTest(items=items):
+                self.assertEqual(self.checkout(items).status_code, 400)
+
+        self.assertFalse(OrderItem.objects.exists())
+
+
+class ConciliacionTests(TestCase):
+    def setUp(self):
+        self.pagado, self.vencido, self.pendiente = crear_pedido(), crear_pedido(), crear_pedido()
+        self.reciente = crear_pedido()
+        Order.objects.exclude(id=self.reciente.id).update(created_at=timezone.now() - timedelta(hours=2))
+        self.deudas = {
+            str(self.pagado.id): {'payStatus': {'status': 'paid'}},
+            str(self.vencido.id): {'payStatus': {'status': 'pending'}, 'objStatus': {'status': 'expired'}},
+            str(self.pendiente.id): {'payStatus': {'status': 'pending'}},
+        }
+
+    def conciliar(self, *argumentos):
+        cliente = mock.Mock()
+        cliente.consultar_deuda.side_effect = lambda doc_id: mock.Mock(
+            status_code=200, json=lambda: {'debt': self.deudas[doc_id]},
+        )
+        salida = io.StringIO()
+        with mock.patch('orders.conciliacion.obtener_cliente', return_value=cliente), \
+                mock.patch('orders.management.commands.reconcile_adamspay.modo_simulacion', return_value=False):
+            call_command('reconcile_adamspay', '--minutos', '60', '--tasa', '0', *argumentos, stdout=salida)
+        return cliente, salida.getvalue()
+
+    def estados(self):
+        return dict(Order.objects.values_list('id', 'status'))
+
+    def test_dry_run_no_modifica_pedidos(self):
+        cliente, salida = self.conciliar('--dry-run')
+
+        self.assertEqual(cliente.consultar_deuda.call_count, 3)
+        self.assertEqual(set(self.estados().values()), {'PENDING'})
+        self.assertIn('Dry-run', salida)
+
+    def test_aplica_el_estado_real_de_las_deudas_antiguas(self):
+        Order.objects.filter(id=self.pagado.id).transicionar('PAID')
+        self.deudas[str(self.pendiente.id)] = {'payStatus': {'status': 'paid'}}
+
+        with AvisosCapturados() as capturados, self.captureOnCommitCallbacks(execute=True):
+            self.conciliar()
+
+        self.assertEqual(self.estados(), {
+            self.pagado.id: 'PAID',
+            self.vencido.id: 'FAILED',
+            self.pendiente.id: 'PAID',
+            self.reciente.id: 'PENDING',
+        })
+        self.assertCountEqual(capturados.avisos, [[self.pendiente.id], [self.vencido.id]])
+
+
+@override_settings(ORDERS_EXPIRY_GRACE_MINUTES=10)
+class VencimientoPedidosTests(TestCase):
+    def test_vence_solo_pendientes_pasado_el_margen(self):
+        ahora = timezone.now()
+        vencido = crear_pedido(expires_at=ahora - timedelta(minutes=11))
+        en_margen = crear_pedido(expires_at=ahora - timedelta(minutes=5))
+        pagado = crear_pedido(status='PAID', expires_at=ahora - timedelta(hours=1))
+        salida = io.StringIO()
+
+        with AvisosCapturados() as capturados, self.captureOnCommitCallbacks(execute=True):
+            call_command('expirar_pedidos', '--una-vez', stdout=salida)
+
+        self.assertEqual(dict(Order.objects.values_list('id', 'status')), {
+            vencido.id: 'FAILED',
+            en_margen.id: 'PENDING',
+            pagado.id: 'PAID',
+        })
+        self.assertEqual(capturados.avisos, [[vencido.id]])
+        self.assertIn('1 pedidos vencidos', salida.getvalue())
+
+
+class VistasAsincronasTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        cache_pedidos._pedidos_locales.clear()
+
+    def post(self, datos):
+        return RequestFactory().post('/', datos, content_type='application/json')
+
+    async def test_acreate_order_crea_el_pedido_con_su_link(self):
+        response = await views.acreate_order(self.post({'product_name': 'Queso Brie', 'amount': 98000}))
+
+        self.assertEqual(response.status_code, 200)
+        datos = json.loads(response.content)
+        order = await Order.objects.aget(id=datos['id'])
+        self.assertEqual(order.payment_link, datos['payment_link'])
+        self.assertIsNotNone(order.expires_at)
+
+    async def test_acreate_order_valida_la_solicitud(self):
+        faltan_datos = await views.acreate_order(self.post({'product_name': 'Queso Brie'}))
+        con_get = await views.acreate_order(RequestFactory().get('/'))
+
+        self.assertEqual((faltan_datos.status_code, con_get.status_code), (400, 405))
+
+    async def test_aorder_status_con_etag(self):
+        order = await sync_to_async(crear_pedido)()
+
+        response = await views.aorder_status(RequestFactory().get('/'), order.id)
+        repetida = await views.aorder_status(RequestFactory().get('/', HTTP_IF_NONE_MATCH=response['ETag']), order.id)
+        inexistente = await views.aorder_status(RequestFactory().get('/'), uuid.uuid4())
+
+        self.assertEqual(json.loads(response.content)['status'], 'PENDING')
+        self.assertEqual(repetida.status_code, 304)
+        self.assertEqual(inexistente.status_code, 404)
+
+    async def test_aadams_callback_aplica_la_notificacion(self):
+        order = await sync_to_async(crear_pedido)()
+
+        response = await views.aadams_callback(self.post(notificacion(order.id)))
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual((await Order.objects.aget(id=order.id)).status, 'PAID')
+
+    @override_settings(ADAMSPAY_WEBHOOK_QUEUE=True)
+    async def test_aadams_callback_encola_en_modo_cola(self):
+        order = await sync_to_async(crear_pedido)()
+
+        response = await views.aadams_callback(self.post(notificacion(order.id)))
+
+        self.assertEqual(json.loads(response.content)['message'], 'Notificación encolada')
+        self.assertEqual(await WebhookEvent.objects.acount(), 1)
+
+
+@override_settings(DEBUG=False, METRICS_TOKEN='secreto')
+class MetricasTests(TestCase):
+    def test_sin_token_configurado_no_se_publica(self):
+        with self.settings(METRICS_TOKEN=''):
+            self.assertEqual(self.client.get('/metrics').status_code, 404)
+
+    def test_exige_el_bearer_configurado(self):
+        sin_header = self.client.get('/metrics')
+        otro_token = self.client.get('/metrics', HTTP_AUTHORIZATION='Bearer otro')
+        valido = self.client.get('/metrics', HTTP_AUTHORIZATION='Bearer secreto')
+
+        self.assertEqual((sin_header.status_code, otro_token.status_code), (401, 401))
+        self.assertEqual(valido.status_code, 200)
+        self.assertIn(b'orders_http_request_duration_seconds', valido.content)
+
+
+class PreflightTests(TestCase):
+    def setUp(self):
+        directorio = tempfile.TemporaryDirectory()
+        self.addCleanup(directorio.cleanup)
+        self.marcador = os.path.join(directorio.name, 'listo')
+
+    def test_escribe_el_marcador_sin_migraciones_pendientes(self):
+        salida = io.StringIO()
+
+        call_command('preflight', '--marcador', self.marcador, stdout=salida)
+
+        with open(self.marcador, encoding='utf-8') as f:
+            self.assertEqual(json.load(f)['migraciones_aplicadas'], [])
+        self.assertIn('0 migraciones aplicadas', salida.getvalue())
+        call_command('preflight', '--marcador', self.marcador, '--verificar', stdout=io.StringIO())
+
+    def test_verificar_falla_sin_marcador(self):
+        with self.assertRaises(CommandError):
+            call_command('preflight', '--marcador', self.marcador, '--verificar')
+
+
+def cargar_conf_gunicorn():
+    ruta = Path(__file__).resolve().parent.parent / 'gunicorn.conf.py'
+    spec = importlib.util.spec_from_file_location('gunicorn_conf', ruta)
+    modulo = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(modulo)
+    return modulo
+
+
+class PerfilesServidorTests(TestCase):
+    def setUp(self):
+        variables = ('DB_POOL', 'DB_POOL_MAX_SIZE', 'GUNICORN_THREADS', 'WEB_CONCURRENCY', 'DB_MAX_CONNECTIONS')
+        entorno = mock.patch.dict(os.environ, {'SERVER_PROFILE': 'io'})
+        entorno.start()
+        self.addCleanup(entorno.stop)
+        for nombre in variables:
+            os.environ.pop(nombre, None)
+        self.conf = cargar_conf_gunicorn()
+
+    def test_perfiles_segun_cpus(self):
+        io_ = self.conf.calcular_perfil('io', cpus=2)
+        self.assertEqual((io_['worker_class'], io_['workers'], io_['threads']), ('gthread', 3, 8))
+        asincrono = self.conf.calcular_perfil('async', cpus=2)
+        self.assertEqual(asincrono['wsgi_app'], 'dononofre.asgi:application')
+        self.assertEqual(asincrono['workers'], 2)
+        cpu = self.conf.calcular_perfil('cpu', cpus=2)
+        self.assertEqual((cpu['workers'], cpu['threads']), (5, 1))
+
+    def test_threads_siguen_al_pool(self):
+        os.environ.update(DB_POOL='True', DB_POOL_MAX_SIZE='4')
+
+        perfil = self.conf.calcular_perfil('io', cpus=1)
+
+        self.assertEqual((perfil['threads'], perfil['conexiones_por_worker']), (4, 4))
+
+    def test_limite_de_conexiones_acota_los_workers(self):
+        os.environ['DB_MAX_CONNECTIONS'] = '20'
+
+        perfil = self.conf.calcular_perfil('io', cpus=8)
+
+        self.assertEqual(perfil['workers'], 2)
+
+    def test_perfil_desconocido(self):
+        with self.assertRaises(ValueError):
+            self.conf.calcular_perfil('turbo')
+
+
+class EstaticosMinificadosTests(TestCase):
+    def setUp(self):
+        directorio = tempfile.TemporaryDirectory()
+        self.addCleanup(directorio.cleanup)
+        self.storage = EstaticosMinificados(location=directorio.name)
+
+    def leer(self, nombre):
+        with self.storage.open(nombre) as archivo:
+            return archivo.read().decode('utf-8')
+
+    def test_minifica_css_y_js_propios(self):
+        self.storage.save('css/a.css', ContentFile(b'body {\n    color: red;\n}\n'))
+        self.storage.save('js/a.js', ContentFile(b'// comentario\nfunction f(a) {\n    return a;\n}\n'))
+
+        self.assertEqual(self.leer('css/a.css'), 'body{color:red}')
+        self.assertEqual(self.leer('js/a.js'), 'function f(a){return a;}')
+
+    def test_no_toca_estaticos_de_terceros(self):
+        original = 'body {\n    color: red;\n}\n'
+        self.storage.save('admin/css/a.css', ContentFile(original.encode('utf-8')))
+        self.storage.save('css/b.min.css', ContentFile(original.encode('utf-8')))
+
+        self.assertEqual(self.leer('admin/css/a.css'), original)
+        self.assertEqual(self.leer('css/b.min.css'), original)
+
+
+@override_settings(STORAGES={
+    'default': {'BACKEND': 'django.core.files.storage.FileSystemStorage'},
+    'staticfiles': {'BACKEND': 'django.contrib.staticfiles.storage.StaticFilesStorage'},
+})
+class PaginasCacheadasTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        paginas._paginas_locales.clear()
+        paginas._version = None
+
+    def test_home_comprimida_segun_accept_encoding(self):
+        identidad = self.client.get('/')
+        con_brotli = self.client.get('/', HTTP_ACCEPT_ENCODING='gzip, deflate, br')
+        con_gzip = self.client.get('/', HTTP_ACCEPT_ENCODING='gzip')
+
+        self.assertNotIn('Content-Encoding', identidad)
+        self.assertEqual(con_brotli['Content-Encoding'], 'br')
+        self.assertEqual(con_gzip['Content-Encoding'], 'gzip')
+        self.assertEqual(brotli.decompress(con_brotli.content), identidad.content)
+        self.assertEqual(gzip.decompress(con_gzip.content), identidad.content)
+        self.assertIn('Accept-Encoding', con_gzip['Vary'])
+        self.assertIn(b'data-eventos="0"', identidad.content)
+
+    def test_home_responde_304_con_el_mismo_etag(self):
+        primera = self.client.get('/')
+
+        with self.assertNumQueries(0):
+            segunda = self.client.get('/', HTTP_IF_NONE_MATCH=primera['ETag'])
+
+        self.assertEqual(segunda.status_code, 304)
+        self.assertTrue(primera['Cache-Control'].startswith('public, max-age='))
+
+    def test_la_version_cambia_con_las_esperas_en_vivo(self):
+        version = paginas.version_paginas()
+        paginas._version = None
+
+        with override_settings(ORDERS_LIVE_UPDATES=True):
+            self.assertNotEqual(paginas.version_paginas(), version)
+
+    def test_resultado_con_el_detalle_del_pedido(self):
+        order = crear_pedido(status='PAID')
+
+        response = self.client.get('/payment-result/', {'order_id': str(order.id)})
+
+        self.assertContains(response, 'Pago Completado')
+        self.assertContains(response, str(order.id))
+        self.assertEqual(response['Cache-Control'], 'private, no-cache')
+
+
+class JSONRapidoTests(TestCase):
+    def datos(self):
+        return {
+            'product_name': 'Jamón Ibérico',
+            'amount': Decimal('153000.00'),
+            'created_at': timezone.now(),
+            'items': [{'quantity': 2}],
+            'payment_link': None,
+        }
+
+    @skipUnless(renderers.orjson, 'orjson no instalado')
+    def test_misma_salida_que_drf(self):
+        datos = self.datos()
+
+        self.assertEqual(renderers.ORJSONRenderer().render(datos), JSONRenderer().render(datos))
+
+    def test_misma_salida_sin_orjson(self):
+        datos = self.datos()
+
+        with mock.patch.object(renderers, 'USAR_ORJSON', False):
+            self.assertEqual(renderers.ORJSONRenderer().render(datos), JSONRenderer().render(datos))
+
+    def test_json_invalido(self):
+        with self.assertRaises(ParseError):
+            renderers.ORJSONParser().parse(io.BytesIO(b'{"amount": '))
+
+    def test_lectura_de_un_pedido_igual_a_la_proyeccion(self):
+        order = crear_pedido(amount=1000)
+        proyeccion = fila_a_dict(Order.objects.filter(id=order.id).values(*CAMPOS_PEDIDO).get())
+
+        with self.assertNumQueries(1):
+            filas = cache_pedidos._leer_de_la_base([str(order.id)])
+
+        self.assertEqual(filas, [proyeccion])
+        self.assertEqual(filas[0]['amount'], '1000.00')
+
+
+class IdempotenciaTests(TestCase):
+    def crear(self, clave, **datos):
+        datos = {'product_name': 'Queso Brie', 'amount': 98000} | datos
+        return self.client.post('/api/orders/', datos, content_type='application/json',
+                                HTTP_IDEMPOTENCY_KEY=clave)
+
+    def test_la_repeticion_devuelve_la_misma_respuesta(self):
+        primera = self.crear('compra-1')
+        segunda = self.crear('compra-1')
+
+        self.assertEqual(primera.status_code, 200)
+        self.assertEqual(segunda.json(), primera.json())
+        self.assertEqual(segunda['Idempotent-Replayed'], 'true')
+        self.assertNotIn('Idempotent-Replayed', primera)
+        self.assertEqual(Order.objects.count(), 1)
+
+    def test_la_misma_clave_con_otros_datos_es_422(self):
+        self.crear('compra-1')
+
+        response = self.crear('compra-1', amount=99000)
+
+        self.assertEqual(response.status_code, 422)
+        self.assertEqual(Order.objects.count(), 1)
+
+    def test_clave_invalida(self):
+        self.assertEqual(self.crear('x' * 300).status_code, 400)
+        self.assertEqual(Order.objects.count(), 0)
+
+    def test_un_error_5xx_libera_la_clave(self):
+        llamadas = []
+
+        def fallar():
+            llamadas.append(1)
+            return {'error': 'AdamsPay no disponible'}, 503
+
+        _, codigo, _ = idempotencia.ejecutar('compra-1', 'create_order', {}, fallar)
+        self.assertEqual(codigo, 503)
+        self.assertFalse(IdempotencyKey.objects.exists())
+
+        idempotencia.ejecutar('compra-1', 'create_order', {}, fallar)
+        self.assertEqual(len(llamadas), 2)
+
+    def test_una_clave_abandonada_se_vuelve_a_ejecutar(self):
+        IdempotencyKey.objects.create(
+            key='compra-1', request_hash=idempotencia.huella_solicitud('create_order', {}),
+            locked_at=timezone.now() - timedelta(hours=1),
+            expires_at=timezone.now() + timedelta(hours=1),
+        )
+
+        datos, codigo, repetida = idempotencia.ejecutar(
+            'compra-1', 'create_order', {}, lambda: ({'ok': True}, 201),
+        )
+
+        self.assertEqual((datos, codigo, repetida), ({'ok': True}, 201, False))
+
+    def test_purgar_vencidas(self):
+        IdempotencyKey.objects.create(
+            key='vieja', request_hash='x', locked_at=timezone.now(),
+            expires_at=timezone.now() - timedelta(seconds=1),
+        )
+
+        self.assertEqual(idempotencia.purgar_vencidas(), 1)
+        self.assertFalse(IdempotencyKey.objects.exists())
+
+    @override_settings(ORDERS_IDEMPOTENCY_WAIT=0.1)
+    def test_409_si_la_original_no_termina(self):
+        IdempotencyKey.objects.create(
+            key='compra-1', request_hash=idempotencia.huella_solicitud('create_order', {}),
+            locked_at=timezone.now(), expires_at=timezone.now() + timedelta(hours=1),
+        )
+
+        with self.assertRaises(idempotencia.SolicitudEnCurso):
+            idempotencia.ejecutar('compra-1', 'create_order', {}, lambda: ({}, 200))
+
+
+class IdempotenciaConcurrenteTests(TransactionTestCase):
+    def test_el_duplicado_espera_a_la_solicitud_original(self):
+        en_curso, seguir = threading.Event(), threading.Event()
+        llamadas = []
+        resultados = {}
+
+        def crear():
+            llamadas.append(1)
+            en_curso.set()
+            seguir.wait(5)
+            return {'id': 'pedido-1'}, 200
+
+        def primera():
+            try:
+                resultados['primera'] = idempotencia.ejecutar('compra-1', 'create_order', {}, crear)
+            finally:
+                connection.close()
+
+        hilo = threading.Thread(target=primera)
+        hilo.start()
+        self.assertTrue(en_curso.wait(5))
+        threading.Timer(0.2, seguir.set).start()
+
+        duplicada = idempotencia.ejecutar('compra-1', 'create_order', {}, crear)
+        hilo.join(5)
+
+        self.assertEqual(resultados['primera'], ({'id': 'pedido-1'}, 200, False))
+        self.assertEqual(duplicada, ({'id': 'pedido-1'}, 200, True))
+        self.assertEqual(len(llamadas), 1)
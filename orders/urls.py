@@ -1,13 +1,35 @@
+from django.conf import settings
 from django.urls import path
 from . import views
 from django.views.decorators.csrf import csrf_exempt
 
+# Bajo ASGI (uvicorn) las vistas más usadas tienen versión asíncrona
+if settings.ORDERS_ASYNC_VIEWS:
+    create_order = views.acreate_order
+    order_status = views.aorder_status
+    adams_callback = views.aadams_callback
+else:
+    create_order = views.create_order
+    order_status = views.order_status
+    adams_callback = views.adams_callback
+
 urlpatterns = [
     path('', views.home, name='home'),
-    path('orders/', views.create_order, name='create_order'),
-    path('orders/<uuid:order_id>/', views.order_status, name='order_status'),
-    path('adams/callback/', views.adams_callback, name='adams_callback'),
+    path('orders/', create_order, name='create_order'),
+    path('orders/cart/', views.cart_checkout, name='cart_checkout'),
+    path('orders/list/', views.listar_pedidos, name='listar_pedidos'),
+    path('orders/status/', views.orders_status_batch, name='orders_status_batch'),
+    path('orders/<uuid:order_id>/', order_status, name='order_status'),
+    path('adams/callback/', adams_callback, name='adams_callback'),
     path('adams/redirect/', views.adams_redirect, name='adams_redirect'),
     path('payment-result/', views.payment_result, name='payment_result'),
     path('test-webhook/<uuid:order_id>/', views.test_webhook, name='test_webhook'),
-]
\ No newline at end of file
+]
+
+# Bajo WSGI una espera ocupa un thread de gunicorn durante todo el timeout, y
+# Django consume el flujo SSE asíncrono entero antes de enviar nada
+if settings.ORDERS_LIVE_UPDATES:
+    urlpatterns += [
+        path('orders/<uuid:order_id>/wait/', views.order_wait, name='order_wait'),
+        path('orders/<uuid:order_id>/events/', views.order_events, name='order_events'),
+    ]
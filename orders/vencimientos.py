@@ -0,0 +1,49 @@
+# vencimientos.py - Vencimiento de pedidos pendientes
+
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import transaction
+from django.utils import timezone
+
+from .models import Order
+from .signals import notificar_cambio
+
+
+def expirar_pedidos_vencidos(lote=1000):
+    """
+    Pasa a FAILED un lote de pedidos PENDING cuyo validPeriod ya terminó.
+
+    Los pedidos se reclaman con ``SELECT ... FOR UPDATE SKIP LOCKED`` sobre
+    el índice parcial de vencimientos y se actualizan con un único
+    ``UPDATE`` condicional (``transicionar``) en una transacción corta, así
+    el barrido puede correr junto al tráfico normal: no espera por filas
+    bloqueadas ni retiene bloqueos más que lo que dura un lote. Un webhook
+    PAID que gane la carrera deja al pedido fuera del ``UPDATE``.
+
+    Se deja un margen de ORDERS_EXPIRY_GRACE_MINUTES por diferencias de
+    reloj con AdamsPay.
+
+    Args:
+        lote (int): Cantidad máxima de pedidos a vencer.
+
+    Returns:
+        int: Cantidad de pedidos que pasaron a FAILED.
+    """
+    limite = timezone.now() - timedelta(minutes=settings.ORDERS_EXPIRY_GRACE_MINUTES)
+
+    with transaction.atomic():
+        ids = list(
+            Order.objects
+            .select_for_update(skip_locked=True)
+            .filter(status='PENDING', expires_at__lte=limite)
+            .values_list('id', flat=True)[:lote]
+        )
+        if not ids:
+            return 0
+
+        vencidos = Order.objects.filter(id__in=ids).transicionar('FAILED')
+        if vencidos:
+            notificar_cambio(ids, 'FAILED')
+
+    return vencidos
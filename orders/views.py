@@ -1,39 +1,68 @@
 # views.py - VERSIÓN LIMPIA Y PROFESIONAL
 
-from django.shortcuts import render
-from rest_framework.decorators import api_view
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Q
+from django.http import HttpResponse, StreamingHttpResponse
+from django.utils import timezone
+from django.utils.cache import get_conditional_response
+from django.utils.dateparse import parse_date, parse_datetime
+from django.utils.http import http_date, parse_etags
+from rest_framework.decorators import api_view, permission_classes
+from rest_framework.permissions import IsAdminUser
 from rest_framework.response import Response
 from rest_framework import status
 from django.views.decorators.csrf import csrf_exempt
-from .models import Order
-from .serializers import OrderSerializer
-import traceback
-import requests
-import os
-import json
+from .models import Order, OrderItem
+from .renderers import RespuestaJSON, dumps, loads
+from .serializers import (
+    CAMPOS_CREACION, CAMPOS_PEDIDO, fila_a_dict, linea_a_dict, pedido_a_dict,
+)
+from .adamspay import ADAMSPAY_APP_SECRET
+from .cache import (
+    aguardar_pedido, aobtener_pedido, guardar_pedido, obtener_pedido, obtener_pedidos,
+)
+from .deudas import aregistrar_deuda, encolar_registro, modo_simulacion, registrar_deuda
+from .eventos import broker
+from .idempotencia import ErrorIdempotencia, SolicitudEnCurso, aejecutar, ejecutar
+from .metricas import exportar
+from .paginas import respuesta_home, respuesta_resultado
+from .signals import notificar_cambio
+from .notificaciones import (
+    aencolar_evento, calcular_huella, determinar_estado, encolar_evento, extraer_order_id,
+    huella_vista, marcar_pedido_desconocido, pedido_desconocido, registrar_huella,
+)
+import logging
+import asyncio
+import base64
+import binascii
+import hashlib
+import hmac
+import time
 import uuid
-from datetime import datetime, timedelta
+from datetime import datetime, time as dt_time, timedelta
+from decimal import Decimal
 
-# Configuraciones de AdamsPay
-ADAMSPAY_BASE_URL = os.getenv('ADAMSPAY_BASE_URL', 'https://staging.adamspay.com')
-ADAMSPAY_API_URL = f"{ADAMSPAY_BASE_URL}/api/v1/debts"
-ADAMSPAY_API_KEY = os.getenv('ADAMSPAY_API_KEY', '')
-ADAMSPAY_APP_SECRET = os.getenv('ADAMSPAY_APP_SECRET', '')
-ADAMSPAY_APP_SLUG = os.getenv('ADAMSPAY_APP_SLUG', 'website')
-ADAMSPAY_CALLBACK_URL = os.getenv('ADAMSPAY_CALLBACK_URL', 'https://don-onofre-adamspay.onrender.com/api/adams/callback/')
+logger = logging.getLogger(__name__)
+# Payloads completos de solicitudes y webhooks (muestreados, ver LOGGING)
+logger_payloads = logging.getLogger('orders.payloads')
 
 
 def home(request):
     """
     Vista para la página principal.
     
+    La página es igual para todos los visitantes: se sirve ya renderizada
+    y comprimida desde la caché (ver ``paginas.respuesta_home``).
+    
     Args:
         request (HttpRequest): Objeto de solicitud HTTP.
     
     Returns:
-        HttpResponse: Renderiza la plantilla index.html.
+        HttpResponse: La plantilla index.html.
     """
-    return render(request, 'index.html')
+    return respuesta_home(request)
 
 
 @api_view(['POST'])
@@ -58,14 +87,24 @@ def create_order(request):
             - status (str): Estado inicial (PENDING).
             - payment_link (str): URL para proceder al pago.
             - warning (str, opcional): Advertencias si hay problemas con AdamsPay.
+        
+        En modo outbox (ADAMSPAY_OUTBOX=True) responde 202 con
+        payment_link nulo y registration=PENDING; el link se obtiene
+        luego desde order_status.
+        
+        Con el header Idempotency-Key, una repetición de la misma
+        solicitud devuelve la respuesta guardada (con
+        ``Idempotent-Replayed: true``) sin crear otro pedido.
     
     Raises:
-        400 Bad Request: Si faltan parámetros obligatorios.
+        400 Bad Request: Si faltan parámetros obligatorios o la
+            Idempotency-Key es inválida.
+        409 Conflict: Si la solicitud original con la misma clave sigue en curso.
+        422 Unprocessable Entity: Si la clave ya se usó con otros datos.
         500 Internal Server Error: Si ocurre un error inesperado.
     """
     try:
-        print("Iniciando creación de pedido")
-        print(f"Datos recibidos: {request.data}")
+        logger_payloads.info("Creación de pedido: %s", request.data)
         
         # Validar datos
         product_name = request.data.get('product_name')
@@ -77,123 +116,356 @@ def create_order(request):
                 status=status.HTTP_400_BAD_REQUEST
             )
         
-        # Crear pedido en la base de datos
-        order = Order.objects.create(
-            product_name=product_name,
-            amount=amount,
-            status='PENDING'
+        return _crear_idempotente(
+            request, 'create_order', lambda: _crear_pedido(product_name, amount)
         )
         
-        print(f"Pedido creado: {order.id}")
-        print(f"Valor original: {amount} (este es el valor en guaranis)")
-        
-        # Si no hay API Key, usar modo simulación
-        if not ADAMSPAY_API_KEY or ADAMSPAY_API_KEY == 'su_api_key_aqui':
-            print("Modo simulación - Configure una API Key real")
-            
-            payment_url = f"{ADAMSPAY_BASE_URL}/pay/{ADAMSPAY_APP_SLUG}/debt/{order.id}"
-            order.payment_link = payment_url
-            order.save()
-            
-            return Response({
-                'id': str(order.id),
-                'product_name': order.product_name,
-                'amount': str(order.amount),
-                'status': order.status,
-                'payment_link': payment_url,
-                'warning': 'Configure ADAMSPAY_API_KEY en Render para integración real'
-            })
-        
-        valor_pyg = int(float(amount))
-        inicio = datetime.now()
-        fin = inicio + timedelta(days=2)
-        
-        payload = {
-            "debt": {
-                "docId": str(order.id),
-                "label": f"Don Onofre - {product_name}",
-                "amount": {
-                    "currency": "PYG",
-                    "value": str(valor_pyg)
-                },
-                "validPeriod": {
-                    "start": inicio.strftime("%Y-%m-%dT%H:%M:%S"),
-                    "end": fin.strftime("%Y-%m-%dT%H:%M:%S")
-                },
-                "target": {
-                    "type": "WEB",
-                    "label": "Don Onofre Restaurante"
-                }
-            }
-        }
-        
-        headers = {
-            "apikey": ADAMSPAY_API_KEY,
-            "Content-Type": "application/json",
-            "x-if-exists": "update"
-        }
+    except Exception as e:
+        logger.exception("Error al crear pedido: %s", e)
+        return Response(
+            {'error': str(e)},
+            status=status.HTTP_500_INTERNAL_SERVER_ERROR
+        )
+
+
+@api_view(['POST'])
+def cart_checkout(request):
+    """
+    Crea un pedido con varios productos y registra una sola deuda en AdamsPay.
+    
+    Todas las líneas se insertan con un único ``bulk_create`` en la misma
+    transacción que el pedido, y el monto total lo calcula el servidor
+    como la suma de precio unitario por cantidad.
+    
+    Args:
+        request (HttpRequest): Objeto de solicitud HTTP con datos JSON.
+            Debe contener:
+            - items (list[dict]): Líneas del carrito (máximo
+              ORDERS_CART_MAX_ITEMS), cada una con product_name (str),
+              unit_price (número) y quantity (int, por defecto 1).
+    
+    Returns:
+        Response: JSON igual al de create_order, más:
+            - items (list[dict]): Líneas con product_name, unit_price,
+              quantity y subtotal.
         
-        print(f"Llamando a AdamsPay: {ADAMSPAY_API_URL}")
-        print(f"Payload: {json.dumps(payload, indent=2)}")
+        Acepta el header Idempotency-Key igual que create_order.
+    
+    Raises:
+        400 Bad Request: Si items está vacío, supera el máximo o alguna
+            línea es inválida.
+        409 / 422: Ver Idempotency-Key en create_order.
+        500 Internal Server Error: Si ocurre un error inesperado.
+    """
+    try:
+        logger_payloads.info("Checkout de carrito: %s", request.data)
         
-        response = requests.post(
-            ADAMSPAY_API_URL,
-            json=payload,
-            headers=headers,
-            timeout=30
-        )
+        items = request.data.get('items')
+        if not isinstance(items, list) or not items:
+            return Response(
+                {'error': 'items debe ser una lista no vacía'},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        if len(items) > settings.ORDERS_CART_MAX_ITEMS:
+            return Response(
+                {'error': f'Máximo {settings.ORDERS_CART_MAX_ITEMS} productos por pedido'},
+                status=status.HTTP_400_BAD_REQUEST
+            )
         
-        print(f"Estado de respuesta: {response.status_code}")
+        lineas = []
+        for posicion, item in enumerate(items, start=1):
+            try:
+                linea = OrderItem(
+                    product_name=str(item['product_name'])[:100],
+                    unit_price=Decimal(str(item['unit_price'])).quantize(Decimal('0.01')),
+                    quantity=int(item.get('quantity', 1)),
+                )
+                valida = linea.product_name and linea.unit_price > 0 and linea.quantity >= 1
+            except (KeyError, TypeError, ValueError, ArithmeticError, AttributeError):
+                valida = False
+            if not valida:
+                return Response(
+                    {'error': f'Línea {posicion} inválida: requiere product_name, unit_price > 0 y quantity >= 1'},
+                    status=status.HTTP_400_BAD_REQUEST
+                )
+            lineas.append(linea)
         
-        if response.status_code in [200, 201]:
-            data = response.json()
-            print(f"Respuesta AdamsPay: {json.dumps(data, indent=2)}")
-            
-            if 'debt' in data and 'payUrl' in data['debt']:
-                payment_url = data['debt']['payUrl']
-                order.payment_link = payment_url
-                order.save()
-                
-                return Response({
-                    'id': str(order.id),
-                    'product_name': order.product_name,
-                    'amount': str(order.amount),
-                    'status': order.status,
-                    'payment_link': payment_url,
-                    'adamspay_id': data['debt'].get('id'),
-                    'message': 'Pago creado en AdamsPay'
-                })
-        
-        # Fallback si hay error
-        print(f"Error en AdamsPay: {response.text}")
-        
-        payment_url = f"{ADAMSPAY_BASE_URL}/pay/{ADAMSPAY_APP_SLUG}/debt/{order.id}"
-        order.payment_link = payment_url
-        order.save()
+        total = sum(linea.subtotal for linea in lineas)
+        campo_monto = Order._meta.get_field('amount')
+        if total >= 10 ** (campo_monto.max_digits - campo_monto.decimal_places):
+            return Response(
+                {'error': 'El monto total del carrito excede el máximo permitido'},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        product_name = lineas[0].product_name
+        if len(lineas) > 1:
+            product_name = f"{product_name[:80]} y {len(lineas) - 1} más"
         
-        return Response({
-            'id': str(order.id),
-            'product_name': order.product_name,
-            'amount': str(order.amount),
-            'status': order.status,
-            'payment_link': payment_url,
-            'warning': f'Error AdamsPay {response.status_code} - Usando URL simulada'
-        })
+        return _crear_idempotente(
+            request, 'cart_checkout', lambda: _crear_pedido(product_name, total, lineas)
+        )
         
     except Exception as e:
-        print(f"Error al crear pedido: {str(e)}")
-        print(traceback.format_exc())
+        logger.exception("Error en checkout de carrito: %s", e)
         return Response(
             {'error': str(e)},
             status=status.HTTP_500_INTERNAL_SERVER_ERROR
         )
 
 
+def _crear_pedido(product_name, amount, lineas=None):
+    """
+    Crea un pedido (con sus líneas, si las hay) y registra su deuda.
+    
+    Compartido por create_order y cart_checkout.
+    
+    Args:
+        product_name (str): Nombre del pedido (etiqueta de la deuda).
+        amount (Decimal|str|int): Monto total en guaraníes.
+        lineas (list[OrderItem], opcional): Líneas sin guardar del carrito.
+    
+    Returns:
+        Response: Datos del pedido creado (202 en modo outbox).
+    """
+    def guardar():
+        order = Order.objects.create(
+            product_name=product_name,
+            amount=amount,
+            status='PENDING',
+            expires_at=timezone.now() + timedelta(hours=settings.ORDERS_VALID_HOURS)
+        )
+        if lineas:
+            for linea in lineas:
+                linea.order = order
+            OrderItem.objects.bulk_create(lineas)
+        return order
+    
+    # Modo outbox: el pedido y su registro pendiente se confirman
+    # juntos y la deuda se registra en segundo plano
+    if settings.ADAMSPAY_OUTBOX and not modo_simulacion():
+        with transaction.atomic():
+            order = guardar()
+            encolar_registro(order)
+        guardar_pedido(order)
+        
+        logger.info("Pedido creado: %s (registro en AdamsPay encolado)", order.id,
+                    extra={'order_id': str(order.id)})
+        
+        datos_respuesta = pedido_a_dict(order, CAMPOS_CREACION)
+        datos_respuesta['registration'] = 'PENDING'
+        datos_respuesta['message'] = 'Registro en AdamsPay en proceso'
+        codigo = status.HTTP_202_ACCEPTED
+    else:
+        # Crear pedido en la base de datos
+        with transaction.atomic():
+            order = guardar()
+        
+        logger.info("Pedido creado: %s", order.id, extra={'order_id': str(order.id)})
+        
+        resultado = registrar_deuda(order)
+        guardar_pedido(order)
+        
+        datos_respuesta = _datos_pedido_registrado(order, resultado)
+        codigo = status.HTTP_200_OK
+    
+    if lineas:
+        datos_respuesta['items'] = [linea_a_dict(linea) for linea in lineas]
+    
+    return Response(datos_respuesta, status=codigo)
+
+
+def _crear_idempotente(request, endpoint, crear):
+    """
+    Crea el pedido una sola vez por header Idempotency-Key.
+    
+    Sin el header llama a ``crear`` directamente. Con el header la primera
+    solicitud crea el pedido y guarda su respuesta; las repeticiones con
+    los mismos datos la reciben sin volver a llamar a AdamsPay, y las que
+    llegan mientras la primera sigue en curso la esperan (ver
+    ``idempotencia.ejecutar``).
+    
+    Args:
+        request (Request): Solicitud de create_order o cart_checkout.
+        endpoint (str): Nombre del endpoint (una clave no sirve para ambos).
+        crear (callable): Sin argumentos; devuelve la Response del pedido.
+    
+    Returns:
+        Response: La del pedido creado, la guardada o el error de la clave.
+    """
+    clave = request.headers.get('Idempotency-Key')
+    if clave is None:
+        return crear()
+    
+    def crear_datos():
+        respuesta = crear()
+        return respuesta.data, respuesta.status_code
+    
+    try:
+        datos_respuesta, codigo, repetida = ejecutar(clave, endpoint, request.data, crear_datos)
+    except ErrorIdempotencia as e:
+        return _respuesta_idempotencia(e, Response)
+    return _marcar_repetida(Response(datos_respuesta, status=codigo), repetida)
+
+
+def _respuesta_idempotencia(error, clase_respuesta):
+    """Respuesta de error de Idempotency-Key (Response o RespuestaJSON)."""
+    response = clase_respuesta({'error': str(error)}, status=error.codigo)
+    if isinstance(error, SolicitudEnCurso):
+        response['Retry-After'] = '1'
+    return response
+
+
+def _marcar_repetida(response, repetida):
+    if repetida:
+        response['Idempotent-Replayed'] = 'true'
+    return response
+
+
+def _datos_pedido_registrado(order, resultado):
+    """Datos de respuesta de un pedido cuya deuda ya se intentó registrar."""
+    datos_respuesta = pedido_a_dict(order, CAMPOS_CREACION)
+    datos_respuesta['payment_link'] = resultado['payment_link']
+    if resultado['registrado']:
+        datos_respuesta['adamspay_id'] = resultado.get('adamspay_id')
+        datos_respuesta['message'] = 'Pago creado en AdamsPay'
+    else:
+        datos_respuesta['warning'] = resultado['warning']
+    return datos_respuesta
+
+
+@api_view(['GET'])
+@permission_classes([IsAdminUser])
+def listar_pedidos(request):
+    """
+    Lista pedidos, del más reciente al más antiguo, con paginación por cursor.
+    
+    Incluye los pedidos y payment_link de todos los clientes: solo para
+    usuarios staff (sesión del admin o Basic auth).
+    
+    La paginación es keyset sobre (created_at, id): cada página continúa
+    con ``WHERE created_at <= c AND (created_at < c OR (created_at = c
+    AND id < i))``, un rango sobre los índices (created_at, id) y (status,
+    created_at, id), por lo que las páginas profundas cuestan lo mismo que
+    la primera (sin OFFSET).
+    
+    Args:
+        request (HttpRequest): Objeto de solicitud HTTP.
+            Parámetros GET opcionales:
+            - status: PENDING, PAID o FAILED.
+            - created_after: Fecha o fecha y hora ISO 8601 (inclusive).
+            - created_before: Fecha o fecha y hora ISO 8601 (exclusive).
+            - limit: Pedidos por página (tope ORDERS_LIST_MAX_LIMIT).
+            - cursor: Valor next_cursor de la página anterior.
+    
+    Returns:
+        Response: JSON con la página.
+            - orders (list[dict]): Pedidos (mismos campos que order_status).
+            - next_cursor (str|None): Cursor de la página siguiente, o
+              None si es la última.
+    
+    Raises:
+        400 Bad Request: Si algún parámetro es inválido.
+        403 Forbidden: Si el usuario no es staff.
+    """
+    pedidos = Order.objects.all()
+    
+    estado = request.GET.get('status')
+    if estado:
+        if estado not in Order.TRANSICIONES:
+            return Response({'error': f'status inválido: {estado}'}, status=status.HTTP_400_BAD_REQUEST)
+        pedidos = pedidos.filter(status=estado)
+    
+    for parametro, lookup in (('created_after', 'created_at__gte'), ('created_before', 'created_at__lt')):
+        valor = request.GET.get(parametro)
+        if valor:
+            fecha = _parsear_fecha(valor)
+            if fecha is None:
+                return Response({'error': f'{parametro} inválido: {valor}'}, status=status.HTTP_400_BAD_REQUEST)
+            pedidos = pedidos.filter(**{lookup: fecha})
+    
+    try:
+        limite = int(request.GET.get('limit', settings.ORDERS_LIST_LIMIT))
+    except ValueError:
+        return Response({'error': 'limit debe ser un número'}, status=status.HTTP_400_BAD_REQUEST)
+    limite = max(1, min(limite, settings.ORDERS_LIST_MAX_LIMIT))
+    
+    cursor = request.GET.get('cursor')
+    if cursor:
+        try:
+            creado, ultimo_id = _decodificar_cursor(cursor)
+        except ValueError:
+            return Response({'error': 'cursor inválido'}, status=status.HTTP_400_BAD_REQUEST)
+        # created_at <= cursor es redundante, pero es el límite de rango que
+        # PostgreSQL puede usar en el índice; el OR solo no lo es
+        pedidos = pedidos.filter(
+            Q(created_at__lt=creado) | Q(created_at=creado, id__lt=ultimo_id),
+            created_at__lte=creado,
+        )
+    
+    # Una fila de más indica si hay página siguiente
+    filas = list(pedidos.order_by('-created_at', '-id').values(*CAMPOS_PEDIDO)[:limite + 1])
+    siguiente = None
+    if len(filas) > limite:
+        filas = filas[:limite]
+        siguiente = _codificar_cursor(filas[-1]['created_at'], filas[-1]['id'])
+    
+    return Response({
+        'orders': [fila_a_dict(fila) for fila in filas],
+        'next_cursor': siguiente,
+    })
+
+
+def _parsear_fecha(valor):
+    """Convierte una fecha o fecha y hora ISO 8601 en datetime con zona horaria."""
+    try:
+        fecha = parse_datetime(valor)
+        if fecha is None:
+            dia = parse_date(valor)
+            if dia is None:
+                return None
+            fecha = datetime.combine(dia, dt_time.min)
+    except ValueError:
+        return None
+    if timezone.is_naive(fecha):
+        fecha = timezone.make_aware(fecha)
+    return fecha
+
+
+def _codificar_cursor(creado, order_id):
+    valor = f"{creado.isoformat()}|{order_id}"
+    return base64.urlsafe_b64encode(valor.encode('utf-8')).decode('ascii')
+
+
+def _decodificar_cursor(cursor):
+    """
+    Devuelve (created_at, id) de un cursor.
+    
+    Raises:
+        ValueError: Si el cursor no es válido.
+    """
+    try:
+        valor = base64.urlsafe_b64decode(cursor.encode('ascii')).decode('utf-8')
+    except (UnicodeError, binascii.Error):
+        raise ValueError('cursor inválido')
+    creado, _, order_id = valor.partition('|')
+    fecha = parse_datetime(creado)
+    if fecha is None:
+        raise ValueError('cursor inválido')
+    return fecha, uuid.UUID(order_id)
+
+
 @api_view(['GET'])
 def order_status(request, order_id):
     """
     Consulta el estado actual de un pedido existente.
     
+    Los datos se leen a través de la caché de pedidos (orders/cache.py),
+    que se invalida con cada cambio de estado o de payment_link.
+    
+    Responde con ETag (la version del pedido) y Last-Modified; si el
+    cliente envía If-None-Match o If-Modified-Since y el pedido no cambió
+    responde 304 sin cuerpo.
+    
     Args:
         request (HttpRequest): Objeto de solicitud HTTP.
         order_id (UUID): ID único del pedido a consultar.
@@ -206,22 +478,220 @@ def order_status(request, order_id):
             - status (str): Estado actual (PENDING/PAID/FAILED).
             - payment_link (str): URL de pago (si existe).
             - created_at (datetime): Fecha de creación.
+            - updated_at (datetime): Fecha del último cambio.
+            - version (int): Se incrementa con cada cambio.
     
     Raises:
         404 Not Found: Si el pedido no existe.
     """
-    try:
-        order = Order.objects.get(id=order_id)
-        return Response({
-            'id': str(order.id),
-            'product_name': order.product_name,
-            'amount': str(order.amount),
-            'status': order.status,
-            'payment_link': order.payment_link,
-            'created_at': order.created_at
-        })
-    except Order.DoesNotExist:
+    pedido = obtener_pedido(order_id)
+    if pedido is None:
         return Response({'error': 'Pedido no encontrado'}, status=404)
+    
+    # Con la caché caliente un 304 no consulta la base
+    return _respuesta_condicional(request, pedido, Response)
+
+
+def _respuesta_condicional(request, pedido, clase_respuesta):
+    """Responde 304 si el cliente ya tiene esta versión del pedido; si no, el JSON."""
+    etag = f'"{pedido["version"]}"'
+    ultima_modificacion = int(pedido['updated_at'].timestamp())
+    response = get_conditional_response(request, etag=etag, last_modified=ultima_modificacion)
+    if response is None:
+        response = clase_respuesta(pedido)
+    response['ETag'] = etag
+    response['Last-Modified'] = http_date(ultima_modificacion)
+    response['Cache-Control'] = 'no-cache'
+    return response
+
+
+@api_view(['POST'])
+def orders_status_batch(request):
+    """
+    Consulta el estado de varios pedidos en una sola solicitud.
+    
+    Pensado para refrescar el historial de pedidos del storefront: los
+    pedidos se leen de la caché y los que faltan con una única consulta
+    ``id__in`` proyectada con ``.values()``.
+    
+    Args:
+        request (HttpRequest): Objeto de solicitud HTTP con datos JSON.
+            Debe contener:
+            - ids (list[str]): IDs de los pedidos (máximo ORDERS_STATUS_BATCH_MAX).
+    
+    Returns:
+        Response: JSON con los pedidos encontrados.
+            - orders (list[dict]): Pedidos con id, product_name, amount,
+              status, payment_link, created_at, updated_at y version.
+            - not_found (list[str]): IDs inexistentes o inválidos.
+        
+        Incluye un ETag calculado con el id y la version de cada pedido;
+        si coincide con el header If-None-Match responde 304 sin cuerpo.
+    
+    Raises:
+        400 Bad Request: Si ids no es una lista o supera el máximo.
+    """
+    ids = request.data.get('ids')
+    
+    if not isinstance(ids, list):
+        return Response({'error': 'ids debe ser una lista'}, status=status.HTTP_400_BAD_REQUEST)
+    
+    if len(ids) > settings.ORDERS_STATUS_BATCH_MAX:
+        return Response(
+            {'error': f'Máximo {settings.ORDERS_STATUS_BATCH_MAX} pedidos por consulta'},
+            status=status.HTTP_400_BAD_REQUEST
+        )
+    
+    uuids = set()
+    not_found = []
+    for order_id in ids:
+        try:
+            uuids.add(uuid.UUID(str(order_id)))
+        except ValueError:
+            not_found.append(str(order_id))
+    
+    pedidos = obtener_pedidos(uuids)
+    
+    orders = list(pedidos.values())
+    not_found.extend(str(order_uuid) for order_uuid in uuids if str(order_uuid) not in pedidos)
+    
+    etag = _etag_lote(orders, not_found)
+    encabezados = {'ETag': etag, 'Cache-Control': 'no-cache'}
+    if _coincide_etag(request, etag):
+        return Response(status=status.HTTP_304_NOT_MODIFIED, headers=encabezados)
+    
+    return Response({'orders': orders, 'not_found': not_found}, headers=encabezados)
+
+
+def _coincide_etag(request, etag):
+    """Comparación débil de If-None-Match (el 304 automático de Django solo aplica a GET)."""
+    etags = parse_etags(request.META.get('HTTP_IF_NONE_MATCH', ''))
+    return '*' in etags or etag in (valor.removeprefix('W/') for valor in etags)
+
+
+def _etag_lote(orders, not_found):
+    """ETag de una consulta por lote: cambia si cambia cualquiera de los pedidos."""
+    partes = sorted(f"{pedido['id']}:{pedido['version']}" for pedido in orders)
+    partes.extend(sorted(not_found))
+    return '"%s"' % hashlib.sha1(','.join(partes).encode('utf-8')).hexdigest()
+
+
+@api_view(['GET'])
+def order_wait(request, order_id):
+    """
+    Espera (long-poll) a que cambie el estado de un pedido.
+    
+    La solicitud queda abierta hasta que el pedido cambia o vence el
+    timeout. No consulta la base periódicamente: se despierta con la
+    señal order_changed (y con LISTEN/NOTIFY si la base es PostgreSQL).
+    
+    Args:
+        request (HttpRequest): Objeto de solicitud HTTP.
+            Parámetros GET opcionales:
+            - status: Estado que ya conoce el cliente.
+            - link: '0' si el cliente espera que aparezca el payment_link.
+            - timeout: Segundos máximos de espera (tope ORDERS_WAIT_TIMEOUT).
+        order_id (UUID): ID del pedido.
+    
+    Returns:
+        Response: JSON con los datos del pedido (como order_status) y
+            changed (bool): False si venció el timeout sin cambios.
+    
+    Raises:
+        404 Not Found: Si el pedido no existe.
+    """
+    estado_conocido = request.GET.get('status')
+    espera_link = request.GET.get('link') == '0'
+    try:
+        timeout = min(float(request.GET.get('timeout', settings.ORDERS_WAIT_TIMEOUT)), settings.ORDERS_WAIT_TIMEOUT)
+    except ValueError:
+        timeout = settings.ORDERS_WAIT_TIMEOUT
+    
+    limite = time.monotonic() + timeout
+    suscripcion = broker.suscribir(order_id)
+    try:
+        while True:
+            suscripcion.limpiar()
+            fila = Order.objects.filter(id=order_id).values(*CAMPOS_PEDIDO).first()
+            if fila is None:
+                return Response({'error': 'Pedido no encontrado'}, status=404)
+            
+            cambio = (
+                estado_conocido is None
+                or fila['status'] != estado_conocido
+                or (espera_link and fila['payment_link'])
+            )
+            restante = limite - time.monotonic()
+            if cambio or restante <= 0:
+                return Response(dict(fila_a_dict(fila), changed=bool(cambio)))
+            
+            suscripcion.esperar(restante)
+    finally:
+        suscripcion.cancelar()
+
+
+async def order_events(request, order_id):
+    """
+    Envía los cambios de un pedido como Server-Sent Events.
+    
+    Vista asíncrona pensada para correr bajo ASGI (dononofre/asgi.py):
+    mientras espera no ocupa ningún thread. Emite un evento ``order`` cada
+    vez que cambia el estado o el payment_link y cierra el flujo cuando el
+    pedido llega a un estado final o pasa ORDERS_SSE_MAX_DURATION.
+    
+    Args:
+        request (HttpRequest): Objeto de solicitud HTTP.
+            Parámetro GET opcional:
+            - status: Estado que ya conoce el cliente (no se reenvía).
+        order_id (UUID): ID del pedido.
+    
+    Returns:
+        StreamingHttpResponse: Flujo text/event-stream.
+    
+    Raises:
+        404 Not Found: Si el pedido no existe.
+    """
+    if not await Order.objects.filter(id=order_id).aexists():
+        return RespuestaJSON({'error': 'Pedido no encontrado'}, status=404)
+    
+    response = StreamingHttpResponse(
+        _flujo_eventos(order_id, request.GET.get('status')),
+        content_type='text/event-stream'
+    )
+    response['Cache-Control'] = 'no-cache'
+    response['X-Accel-Buffering'] = 'no'
+    return response
+
+
+async def _flujo_eventos(order_id, estado_conocido):
+    """Generador SSE de order_events."""
+    loop = asyncio.get_running_loop()
+    limite = loop.time() + settings.ORDERS_SSE_MAX_DURATION
+    ultimo = (estado_conocido, None)
+    suscripcion = broker.suscribir(order_id, asincrona=True)
+    try:
+        while True:
+            suscripcion.limpiar()
+            fila = await Order.objects.filter(id=order_id).values(*CAMPOS_PEDIDO).afirst()
+            if fila is None:
+                return
+            
+            actual = (fila['status'], fila['payment_link'])
+            if actual != ultimo:
+                ultimo = actual
+                datos = dumps(fila_a_dict(fila)).decode('utf-8')
+                yield f"event: order\ndata: {datos}\n\n"
+                if Order.es_final(fila['status']):
+                    return
+            
+            restante = limite - loop.time()
+            if restante <= 0:
+                return
+            if not await suscripcion.aesperar(min(15, restante)):
+                # Mantener viva la conexión a través de proxies
+                yield ": keep-alive\n\n"
+    finally:
+        suscripcion.cancelar()
 
 
 @api_view(['POST'])
@@ -242,23 +712,32 @@ def adams_callback(request):
             - order_id (str): ID del pedido actualizado.
             - status (str): Nuevo estado del pedido.
             - message (str): Mensaje descriptivo.
+        
+        Con ADAMSPAY_WEBHOOK_QUEUE=True solo guarda el evento y responde
+        ok con el event_id, sin consultar el pedido.
     
     Raises:
         500 Internal Server Error: Si ocurre un error al procesar.
     """
     try:
-        print("Webhook AdamsPay recibido")
-        print(f"Datos: {request.data}")
+        logger_payloads.info("Webhook AdamsPay: %s", request.data)
         
         # Validar HMAC si hay secreto
         if ADAMSPAY_APP_SECRET:
             pass  # Implementar validación HMAC aquí
         
+        # Cola de webhooks: guardar el payload y responder de inmediato;
+        # el comando procesar_webhooks aplica los cambios por lotes
+        if settings.ADAMSPAY_WEBHOOK_QUEUE:
+            if huella_vista(calcular_huella(request.data)):
+                return _respuesta_duplicada(extraer_order_id(request.data))
+            evento = encolar_evento(request.data)
+            return Response({'ok': True, 'event_id': evento.id, 'message': 'Notificación encolada'})
+        
         return procesar_notificacion_adams(request.data)
             
     except Exception as e:
-        print(f"Error en webhook: {str(e)}")
-        print(traceback.format_exc())
+        logger.exception("Error en webhook: %s", e)
         return Response({'error': str(e)}, status=500)
 
 
@@ -286,8 +765,7 @@ def adams_redirect(request):
         400 Bad Request: Si no se proporciona el ID del pedido.
     """
     try:
-        print("Redirect AdamsPay recibido")
-        print(f"Parámetros: {dict(request.GET)}")
+        logger_payloads.info("Redirect AdamsPay: %s", request.GET)
         
         order_id = request.GET.get('order_id') or request.GET.get('externalId')
         status_param = request.GET.get('status', '').lower()
@@ -316,28 +794,35 @@ def adams_redirect(request):
         # Redirigir a página de resultado
         try:
             order = Order.objects.get(id=order_id)
-            return render(request, 'payment_result.html', {
-                'order': order,
-                'status': order.status
-            })
+            return respuesta_resultado(order=order)
         except Order.DoesNotExist:
-            return render(request, 'payment_result.html', {
-                'error': f'Pedido {order_id} no encontrado'
-            })
+            return respuesta_resultado(error=f'Pedido {order_id} no encontrado')
             
     except Exception as e:
-        print(f"Error en redirect: {str(e)}")
-        return render(request, 'payment_result.html', {
-            'error': str(e)
-        })
+        logger.exception("Error en redirect: %s", e)
+        return respuesta_resultado(error=str(e))
 
 
 def procesar_notificacion_adams(datos):
     """
     Procesa notificaciones de AdamsPay y actualiza el estado del pedido.
     
+    Ver ``aplicar_notificacion``.
+    
+    Returns:
+        Response: JSON con resultado del procesamiento.
+    """
+    datos_respuesta, codigo = aplicar_notificacion(datos)
+    return Response(datos_respuesta, status=codigo)
+
+
+def aplicar_notificacion(datos):
+    """
+    Procesa notificaciones de AdamsPay y actualiza el estado del pedido.
+    
     Función auxiliar que extrae y procesa los datos de notificación
     de AdamsPay para actualizar el estado del pedido correspondiente.
+    Es síncrona; las vistas asíncronas la llaman con ``sync_to_async``.
     
     Args:
         datos (dict|str): Datos de notificación en formato JSON o dict.
@@ -347,123 +832,253 @@ def procesar_notificacion_adams(datos):
             - debt.payStatus.status: Estado del pago en estructura anidada.
     
     Returns:
-        Response: JSON con resultado del procesamiento.
+        tuple: (datos de la respuesta, código HTTP). Los datos incluyen:
             - ok (bool): True si se procesó correctamente.
             - order_id (str): ID del pedido procesado.
-            - status (str): Nuevo estado del pedido.
-            - previous_status (str): Estado anterior (siempre PENDING).
+            - status (str): Estado del pedido tras procesar la notificación.
+            - previous_status (str): Estado anterior.
+            - applied (bool): True si la transición se aplicó.
             - message (str): Mensaje descriptivo.
     
-    Raises:
-        400 Bad Request: Si no se puede extraer el ID del pedido.
-        404 Not Found: Si el pedido no existe en la base de datos.
-        500 Internal Server Error: Si ocurre un error inesperado.
+        Códigos: 400 si no se puede extraer el ID del pedido, 404 si el
+        pedido no existe y 500 ante un error inesperado.
     """
     try:
-        print("Procesando notificación AdamsPay")
-        print(f"Datos recibidos: {datos}")
-        
-        # Para debugging
-        import json
-        print(f"Datos como JSON: {json.dumps(datos) if isinstance(datos, dict) else datos}")
+        logger_payloads.info("Notificación AdamsPay: %s", datos)
         
         # Extraer ID del pedido
-        order_id = None
-        
-        if isinstance(datos, dict):
-            if 'externalId' in datos:
-                order_id = datos['externalId']
-            elif 'debt' in datos and 'docId' in datos['debt']:
-                order_id = datos['debt']['docId']
-            elif 'id' in datos:
-                order_id = datos['id']
-            elif 'order_id' in datos:
-                order_id = datos['order_id']
-        elif isinstance(datos, str):
-            try:
-                datos_parseados = json.loads(datos)
-                if 'externalId' in datos_parseados:
-                    order_id = datos_parseados['externalId']
-                elif 'debt' in datos_parseados and 'docId' in datos_parseados['debt']:
-                    order_id = datos_parseados['debt']['docId']
-            except:
-                pass
-        
-        print(f"ID extraído: {order_id}")
+        order_id = extraer_order_id(datos)
         
         if not order_id:
-            print("ID no encontrado en los datos")
-            return Response({'error': 'ID no encontrado'}, status=400)
+            logger.warning("Notificación sin ID de pedido")
+            return {'error': 'ID no encontrado'}, 400
         
         try:
             # Limpiar y validar UUID
             try:
                 order_uuid = uuid.UUID(str(order_id))
             except ValueError:
-                print(f"ID no es un UUID válido: {order_id}")
-                return Response({'error': 'UUID inválido'}, status=400)
+                logger.warning("ID no es un UUID válido: %s", order_id)
+                return {'error': 'UUID inválido'}, 400
             
-            order = Order.objects.get(id=order_uuid)
-            print(f"Pedido encontrado: {order.id}")
-            print(f"Estado actual del pedido: {order.status}")
+            # Pedidos que ya sabemos que no existen: tiempo constante
+            if pedido_desconocido(order_uuid):
+                return {'error': 'Pedido no encontrado'}, 404
             
-            # Determinar nuevo estado
-            nuevo_estado = 'PENDING'
+            # Descartar reintentos antes de consultar el pedido
+            huella = calcular_huella(datos)
+            if huella_vista(huella):
+                logger.info("Notificación duplicada ignorada: %s", order_id, extra={'order_id': str(order_id)})
+                return _datos_duplicada(order_id)
             
-            # Mapeo de estados
-            if isinstance(datos, dict):
-                estado_datos = str(datos.get('status', '')).lower()
+            with transaction.atomic():
+                if not registrar_huella(huella):
+                    logger.info("Notificación duplicada ignorada: %s", order_id, extra={'order_id': str(order_id)})
+                    return _datos_duplicada(order_id)
                 
-                # Verificar en diferentes ubicaciones posibles
-                if estado_datos in ['paid', 'approved', 'completed', 'confirmed']:
-                    nuevo_estado = 'PAID'
-                elif estado_datos in ['failed', 'rejected', 'expired', 'cancelled']:
-                    nuevo_estado = 'FAILED'
-                elif estado_datos == 'pending':
-                    nuevo_estado = 'PENDING'
+                # Determinar nuevo estado
+                nuevo_estado = determinar_estado(datos)
                 
-                # También verificar en debt.payStatus.status
-                if 'debt' in datos and 'payStatus' in datos['debt']:
-                    pay_status = datos['debt']['payStatus'].get('status', '').lower()
-                    if pay_status in ['paid', 'approved']:
-                        nuevo_estado = 'PAID'
-                    elif pay_status in ['failed', 'rejected']:
-                        nuevo_estado = 'FAILED'
-            
-            print(f"Nuevo estado a asignar: {nuevo_estado}")
-            
-            # Actualizar si cambió
-            if order.status != nuevo_estado:
-                order.status = nuevo_estado
-                order.save()
-                print(f"Estado actualizado a: {nuevo_estado}")
+                # Transición condicional en un solo UPDATE: la cantidad de
+                # filas indica si se aplicó
+                aplicada = Order.objects.filter(id=order_uuid).transicionar(nuevo_estado)
                 
-                # Log para auditoría
-                print(f"Auditoría - Pedido {order.id}: {order.status} -> {nuevo_estado}")
-            else:
-                print(f"ℹEstado ya era: {nuevo_estado}")
+                if aplicada:
+                    estado_actual = nuevo_estado
+                    notificar_cambio([order_uuid], nuevo_estado)
+                    
+                    # Log para auditoría
+                    logger.info("Pedido %s: PENDING -> %s", order_uuid, nuevo_estado,
+                                extra={'order_id': str(order_uuid), 'status': nuevo_estado})
+                else:
+                    estado_actual = (
+                        Order.objects.filter(id=order_uuid)
+                        .values_list('status', flat=True)
+                        .first()
+                    )
+                    if estado_actual is None:
+                        raise Order.DoesNotExist
+                    logger.info("Transición a %s no aplicada: estado actual %s", nuevo_estado, estado_actual,
+                                extra={'order_id': str(order_uuid), 'status': estado_actual})
             
-            return Response({
+            return {
                 'ok': True,
                 'order_id': str(order_id),
-                'status': order.status,
-                'previous_status': 'PENDING',  # Para comparación
-                'message': f'Estado actualizado a {order.status}'
-            }, status=200)
+                'status': estado_actual,
+                'previous_status': 'PENDING' if aplicada else estado_actual,
+                'applied': bool(aplicada),
+                'message': f'Estado actualizado a {estado_actual}'
+            }, 200
             
         except Order.DoesNotExist:
-            print(f"Pedido no existe en BD: {order_id}")
+            logger.warning("Pedido no existe en BD: %s", order_id)
+            marcar_pedido_desconocido(order_uuid)
+            return {'error': 'Pedido no encontrado'}, 404
             
-            # Listar todos los pedidos para debugging
-            all_orders = Order.objects.all()
-            print(f"Pedidos en BD: {[str(o.id) for o in all_orders]}")
+    except Exception as e:
+        logger.exception("Error procesando notificación: %s", e)
+        return {'error': str(e)}, 500
+
+
+# Vistas asíncronas (ASGI)
+#
+# Con ORDERS_ASYNC_VIEWS=True (ver orders/urls.py) reemplazan a create_order,
+# order_status y adams_callback. No usan DRF (@api_view es síncrono): leen
+# el JSON a mano y responden con RespuestaJSON. Mientras esperan a AdamsPay,
+# a la caché o a la base no ocupan ningún thread del worker.
+
+
+@csrf_exempt
+async def acreate_order(request):
+    """
+    Versión asíncrona de create_order.
+    
+    El pedido se crea con el ORM asíncrono y la deuda se registra con el
+    cliente httpx de AdamsPay. En modo outbox delega en el código síncrono.
+    
+    Args:
+        request (HttpRequest): Igual que create_order.
+    
+    Returns:
+        RespuestaJSON: Mismos datos, códigos e Idempotency-Key que create_order.
+    """
+    if request.method != 'POST':
+        return RespuestaJSON({'detail': f'Método "{request.method}" no permitido.'}, status=405)
+    
+    try:
+        datos = _leer_datos(request)
+        logger_payloads.info("Creación de pedido: %s", datos)
+        product_name = datos.get('product_name')
+        amount = datos.get('amount')
+        
+        if not product_name or not amount:
+            return RespuestaJSON(
+                {'error': 'product_name y amount son obligatorios'},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        
+        async def crear():
+            if settings.ADAMSPAY_OUTBOX and not modo_simulacion():
+                # El pedido y su registro pendiente necesitan una transacción
+                respuesta = await sync_to_async(_crear_pedido)(product_name, amount)
+                return respuesta.data, respuesta.status_code
             
-            return Response({'error': 'Pedido no encontrado'}, status=404)
+            order = await Order.objects.acreate(
+                product_name=product_name,
+                amount=amount,
+                status='PENDING',
+                expires_at=timezone.now() + timedelta(hours=settings.ORDERS_VALID_HOURS)
+            )
+            logger.info("Pedido creado: %s", order.id, extra={'order_id': str(order.id)})
             
+            resultado = await aregistrar_deuda(order)
+            await aguardar_pedido(order)
+            return _datos_pedido_registrado(order, resultado), status.HTTP_200_OK
+        
+        clave = request.headers.get('Idempotency-Key')
+        if clave is None:
+            datos_respuesta, codigo = await crear()
+            return RespuestaJSON(datos_respuesta, status=codigo)
+        
+        try:
+            datos_respuesta, codigo, repetida = await aejecutar(clave, 'create_order', datos, crear)
+        except ErrorIdempotencia as e:
+            return _respuesta_idempotencia(e, RespuestaJSON)
+        return _marcar_repetida(RespuestaJSON(datos_respuesta, status=codigo), repetida)
+        
+    except ValueError:
+        return RespuestaJSON({'error': 'JSON inválido'}, status=status.HTTP_400_BAD_REQUEST)
     except Exception as e:
-        print(f"Error procesando notificación: {str(e)}")
-        print(f"Traceback: {traceback.format_exc()}")
-        return Response({'error': str(e)}, status=500)
+        logger.exception("Error al crear pedido: %s", e)
+        return RespuestaJSON({'error': str(e)}, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
+
+
+async def aorder_status(request, order_id):
+    """
+    Versión asíncrona de order_status (caché y ORM asíncronos).
+    
+    Args:
+        request (HttpRequest): Objeto de solicitud HTTP.
+        order_id (UUID): ID único del pedido a consultar.
+    
+    Returns:
+        RespuestaJSON: Mismos datos, ETag y 304 que order_status.
+    """
+    if request.method not in ('GET', 'HEAD'):
+        return RespuestaJSON({'detail': f'Método "{request.method}" no permitido.'}, status=405)
+    
+    pedido = await aobtener_pedido(order_id)
+    if pedido is None:
+        return RespuestaJSON({'error': 'Pedido no encontrado'}, status=404)
+    return _respuesta_condicional(request, pedido, RespuestaJSON)
+
+
+@csrf_exempt
+async def aadams_callback(request):
+    """
+    Versión asíncrona de adams_callback.
+    
+    En modo cola (ADAMSPAY_WEBHOOK_QUEUE) guarda el evento con el ORM
+    asíncrono; si no, aplica la notificación con ``aplicar_notificacion``
+    (necesita una transacción, por eso corre con ``sync_to_async``).
+    
+    Args:
+        request (HttpRequest): Notificación de AdamsPay (JSON o formulario).
+    
+    Returns:
+        RespuestaJSON: Mismos datos y códigos que adams_callback.
+    """
+    if request.method != 'POST':
+        return RespuestaJSON({'detail': f'Método "{request.method}" no permitido.'}, status=405)
+    
+    try:
+        datos = _leer_datos(request)
+        logger_payloads.info("Webhook AdamsPay: %s", datos)
+        
+        if settings.ADAMSPAY_WEBHOOK_QUEUE:
+            if huella_vista(calcular_huella(datos)):
+                datos_respuesta, codigo = _datos_duplicada(extraer_order_id(datos))
+                return RespuestaJSON(datos_respuesta, status=codigo)
+            evento = await aencolar_evento(datos)
+            return RespuestaJSON({'ok': True, 'event_id': evento.id, 'message': 'Notificación encolada'})
+        
+        datos_respuesta, codigo = await sync_to_async(aplicar_notificacion)(datos)
+        return RespuestaJSON(datos_respuesta, status=codigo)
+        
+    except ValueError:
+        return RespuestaJSON({'error': 'JSON inválido'}, status=status.HTTP_400_BAD_REQUEST)
+    except Exception as e:
+        logger.exception("Error en webhook: %s", e)
+        return RespuestaJSON({'error': str(e)}, status=500)
+
+
+def _leer_datos(request):
+    """
+    Lee el cuerpo de una solicitud JSON o de formulario como dict.
+    
+    Raises:
+        ValueError: Si el JSON es inválido o no es un objeto.
+    """
+    if request.content_type == 'application/json':
+        datos = loads(request.body or b'{}')
+        if not isinstance(datos, dict):
+            raise ValueError('Se esperaba un objeto JSON')
+        return datos
+    return request.POST.dict()
+
+
+def _respuesta_duplicada(order_id):
+    """Respuesta para una notificación que ya fue aplicada."""
+    return Response(*_datos_duplicada(order_id))
+
+
+def _datos_duplicada(order_id):
+    return {
+        'ok': True,
+        'order_id': str(order_id),
+        'duplicate': True,
+        'message': 'Notificación duplicada ignorada'
+    }, 200
 
 
 def payment_result(request):
@@ -476,18 +1091,42 @@ def payment_result(request):
             - order_id: ID del pedido a mostrar.
     
     Returns:
-        HttpResponse: Renderiza payment_result.html con:
-            - order (Order): Objeto del pedido (si existe).
-            - error (str): Mensaje de error (si el pedido no existe).
+        HttpResponse: payment_result.html con el detalle del pedido (leído
+            de la caché de pedidos) o un mensaje si no existe.
     """
     order_id = request.GET.get('order_id')
     if order_id:
         try:
-            order = Order.objects.get(id=order_id)
-            return render(request, 'payment_result.html', {'order': order})
-        except Order.DoesNotExist:
-            pass
-    return render(request, 'payment_result.html', {'error': 'No se encontró el pedido'})
+            order = obtener_pedido(uuid.UUID(order_id))
+        except ValueError:
+            order = None
+        if order is not None:
+            return respuesta_resultado(order=order)
+    return respuesta_resultado(error='No se encontró el pedido')
+
+
+def metrics(request):
+    """
+    Métricas en formato de texto de Prometheus (GET /metrics).
+    
+    Con PROMETHEUS_MULTIPROC_DIR suma los valores de todos los workers de
+    gunicorn. Exige ``Authorization: Bearer <token>`` con METRICS_TOKEN;
+    sin token configurado solo responde con DEBUG (en producción, 404).
+    
+    Args:
+        request (HttpRequest): Objeto de solicitud HTTP.
+    
+    Returns:
+        HttpResponse: Métricas (text/plain), 401 si el token no coincide o
+            404 si no hay token en producción.
+    """
+    token = settings.METRICS_TOKEN
+    if not token and not settings.DEBUG:
+        return HttpResponse(status=404)
+    if token and not hmac.compare_digest(request.headers.get('Authorization', ''), f'Bearer {token}'):
+        return HttpResponse(status=401)
+    contenido, content_type = exportar()
+    return HttpResponse(contenido, content_type=content_type)
 
 
 @api_view(['GET'])
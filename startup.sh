@@ -15,36 +15,18 @@ if [ -d "venv" ]; then
     echo "Entorno virtual activado"
 fi
 
-# 1. Aplicar migraciones - ¡CRÍTICO!
+# 1. Preparar la base (advisory lock + migraciones, una sola vez) - ¡CRÍTICO!
 echo ""
-echo "Aplicando migraciones..."
-python manage.py makemigrations --noinput
-python manage.py migrate --noinput
-echo "Migraciones aplicadas"
+echo "Preflight de la base de datos..."
+python manage.py preflight || exit 1
 
-# 2. Verificar tablas creadas
-echo ""
-echo "Verificando tablas en la base de datos..."
-python manage.py shell -c "
-from django.db import connection
-try:
-    with connection.cursor() as cursor:
-        cursor.execute(\"SELECT table_name FROM information_schema.tables WHERE table_schema='public' ORDER BY table_name\")
-        tables = cursor.fetchall()
-        print(f'✓ Total de tablas: {len(tables)}')
-        for table in tables:
-            print(f'  - {table[0]}')
-except Exception as e:
-    print(f'Error al verificar tablas: {e}')
-"
-
-# 3. Recopilar archivos estáticos
+# 2. Recopilar archivos estáticos
 echo ""
 echo "Recopilando archivos estáticos..."
 python manage.py collectstatic --noinput --clear
 echo "Archivos estáticos recopilados"
 
-# 4. Verificar si el directorio staticfiles existe
+# 3. Verificar si el directorio staticfiles existe
 echo ""
 echo "Verificando directorio staticfiles..."
 if [ -d "staticfiles" ]; then
@@ -55,15 +37,16 @@ else
     mkdir -p staticfiles
 fi
 
-# 5. Iniciar servidor
+# 4. Iniciar servidor
 echo ""
+# Métricas de todos los workers (/metrics): un directorio vacío en cada arranque
+export PROMETHEUS_MULTIPROC_DIR=${PROMETHEUS_MULTIPROC_DIR:-/tmp/dononofre-metricas}
+rm -rf "$PROMETHEUS_MULTIPROC_DIR"
+mkdir -p "$PROMETHEUS_MULTIPROC_DIR"
+
 echo "Iniciando Servidor Gunicorn..."
 echo "URL: http://0.0.0.0:$PORT"
+echo "Perfil: ${SERVER_PROFILE:-io}"
 echo "========================================="
-exec gunicorn dononofre.wsgi:application \
-    --bind 0.0.0.0:$PORT \
-    --workers 1 \
-    --threads 2 \
-    --timeout 120 \
-    --access-logfile - \
-    --error-logfile -
\ No newline at end of file
+# Workers, threads y clase de worker según SERVER_PROFILE (ver gunicorn.conf.py)
+exec gunicorn -c gunicorn.conf.py
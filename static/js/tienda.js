@@ -0,0 +1,1001 @@
+// tienda.js - Catálogo, carrito y checkout de la página principal
+
+// Estado global
+let currentOrderId = null;
+let cartItems = [];
+let ordersHistory = [];
+
+// Función para formatear precios al estilo GS
+function formatPricePY(price) {
+    // Si el precio ya es una cadena formateada, extraiga el número
+    if (typeof price === 'string') {
+        const numStr = price.replace(/[^\d]/g, '');
+        price = parseFloat(numStr);
+    }
+    
+    const numValue = typeof price === 'number' ? price : parseFloat(price);
+    const integerValue = Math.round(numValue);
+    
+    // Formatear parte entera con puntos de miles
+    const integerStr = integerValue.toString();
+    let formattedPrice = '';
+    const len = integerStr.length;
+    
+    for (let i = 0; i < len; i++) {
+        const digit = integerStr[len - 1 - i];
+        formattedPrice = digit + formattedPrice;
+        if ((i + 1) % 3 === 0 && i !== len - 1) {
+            formattedPrice = '.' + formattedPrice;
+        }
+    }
+    
+    return formattedPrice;
+}
+
+// Función para filtrar productos
+function filterProducts(category) {
+    const products = document.querySelectorAll('.product-card');
+    const buttons = document.querySelectorAll('.category-btn:not(#orders-history-btn)');
+    
+    // Actualizar botones activos
+    buttons.forEach(btn => {
+        btn.classList.remove('active');
+        const btnText = btn.textContent.toLowerCase();
+        if (category === 'all' && btnText.includes('todos')) {
+            btn.classList.add('active');
+        } else if (btnText.includes(category)) {
+            btn.classList.add('active');
+        }
+    });
+    
+    // Ocultar sección de historial si está visible
+    const orderHistorySection = document.getElementById('order-history');
+    const ordersBtn = document.getElementById('orders-history-btn');
+    if (orderHistorySection.style.display === 'block') {
+        orderHistorySection.style.display = 'none';
+        ordersBtn.classList.remove('active');
+    }
+    
+    // Mostrar productos
+    document.querySelector('.products').style.display = 'block';
+    
+    // Mostrar/ocultar productos
+    products.forEach(product => {
+        const productCategories = product.dataset.category.split(' ');
+        
+        if (category === 'all' || productCategories.includes(category)) {
+            product.style.display = 'block';
+            setTimeout(() => {
+                product.style.opacity = '1';
+                product.style.transform = 'translateY(0)';
+            }, 100);
+        } else {
+            product.style.opacity = '0';
+            product.style.transform = 'translateY(20px)';
+            setTimeout(() => {
+                product.style.display = 'none';
+            }, 300);
+        }
+    });
+}
+
+// Función para alternar entre productos e historial
+function toggleOrdersHistory() {
+    const productsSection = document.querySelector('.products');
+    const orderHistorySection = document.getElementById('order-history');
+    const ordersBtn = document.getElementById('orders-history-btn');
+    const categoryBtns = document.querySelectorAll('.category-btn:not(#orders-history-btn)');
+    
+    if (orderHistorySection.style.display === 'none' || !orderHistorySection.style.display) {
+        // Mostrar historial
+        productsSection.style.display = 'none';
+        orderHistorySection.style.display = 'block';
+        ordersBtn.classList.add('active');
+        categoryBtns.forEach(btn => btn.classList.remove('active'));
+        
+        // Cargar pedidos y refrescar sus estados
+        loadOrdersHistory();
+        refreshOrdersHistory();
+    } else {
+        // Mostrar productos
+        productsSection.style.display = 'block';
+        orderHistorySection.style.display = 'none';
+        ordersBtn.classList.remove('active');
+        filterProducts('all');
+    }
+}
+
+// Función para cargar el historial de pedidos
+function loadOrdersHistory() {
+    const ordersTableBody = document.getElementById('orders-table-body');
+    const ordersEmpty = document.getElementById('orders-empty');
+    
+    // Cargar historial desde localStorage
+    loadOrdersFromLocalStorage();
+    
+    // Limpiar tabla
+    ordersTableBody.innerHTML = '';
+    
+    if (ordersHistory.length === 0) {
+        ordersEmpty.style.display = 'block';
+        return;
+    }
+    
+    ordersEmpty.style.display = 'none';
+    
+    // Ordenar por fecha
+    const sortedOrders = [...ordersHistory].sort((a, b) => 
+        new Date(b.created_at) - new Date(a.created_at)
+    );
+    
+    // Agregar filas a la tabla
+    sortedOrders.forEach(order => {
+        const row = document.createElement('tr');
+        row.className = 'order-row';
+        row.dataset.status = order.status;
+        
+        // Formatear fecha
+        const fecha = new Date(order.created_at);
+        const fechaFormateada = fecha.toLocaleDateString('es-PY', {
+            day: '2-digit',
+            month: '2-digit',
+            year: 'numeric',
+            hour: '2-digit',
+            minute: '2-digit'
+        });
+        
+        // Determinar clase de estado
+        let statusClass = 'status-pending';
+        let statusText = 'Pendiente';
+        
+        if (order.status === 'PAID') {
+            statusClass = 'status-paid';
+            statusText = 'Pagado';
+        } else if (order.status === 'FAILED') {
+            statusClass = 'status-failed';
+            statusText = 'Fallido';
+        }
+        
+        // Formatear precio
+        const precioFormateado = formatPricePY(order.amount);
+        
+        // Crear botones de acción
+        let actionButtons = '';
+        
+        if (order.status === 'PENDING') {
+            actionButtons = `
+                <button class="action-btn view-btn" onclick="viewOrderDetail('${order.id}')">
+                    <i class="fas fa-sync-alt"></i> Actualizar
+                </button>
+                ${order.payment_link ? `
+                <button class="action-btn pay-btn" onclick="window.open('${order.payment_link}', '_blank')">
+                    <i class="fas fa-external-link-alt"></i> Pagar
+                </button>
+                ` : ''}
+            `;
+        } else if (order.status === 'FAILED') {
+            actionButtons = `
+                <button class="action-btn view-btn" onclick="viewOrderDetail('${order.id}')">
+                    <i class="fas fa-sync-alt"></i> Actualizar
+                </button>
+                <button class="action-btn retry-btn" onclick="retryOrder('${order.id}')">
+                    <i class="fas fa-redo"></i> Reintentar
+                </button>
+            `;
+        } else {
+            actionButtons = `
+                <button class="action-btn view-btn" onclick="viewOrderDetail('${order.id}')">
+                    <i class="fas fa-sync-alt"></i> Actualizar
+                </button>
+            `;
+        }
+        
+        row.innerHTML = `
+            <td>
+                <span style="font-family: monospace; font-size: 0.85rem; color: var(--dark);">
+                    ${order.id.substring(0, 8)}...
+                </span>
+            </td>
+            <td>
+                <strong style="color: var(--primary);">${order.product_name}</strong>
+            </td>
+            <td>
+                <span style="font-weight: 600; color: var(--dark);">₲ ${precioFormateado}</span>
+            </td>
+            <td>
+                <span class="status-badge ${statusClass}">
+                    ${statusText}
+                </span>
+            </td>
+            <td>
+                <span style="font-size: 0.9rem; color: var(--gray);">${fechaFormateada}</span>
+            </td>
+            <td>
+                <div class="action-buttons">
+                    ${actionButtons}
+                </div>
+            </td>
+        `;
+        
+        ordersTableBody.appendChild(row);
+    });
+}
+
+// ETag de la última consulta del historial (304 si nada cambió)
+let etagHistorial = null;
+
+// Actualizar el estado de todo el historial en una sola solicitud
+function refreshOrdersHistory() {
+    const uuidRegex = /^[0-9a-f]{8}-[0-9a-f]{4}-[0-9a-f]{4}-[0-9a-f]{4}-[0-9a-f]{12}$/i;
+    const ids = ordersHistory
+        .filter(o => o.status === 'PENDING' && uuidRegex.test(o.id))
+        .map(o => o.id)
+        .slice(0, 50);
+    
+    if (ids.length === 0) return;
+    
+    const headers = {
+        'Content-Type': 'application/json',
+    };
+    if (etagHistorial) {
+        headers['If-None-Match'] = etagHistorial;
+    }
+    
+    fetch('/api/orders/status/', {
+        method: 'POST',
+        headers,
+        body: JSON.stringify({ ids })
+    })
+        .then(response => {
+            if (response.status === 304) return null;
+            etagHistorial = response.headers.get('ETag');
+            return response.json();
+        })
+        .then(datos => {
+            if (!datos || !datos.orders) return;
+            
+            let cambios = false;
+            datos.orders.forEach(pedido => {
+                const order = ordersHistory.find(o => o.id === pedido.id);
+                if (order && (order.status !== pedido.status || order.payment_link !== pedido.payment_link)) {
+                    order.status = pedido.status;
+                    order.payment_link = pedido.payment_link || order.payment_link;
+                    cambios = true;
+                }
+            });
+            
+            if (cambios) {
+                saveOrdersToLocalStorage();
+                loadOrdersHistory();
+            }
+        })
+        .catch(error => console.error('Error al actualizar historial:', error));
+}
+
+// Función para filtrar pedidos por estado
+function filterOrders(status) {
+    const rows = document.querySelectorAll('.order-row');
+    const filterBtns = document.querySelectorAll('.order-filters .category-btn');
+    
+    // Actualizar botones activos
+    filterBtns.forEach(btn => btn.classList.remove('active'));
+    event.target.classList.add('active');
+    
+    rows.forEach(row => {
+        if (status === 'all' || row.dataset.status === status) {
+            row.style.display = 'table-row';
+        } else {
+            row.style.display = 'none';
+        }
+    });
+}
+
+// Función para verificar status de un pedido
+function viewOrderDetail(orderId) {
+    const order = ordersHistory.find(o => o.id === orderId);
+    if (!order) return;
+    
+    // Formatear fecha
+    const fecha = new Date(order.created_at);
+    const fechaFormateada = fecha.toLocaleDateString('es-PY', {
+        weekday: 'long',
+        year: 'numeric',
+        month: 'long',
+        day: 'numeric',
+        hour: '2-digit',
+        minute: '2-digit'
+    });
+    
+    // Formatear precio
+    const precioFormateado = formatPricePY(order.amount);
+    
+    // Consultar estado actual a través de la API
+    fetch(`/api/orders/${orderId}/`)
+        .then(response => response.json())
+        .then(datos => {
+            let estadoColor, estadoIcono, estadoMensaje, informacionAdicional;
+            
+            // Determinar estado basado en la respuesta
+            const estadoRespuesta = datos.status ? datos.status.toLowerCase() : 'pending';
+            
+            switch(estadoRespuesta) {
+                case 'pending':
+                    estadoColor = '#8B4513';
+                    estadoIcono = '⏱️';
+                    estadoMensaje = 'PENDIENTE DE PAGO';
+                    informacionAdicional = 'El pago aún no ha sido completado. Por favor, procede al pago para confirmar tu pedido.';
+                    break;
+                case 'paid':
+                    estadoColor = '#2E8B57';
+                    estadoIcono = '✅';
+                    estadoMensaje = '¡PAGO CONFIRMADO!';
+                    informacionAdicional = 'Tu pedido está siendo preparado para el envío. Te notificaremos cuando sea despachado.';
+                    break;
+                case 'failed':
+                    estadoColor = '#8B0000';
+                    estadoIcono = '❌';
+                    estadoMensaje = 'PAGO FALLIDO';
+                    informacionAdicional = 'El pago no pudo ser procesado. Por favor, intenta nuevamente o contacta a nuestro servicio al cliente.';
+                    break;
+                default:
+                    estadoColor = '#8B4513';
+                    estadoIcono = 'ℹ️';
+                    estadoMensaje = 'ESTADO DESCONOCIDO';
+                    informacionAdicional = 'No pudimos determinar el estado del pedido. Contacta a nuestro servicio al cliente.';
+            }
+            
+            // Atualizar o pedido no histórico local
+            const orderIndex = ordersHistory.findIndex(o => o.id === orderId);
+            if (orderIndex !== -1) {
+                ordersHistory[orderIndex].status = estadoRespuesta.toUpperCase();
+                ordersHistory[orderIndex].payment_link = datos.payment_link || order.payment_link;
+                saveOrdersToLocalStorage();
+            }
+            
+            // RECARREGAR O HISTÓRICO NA TELA
+            loadOrdersHistory();
+            
+            // Estado atualizado
+            const estadoActual = estadoRespuesta.toUpperCase();
+            
+            // Se há enlace de pago e o estado está pendente, oferecer abri-lo
+            if (estadoActual === 'PENDING' && (datos.payment_link || order.payment_link)) {
+                if (confirm('Estado actualizado. ¿Deseas proceder al pago ahora?')) {
+                    window.open(datos.payment_link || order.payment_link, '_blank');
+                }
+            } else {
+                // Mostrar mensaje breve de confirmação
+                alert(`Estado actualizado a: ${estadoMensaje}`);
+            }
+        })
+        .catch(error => {
+            console.error('Error al consultar estado:', error);
+            
+            // Mostrar alerta con error
+            alert(`**Mercado Don Onofre**\n\n
+                **ERROR AL CONSULTAR ESTADO**\n
+                ──────────────────────\n
+                **ID:** ${order.id}\n
+                **Producto:** ${order.product_name}\n
+                **Monto:** ₲ ${precioFormateado}\n
+                **Fecha:** ${fechaFormateada}\n
+                **Último estado conocido:** ${order.status}\n\n
+                ──────────────────────\n
+                **Error:** ${error.message}\n\n
+                **Sugerencias:**\n
+                1. Verifica tu conexión a internet\n
+                2. Intenta nuevamente en unos minutos\n
+                3. Contacta a soporte si el problema persiste\n\n
+                📞 **Soporte:** (021) 123-456
+                `);
+        });
+}
+
+// Agregar un producto al carrito (el pago se hace con el carrito completo)
+function comprarProducto(nombreProducto, monto) {
+    const item = cartItems.find(i => i.name === nombreProducto);
+    if (item) {
+        item.quantity += 1;
+    } else {
+        cartItems.push({
+            name: nombreProducto,
+            price: monto,
+            quantity: 1,
+            priceFormatted: `₲ ${formatPricePY(monto)}`,
+            timestamp: new Date().toISOString()
+        });
+    }
+    updateCartSummary();
+    
+    const orderResult = document.getElementById('order-result');
+    const statusText = document.getElementById('status-text');
+    orderResult.style.display = 'block';
+    document.getElementById('order-id').textContent = '';
+    document.getElementById('order-actions').innerHTML = '';
+    statusText.innerHTML = `
+        <span style="color: #2E8B57;">
+            <i class="fas fa-cart-plus"></i> ${nombreProducto} agregado al carrito. Toca el carrito para pagar.
+        </span>
+    `;
+}
+
+// Pagar todo el carrito con un solo pedido y una sola deuda en AdamsPay
+function pagarCarrito() {
+    if (cartItems.length === 0) return;
+    
+    const items = cartItems.map(item => ({
+        product_name: item.name,
+        unit_price: item.price,
+        quantity: item.quantity
+    }));
+    const total = cartItems.reduce((sum, item) => sum + item.price * item.quantity, 0);
+    const nombrePedido = cartItems.length === 1
+        ? cartItems[0].name
+        : `${cartItems[0].name} y ${cartItems.length - 1} más`;
+    
+    enviarPedido(nombrePedido, total, items);
+}
+
+// Clave de idempotencia de una compra: la misma en cada reintento, así el
+// servidor no crea otro pedido si el primero sí llegó
+function nuevaClaveIdempotencia() {
+    if (window.crypto && crypto.randomUUID) {
+        return crypto.randomUUID();
+    }
+    return `${Date.now().toString(36)}-${Math.random().toString(36).slice(2)}`;
+}
+
+function enviarPedido(nombrePedido, monto, items, claveIdempotencia = nuevaClaveIdempotencia()) {
+    const orderResult = document.getElementById('order-result');
+    const statusText = document.getElementById('status-text');
+    const orderIdElement = document.getElementById('order-id');
+    const orderActions = document.getElementById('order-actions');
+    
+    // Crear pedido temporal para historial
+    const tempOrderId = `temp_${Date.now()}`;
+    const tempOrder = {
+        id: tempOrderId,
+        product_name: nombrePedido,
+        amount: monto,
+        status: 'PENDING',
+        payment_link: null,
+        created_at: new Date().toISOString()
+    };
+    
+    ordersHistory.push(tempOrder);
+    saveOrdersToLocalStorage();
+    
+    // Mostrar sección de resultado
+    orderResult.style.display = 'block';
+    orderResult.scrollIntoView({ behavior: 'smooth' });
+    
+    // Resetear estado
+    statusText.innerHTML = `
+        <span style="color: #8B4513;">
+            <i class="fas fa-spinner fa-spin"></i> Preparando tu pedido...
+        </span>
+    `;
+    orderIdElement.textContent = '';
+    orderActions.innerHTML = '';
+    
+    // Deshabilitar botones temporalmente
+    document.querySelectorAll('.buy-btn').forEach(btn => {
+        const originalText = btn.innerHTML;
+        btn.disabled = true;
+        btn.innerHTML = `<i class="fas fa-spinner fa-spin"></i> Procesando...`;
+        btn.dataset.original = originalText;
+    });
+    
+    // Realizar solicitud a la API (el total lo calcula el servidor)
+    fetch('/api/orders/cart/', {
+        method: 'POST',
+        headers: {
+            'Content-Type': 'application/json',
+            'Idempotency-Key': claveIdempotencia,
+        },
+        body: JSON.stringify({ items })
+    })
+    .then(async response => {
+        const data = await response.json();
+        
+        if (!response.ok) {
+            throw new Error(data.error || `Error HTTP: ${response.status}`);
+        }
+        
+        return data;
+    })
+    .then(datos => {
+        console.log('Respuesta del servidor:', datos);
+        currentOrderId = datos.id;
+        
+        // El carrito ya es un pedido
+        cartItems = [];
+        updateCartSummary();
+        
+        // Actualizar el pedido temporal con datos reales
+        const tempIndex = ordersHistory.findIndex(o => o.id === tempOrderId);
+        if (tempIndex !== -1) {
+            ordersHistory[tempIndex] = {
+                id: datos.id,
+                product_name: datos.product_name || nombrePedido,
+                amount: datos.amount || monto,
+                status: 'PENDING',
+                payment_link: datos.payment_link || null,
+                created_at: new Date().toISOString()
+            };
+            saveOrdersToLocalStorage();
+        }
+        
+        // Actualizar estado
+        if (datos.error) {
+            statusText.innerHTML = `
+                <span style="color: #8B0000;">
+                    <i class="fas fa-exclamation-circle"></i> Error: ${datos.error}
+                </span>
+            `;
+        } else {
+            // Mostrar información del pedido
+            orderIdElement.textContent = `ID del Pedido: ${datos.id}`;
+            
+            if (datos.warning) {
+                statusText.innerHTML = `
+                    <span style="color: #D2691E;">
+                        <i class="fas fa-exclamation-triangle"></i> Pedido creado con advertencia: ${datos.warning}
+                    </span>
+                `;
+            } else {
+                statusText.innerHTML = `
+                    <span style="color: #2E8B57;">
+                        <i class="fas fa-check-circle"></i> ¡Pedido creado con éxito!
+                    </span>
+                `;
+            }
+            
+            // Mostrar acciones disponibles
+            orderActions.innerHTML = '';
+            
+            if (datos.payment_link) {
+                mostrarAccionesDePago(datos);
+            } else if (datos.registration === 'PENDING') {
+                // Modo outbox: el link llega cuando el worker registra la deuda
+                statusText.innerHTML = `
+                    <span style="color: #8B4513;">
+                        <i class="fas fa-spinner fa-spin"></i> Registrando el pago en AdamsPay...
+                    </span>
+                `;
+                esperarLinkDePago(datos);
+            }
+        }
+    })
+    .catch(error => {
+        console.error('Error:', error);
+        statusText.innerHTML = `
+            <span style="color: #8B0000;">
+                <i class="fas fa-times-circle"></i> Error: ${error.message}
+            </span>
+        `;
+        
+        // Actualizar estado del pedido temporal a fallido
+        const tempIndex = ordersHistory.findIndex(o => o.id === tempOrderId);
+        if (tempIndex !== -1) {
+            ordersHistory[tempIndex].status = 'FAILED';
+            saveOrdersToLocalStorage();
+        }
+        
+        // Mostrar botón para reintentar
+        const retryBtn = document.createElement('button');
+        retryBtn.className = 'status-btn';
+        retryBtn.innerHTML = `<i class="fas fa-redo"></i> Reintentar Compra`;
+        retryBtn.onclick = () => enviarPedido(nombrePedido, monto, items, claveIdempotencia);
+        orderActions.appendChild(retryBtn);
+    })
+    .finally(() => {
+        // Rehabilitar botones
+        document.querySelectorAll('.buy-btn').forEach(btn => {
+            if (btn.dataset.original) {
+                btn.disabled = false;
+                btn.innerHTML = btn.dataset.original;
+            }
+        });
+    });
+}
+
+// Mostrar los botones de pago, verificación y seguir comprando
+function mostrarAccionesDePago(datos) {
+    const orderResult = document.getElementById('order-result');
+    const orderActions = document.getElementById('order-actions');
+    
+    const paymentLink = document.createElement('a');
+    paymentLink.href = datos.payment_link;
+    paymentLink.className = 'payment-link';
+    paymentLink.target = '_blank';
+    paymentLink.innerHTML = `
+        <i class="fas fa-external-link-alt"></i>
+        Proceder al Pago con AdamsPay
+    `;
+    orderActions.appendChild(paymentLink);
+    
+    // Botón para verificar estado
+    const statusBtn = document.createElement('button');
+    statusBtn.className = 'status-btn';
+    statusBtn.innerHTML = `
+        <i class="fas fa-sync-alt"></i>
+        Verificar Estado del Pago
+    `;
+    statusBtn.onclick = () => verificarEstadoPedido(datos.id);
+    orderActions.appendChild(statusBtn);
+    
+    // Botón para seguir comprando
+    const continueBtn = document.createElement('button');
+    continueBtn.className = 'status-btn';
+    continueBtn.style.background = '#3498db';
+    continueBtn.innerHTML = `
+        <i class="fas fa-shopping-cart"></i>
+        Seguir Comprando
+    `;
+    continueBtn.onclick = () => {
+        orderResult.style.display = 'none';
+        window.scrollTo({ top: 0, behavior: 'smooth' });
+    };
+    orderActions.appendChild(continueBtn);
+    
+    // Contador para redirección automática
+    let countdown = 8;
+    const countdownElement = document.createElement('div');
+    countdownElement.style.marginTop = '15px';
+    countdownElement.style.color = 'var(--primary)';
+    countdownElement.style.fontSize = '0.9rem';
+    countdownElement.style.fontWeight = '600';
+    countdownElement.id = 'countdown';
+    orderActions.appendChild(countdownElement);
+    
+    const countdownInterval = setInterval(() => {
+        countdownElement.innerHTML = `
+            <i class="fas fa-clock"></i>
+            Redirigiendo a AdamsPay en ${countdown} segundos...
+        `;
+        countdown--;
+        
+        if (countdown < 0) {
+            clearInterval(countdownInterval);
+            if (datos.payment_link && !datos.payment_link.includes('fallback')) {
+                window.open(datos.payment_link, '_blank');
+            }
+        }
+    }, 1000);
+    
+    // Actualizar el estado apenas AdamsPay confirme el pago
+    esperarConfirmacionDePago(datos.id);
+}
+
+// Avisos en vivo (SSE) solo bajo ASGI; con WSGI se consulta order_status
+const EVENTOS_EN_VIVO = document.body.dataset.eventos === '1';
+
+// Seguir un pedido hasta que listo(pedido) se cumpla o pasen `plazo` ms.
+// Bajo ASGI escucha /events/; con WSGI consulta order_status con backoff e
+// If-None-Match (304 si no cambió), sin dejar threads del servidor esperando
+function seguirPedido(idPedido, { plazo, listo, alListo, alAgotar = () => {}, vigente = () => true }) {
+    if (EVENTOS_EN_VIVO && window.EventSource) {
+        const fuente = new EventSource(`/api/orders/${idPedido}/events/`);
+        const temporizador = setTimeout(() => {
+            fuente.close();
+            alAgotar();
+        }, plazo);
+        const terminar = () => {
+            clearTimeout(temporizador);
+            fuente.close();
+        };
+        fuente.addEventListener('order', evento => {
+            const pedido = JSON.parse(evento.data);
+            if (!vigente()) {
+                terminar();
+            } else if (listo(pedido)) {
+                terminar();
+                alListo(pedido);
+            }
+        });
+        fuente.onerror = () => {
+            // Cerrado por el servidor (p. ej. 404): el navegador no reconecta
+            if (fuente.readyState === EventSource.CLOSED) {
+                terminar();
+                alAgotar();
+            }
+        };
+        return;
+    }
+    
+    const limite = Date.now() + plazo;
+    let etag = null;
+    let pausa = 2000;
+    const reintentar = () => {
+        setTimeout(consultar, pausa);
+        pausa = Math.min(pausa * 1.5, 30000);
+    };
+    const consultar = () => {
+        if (!vigente()) return;
+        if (Date.now() >= limite) {
+            alAgotar();
+            return;
+        }
+        fetch(`/api/orders/${idPedido}/`, { headers: etag ? { 'If-None-Match': etag } : {} })
+            .then(response => {
+                if (response.status === 304) return null;
+                if (!response.ok) throw new Error(`Error HTTP: ${response.status}`);
+                etag = response.headers.get('ETag');
+                return response.json();
+            })
+            .then(pedido => {
+                if (pedido && listo(pedido)) {
+                    alListo(pedido);
+                } else {
+                    reintentar();
+                }
+            })
+            .catch(reintentar);
+    };
+    reintentar();
+}
+
+// Esperar a que el worker de AdamsPay asigne el payment_link
+function esperarLinkDePago(datos) {
+    const statusText = document.getElementById('status-text');
+    
+    seguirPedido(datos.id, {
+        plazo: 2 * 60 * 1000,
+        // FAILED: el worker no pudo registrar la deuda y no habrá link
+        listo: pedido => Boolean(pedido.payment_link) || pedido.status === 'FAILED',
+        alListo: pedido => {
+            if (!pedido.payment_link) {
+                const orderIndex = ordersHistory.findIndex(o => o.id === datos.id);
+                if (orderIndex !== -1) {
+                    ordersHistory[orderIndex].status = pedido.status;
+                    saveOrdersToLocalStorage();
+                }
+                statusText.innerHTML = `
+                    <span style="color: #8B0000;">
+                        <i class="fas fa-times-circle"></i> No se pudo registrar el pago en AdamsPay. Intenta nuevamente.
+                    </span>
+                `;
+                return;
+            }
+            
+            datos.payment_link = pedido.payment_link;
+            const orderIndex = ordersHistory.findIndex(o => o.id === datos.id);
+            if (orderIndex !== -1) {
+                ordersHistory[orderIndex].payment_link = pedido.payment_link;
+                saveOrdersToLocalStorage();
+            }
+            
+            statusText.innerHTML = `
+                <span style="color: #2E8B57;">
+                    <i class="fas fa-check-circle"></i> ¡Pedido creado con éxito!
+                </span>
+            `;
+            mostrarAccionesDePago(datos);
+        },
+        alAgotar: () => {
+            statusText.innerHTML = `
+                <span style="color: #D2691E;">
+                    <i class="fas fa-exclamation-triangle"></i> El registro del pago está demorando. Consulta tu pedido en "Mis Pedidos".
+                </span>
+            `;
+        }
+    });
+}
+
+// Actualizar el estado apenas AdamsPay confirme el pago
+function esperarConfirmacionDePago(idPedido) {
+    seguirPedido(idPedido, {
+        plazo: 10 * 60 * 1000,
+        listo: pedido => Boolean(pedido.status) && pedido.status !== 'PENDING',
+        vigente: () => currentOrderId === idPedido,
+        alListo: pedido => {
+            const orderIndex = ordersHistory.findIndex(o => o.id === idPedido);
+            if (orderIndex !== -1) {
+                ordersHistory[orderIndex].status = pedido.status;
+                saveOrdersToLocalStorage();
+            }
+            
+            const statusText = document.getElementById('status-text');
+            if (pedido.status === 'PAID') {
+                statusText.innerHTML = `
+                    <span style="color: #2E8B57;">
+                        <i class="fas fa-check-circle"></i> ¡Pago Confirmado!
+                    </span>
+                `;
+            } else {
+                statusText.innerHTML = `
+                    <span style="color: #8B0000;">
+                        <i class="fas fa-times-circle"></i> Pago Fallido
+                    </span>
+                `;
+            }
+        }
+    });
+}
+
+function verificarEstadoPedido(idPedido) {
+    const statusText = document.getElementById('status-text');
+    const previousText = statusText.innerHTML;
+    
+    statusText.innerHTML = `
+        <span style="color: #8B4513;">
+            <i class="fas fa-spinner fa-spin"></i> Consultando estado del pago...
+        </span>
+    `;
+    
+    fetch(`/api/orders/${idPedido}/`)
+        .then(response => response.json())
+        .then(datos => {
+            let statusColor, statusIcon, statusMessage, additionalInfo;
+            
+            switch(datos.status) {
+                case 'pending':
+                    statusColor = '#8B4513';
+                    statusIcon = '<i class="fas fa-clock"></i>';
+                    statusMessage = 'Pendiente de pago';
+                    additionalInfo = 'Por favor, completa el pago para procesar tu pedido.';
+                    break;
+                case 'paid':
+                    statusColor = '#2E8B57';
+                    statusIcon = '<i class="fas fa-check-circle"></i>';
+                    statusMessage = '¡Pago Confirmado!';
+                    additionalInfo = 'Tu pedido está siendo preparado para el envío.';
+                    break;
+                case 'failed':
+                    statusColor = '#8B0000';
+                    statusIcon = '<i class="fas fa-times-circle"></i>';
+                    statusMessage = 'Pago Fallido';
+                    additionalInfo = 'El pago no pudo ser procesado. Intenta nuevamente.';
+                    break;
+                default:
+                    statusColor = '#8B4513';
+                    statusIcon = '<i class="fas fa-info-circle"></i>';
+                    statusMessage = datos.status || 'Estado desconocido';
+                    additionalInfo = 'Contacta a nuestro servicio al cliente.';
+            }
+            
+            statusText.innerHTML = `
+                <span style="color: ${statusColor}">
+                    ${statusIcon} ${statusMessage}
+                </span>
+            `;
+            
+            // Atualizar histórico local
+            const orderIndex = ordersHistory.findIndex(o => o.id === idPedido);
+            if (orderIndex !== -1) {
+                ordersHistory[orderIndex].status = datos.status.toUpperCase();
+                saveOrdersToLocalStorage();
+                
+                // RECARREGAR O HISTÓRICO NA TELA (se estiver visível)
+                if (document.getElementById('order-history').style.display === 'block') {
+                    loadOrdersHistory();
+                }
+            }
+            
+            // Mostrar alerta detallada
+            setTimeout(() => {
+                // Formatear el precio para la alerta
+                const productPrice = datos.amount ? `₲ ${formatPricePY(datos.amount)}` : 'N/A';
+                alert(`**Mercado Don Onofre**\n\n` +
+                    `**Pedido #${idPedido}**\n` +
+                    `**Producto:** ${datos.product_name || 'N/A'}\n` +
+                    `**Total:** ${productPrice}\n` +
+                    `**Estado:** ${statusMessage}\n` +
+                    `**Fecha:** ${new Date(datos.created_at).toLocaleString('es-PY')}\n\n` +
+                    `**Información:** ${additionalInfo}\n\n` +
+                    `**Contacto:** (021) 123-456`);
+            }, 300);
+        })
+        .catch(error => {
+            console.error('Error al verificar estado:', error);
+            statusText.innerHTML = previousText;
+            alert('Error al verificar el estado del pedido. Por favor, intenta nuevamente o contacta a nuestro servicio al cliente.');
+        });
+}
+
+function updateCartSummary() {
+    const cartSummary = document.getElementById('cart-summary');
+    const cartCount = document.getElementById('cart-count');
+    
+    cartCount.textContent = cartItems.reduce((sum, item) => sum + item.quantity, 0);
+    
+    if (cartItems.length > 0) {
+        cartSummary.style.display = 'flex';
+        
+        // Calcular total
+        const total = cartItems.reduce((sum, item) => sum + item.price * item.quantity, 0);
+        const totalFormatted = formatPricePY(total);
+        
+        // Mostrar tooltip con resumen
+        cartSummary.title = `Productos en carrito:\n${cartItems.map(item => `• ${item.quantity} x ${item.name} - ₲ ${formatPricePY(item.price * item.quantity)}`).join('\n')}\n\n Total: ₲ ${totalFormatted}\n\nToca para pagar`;
+    } else {
+        cartSummary.style.display = 'none';
+    }
+}
+
+// Guardar historial en localStorage
+function saveOrdersToLocalStorage() {
+    localStorage.setItem('donOnofreOrders', JSON.stringify(ordersHistory));
+}
+
+// Cargar historial desde localStorage
+function loadOrdersFromLocalStorage() {
+    const savedOrders = localStorage.getItem('donOnofreOrders');
+    if (savedOrders) {
+        ordersHistory = JSON.parse(savedOrders);
+    }
+}
+
+// Inicialización
+document.addEventListener('DOMContentLoaded', () => {
+    // Cargar historial desde localStorage
+    loadOrdersFromLocalStorage();
+    
+    // Efecto de aparición suave para las tarjetas
+    const cards = document.querySelectorAll('.product-card');
+    cards.forEach((card, index) => {
+        card.style.opacity = '0';
+        card.style.transform = 'translateY(20px)';
+        
+        setTimeout(() => {
+            card.style.transition = 'opacity 0.5s ease, transform 0.5s ease';
+            card.style.opacity = '1';
+            card.style.transform = 'translateY(0)';
+        }, index * 100);
+    });
+    
+    // Formatear todos los precios en la página
+    document.querySelectorAll('.product-price').forEach(priceElement => {
+        const originalHTML = priceElement.innerHTML;
+        
+        // Buscar patrones de precios (₲ seguido de número)
+        const priceRegex = /₲\s*([\d,.]+)/g;
+        let nuevoHTML = originalHTML;
+        
+        let match;
+        while ((match = priceRegex.exec(originalHTML)) !== null) {
+            const precioOriginal = match[1];
+            const precioFormateado = formatPricePY(precioOriginal);
+            nuevoHTML = nuevoHTML.replace(precioOriginal, precioFormateado);
+        }
+        
+        priceElement.innerHTML = nuevoHTML;
+    });
+    
+    // También formatear precios tachados (old-price)
+    document.querySelectorAll('.old-price').forEach(priceElement => {
+        const originalHTML = priceElement.innerHTML;
+        
+        // Buscar números
+        const priceRegex = /([\d,.]+)/g;
+        let nuevoHTML = originalHTML;
+        
+        let match;
+        while ((match = priceRegex.exec(originalHTML)) !== null) {
+            const precioOriginal = match[1];
+            const precioFormateado = formatPricePY(precioOriginal);
+            nuevoHTML = nuevoHTML.replace(precioOriginal, precioFormateado);
+        }
+        
+        priceElement.innerHTML = nuevoHTML;
+    });
+    
+    // Configurar el carrito
+    const cartSummary = document.getElementById('cart-summary');
+    cartSummary.addEventListener('click', () => {
+        if (cartItems.length > 0) {
+            // Calcular total
+            const total = cartItems.reduce((sum, item) => sum + item.price * item.quantity, 0);
+            const totalFormatted = formatPricePY(total);
+            
+            const confirmar = confirm(`🛒 Tu Carrito de Compras\n\n` +
+                `${cartItems.map((item, index) => `${index + 1}. ${item.quantity} x ${item.name} - ₲ ${formatPricePY(item.price * item.quantity)}`).join('\n')}\n\n` +
+                `Total: ₲ ${totalFormatted}\n\n` +
+                `¿Pagar todo el carrito con AdamsPay?`);
+            if (confirmar) {
+                pagarCarrito();
+            }
+        }
+    });
+});